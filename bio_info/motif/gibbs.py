@@ -0,0 +1,74 @@
+import numpy as np
+
+from .profile import TIE_DECIMALS
+from .util import count_score, motif_windows
+
+
+def gibbs_chains(codes, k, seeds, n=1000, patience=100, score='entropy'):
+    """
+    Runs independent Gibbs sampler chains side by side. Each chain keeps
+    a 4 x k count matrix of its motifs; an iteration removes one motif
+    from the counts, scores every window of that sequence against the
+    remaining counts in log space, samples a replacement (by the
+    Gumbel-max trick, which is equivalent to sampling in proportion to
+    the window probabilities) and adds it back, so both the profile and
+    the score are updated in O(k) plus one pass over the windows.
+
+    Every chain draws only from its own generator, so its result depends
+    on its seed alone and not on which other chains run with it.
+
+    :param codes: a t x L array of nucleotide codes, as returned by
+           encode_dna_list; windows with an ambiguous base are never chosen
+    :param k: the motif length
+    :param seeds: one seed (or SeedSequence) per chain
+    :param n: the maximum number of iterations per chain
+    :param patience: stop a chain once its best score has not improved
+           for this many iterations; None runs all n iterations
+    :param score: entropy or mismatch count
+
+    :return: a chains x t array of the best motif start positions of each
+             chain and an array of their scores
+    """
+    codes = np.asarray(codes, dtype=np.uint8)
+    t = len(codes)
+    windows, valid = motif_windows(codes, k)
+    rngs = [np.random.default_rng(seed) for seed in seeds]
+    chains = len(rngs)
+    columns = np.arange(k)
+    sequences = np.arange(t)
+
+    positions = np.array([np.argmax(valid + rng.gumbel(size=valid.shape), axis=1) for rng in rngs],
+                         dtype=np.int64).reshape(chains, t)
+    motifs = windows[sequences, positions]
+    counts = (motifs[:, None, :, :] == np.arange(4)[None, :, None, None]).sum(axis=2)
+    best_scores = np.round(np.asarray(count_score(counts, t, score), dtype=np.float64), TIE_DECIMALS)
+    best_positions = positions.copy()
+    stale = np.zeros(chains, dtype=np.int64)
+    log_denominator = np.log(t - 1 + 4)
+    active = np.arange(chains)
+
+    for _ in range(n):
+        if len(active) == 0:
+            break
+        rows = np.array([rngs[c].integers(t) for c in active.tolist()])
+        noise = np.stack([rngs[c].gumbel(size=windows.shape[1]) for c in active.tolist()])
+        chain = np.arange(len(active))[:, None]
+
+        removed = windows[rows, positions[active, rows]]
+        counts[active[:, None], removed, columns] -= 1
+        log_profile = np.log(counts[active] + 1) - log_denominator
+        log_profile = np.concatenate((log_profile, np.full((len(active), 1, k), -np.inf)), axis=1)
+        window_scores = log_profile[chain[:, :, None], windows[rows], columns].sum(axis=2)
+        chosen = np.argmax(window_scores + noise, axis=1)
+        positions[active, rows] = chosen
+        counts[active[:, None], windows[rows, chosen], columns] += 1
+
+        current = np.round(count_score(counts[active], t, score), TIE_DECIMALS)
+        improved = current < best_scores[active]
+        best_scores[active[improved]] = current[improved]
+        best_positions[active[improved]] = positions[active[improved]]
+        stale[active] = np.where(improved, 0, stale[active] + 1)
+        if patience is not None:
+            active = active[stale[active] < patience]
+
+    return best_positions, best_scores
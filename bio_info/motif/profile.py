@@ -1,66 +1,97 @@
-from ..util import *
+import numpy as np
+
+from ..util.packed import as_codes, decode_symbols
+
+
+TIE_DECIMALS = 9
 
 
 class Profile:
+    """
+    A profile matrix: the probability of each nucleotide (rows A, C, G, T)
+    at each of k positions, held as a 4 x k NumPy array together with its
+    cached natural-log probabilities.
+    """
     # TODO option to build profile from peptides
     def __init__(self, data=None, k = None):
+        """
+        :param data: a list of motifs, a 4 x k count matrix (integers) or a
+               4 x k probability matrix (floats), as lists or an array
+        :param k: the motif length of a uniform profile when no data is given
+        """
         if data is None and k is None:
             return
         if data is None:
-            self.profile = self.from_count([[1] * k] * 4)
+            self._set_(self.from_count(np.ones((4, k), dtype=np.int64)))
             return
-        val = data[0][0]
-        if type(val) == str:
-            self.profile = self.from_dna_list(data)
-        elif type(val) == int:
-            self.profile = self.from_count(data)
-        elif type(val) == float:
-            self.profile = data
+        val = data[0][0] if len(data) > 0 else None
+        if isinstance(val, str):
+            self._set_(self.from_dna_list(data))
+            return
+        data = np.asarray(data)
+        if data.dtype.kind in 'iub':
+            self._set_(self.from_count(data))
+        elif data.dtype.kind == 'f':
+            self._set_(data)
+        else:
+            raise TypeError("cannot build a profile from {}".format(data.dtype))
+
+    def _set_(self, probabilities):
+        self.profile = np.asarray(probabilities, dtype=np.float64)
         self.m = 4
-        self.n = len(data[0])
+        self.n = self.profile.shape[1]
+        self._log_profile = None
 
-    def from_dna_list(self, motif_list):
+    @classmethod
+    def from_motifs(cls, motif_list):
         """
-        Generate a profile matrix from a list of motifs.
+        Builds a profile from a list of equal-length motifs.
         """
-        k = len(motif_list[0])
-        t = len(motif_list) + 4
-        profile = list()
-        profile.append(list())
-        profile.append(list())
-        profile.append(list())
-        profile.append(list())
-
-        for i in range(k):
-            col = [motif[i] for motif in motif_list]
-            a_num, c_num, g_num, t_num = get_nucleotide_count(col)
-            profile[0].append((a_num + 1) / t)
-            profile[1].append((c_num + 1) / t)
-            profile[2].append((g_num + 1) / t)
-            profile[3].append((t_num + 1) / t)
+        return cls.from_codes(motif_codes(motif_list))
 
+    @classmethod
+    def from_codes(cls, codes):
+        """
+        Builds a profile from a t x k array of nucleotide codes, one
+        motif per row.
+        """
+        codes = np.asarray(codes, dtype=np.uint8)
+        profile = cls()
+        profile._set_((count_matrix(codes) + 1) / (len(codes) + 4))
+        return profile
+
+    @classmethod
+    def from_counts(cls, counts):
+        """
+        Builds a profile from a 4 x k count matrix with pseudocounts of 1.
+        """
+        profile = cls()
+        profile._set_(profile.from_count(counts))
         return profile
 
+    def from_dna_list(self, motif_list):
+        """
+        Generate a profile matrix from a list of motifs.
+        """
+        return (count_matrix(motif_codes(motif_list)) + 1) / (len(motif_list) + 4)
+
     def from_count(self, count_matrix):
         """
         Generate a profile matrix from a list of counts.
         """
-        k = len(count_matrix[0])
-        profile = list()
-        profile.append(list())
-        profile.append(list())
-        profile.append(list())
-        profile.append(list())
-
-        for i in range(k):
-            col = [count[i] for count in count_matrix]
-            t = sum([col[0], col[1], col[2], col[3]]) + 4
-            profile[0].append((col[0] + 1) / t)
-            profile[1].append((col[1] + 1) / t)
-            profile[2].append((col[2] + 1) / t)
-            profile[3].append((col[3] + 1) / t)
+        counts = np.asarray(count_matrix, dtype=np.float64)
+        return (counts + 1) / (counts.sum(axis=0) + 4)
 
-        return profile
+    @property
+    def log_profile(self):
+        """
+        The natural log of each probability, computed once.
+        """
+        if self._log_profile is None:
+            with np.errstate(divide='ignore'):
+                self._log_profile = np.log(self.profile)
+            self._log_profile.flags.writeable = False
+        return self._log_profile
 
     def get(self, row=None, col=None):
         """
@@ -74,11 +105,11 @@ class Profile:
         if row is None and col is None:
             return
         elif row is None:
-            return [r[col] for r in self.profile]
+            return self.profile[:, col].tolist()
         elif col is None:
-            return self.profile[row]
+            return self.profile[row].tolist()
         else:
-            return self.profile[row][col]
+            return float(self.profile[row, col])
 
     def entropy_score(self):
         """
@@ -86,49 +117,91 @@ class Profile:
 
         :return: the sum of the entropy scores for each column in the profile
         """
-        ent_score = 0
-        for i in range(len(self.get(0))):
-            ent_score += get_entropy(self.get(0, i), self.get(1, i),
-                                     self.get(2, i), self.get(3, i))
-        return ent_score
+        p = self.profile
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terms = np.where(p > 0, p * np.log2(p), 0.0)
+        return float(-terms.sum())
 
     def kmer_probability(self, kmer):
         """
         Find the probability of a k-mer given a profile.
 
-        :param profile: a matrix of probabilities in the form of a list of lists
         :param kmer: the DNA string
-        :return: the probability of :param kmer
+        :return: the probability of :param kmer, 0 if it contains an
+                 ambiguous base
         """
         if len(kmer) != self.n:
             return
-        prob = self.get(row=pattern_to_number(kmer[0]), col=0)
-        for i in range(1, len(kmer)):
-            prob *= self.get(row=pattern_to_number(kmer[i]), col=i)
-        return prob
+        profile = _with_ambiguous_row_(self.profile, 0.0)
+        return float(np.prod(profile[as_codes(kmer), np.arange(self.n)]))
+
+    def kmer_log_probability(self, kmer):
+        """
+        Find the natural log of the probability of a k-mer, which does not
+        underflow for long motifs.
+
+        :param kmer: the DNA string
+        :return: the log probability of :param kmer, -inf if it contains
+                 an ambiguous base
+        """
+        if len(kmer) != self.n:
+            return
+        log_profile = _with_ambiguous_row_(self.log_profile, -np.inf)
+        return float(log_profile[as_codes(kmer), np.arange(self.n)].sum())
+
+    def scores(self, dna, k=None):
+        """
+        Scores every window of a sequence at once. The sequence is encoded
+        once, then for each column the log-probabilities of the bases in
+        that column's position are gathered and added, which sums the
+        diagonals of the (position x column) log-probability matrix.
+
+        :param dna: a string of DNA, a PackedDNA or an array of codes
+        :param k: the window length; defaults to the profile length
+        :return: a float array with the log probability of each window;
+                 windows containing an ambiguous base score -inf
+        """
+        k = self.n if k is None else k
+        codes = as_codes(dna)
+        windows = len(codes) - k + 1
+        if windows <= 0:
+            return np.zeros(0, dtype=np.float64)
+        log_profile = _with_ambiguous_row_(self.log_profile, -np.inf)
+        scores = log_profile[codes[:windows], 0].copy()
+        for j in range(1, k):
+            scores += log_profile[codes[j:j + windows], j]
+        return scores
+
+    def most_probable(self, dna, k=None, n=None):
+        """
+        Finds the window of a sequence with the highest probability.
+
+        :param dna: a string of DNA, a PackedDNA or an array of codes
+        :param k: the window length; defaults to the profile length
+        :param n: if given, find the n best windows instead of one
+        :return: the start of the best window, or an array of the n best
+                 starts (fewer if there are fewer windows), best first;
+                 ties go to the earliest window. A ValueError is raised
+                 for the best window of a sequence shorter than k.
+        """
+        # Scores equal up to rounding (the same probabilities multiplied in
+        # a different order) count as ties
+        scores = np.round(self.scores(dna, k), TIE_DECIMALS)
+        if n is None:
+            if len(scores) == 0:
+                raise ValueError("the sequence is shorter than the window")
+            return int(np.argmax(scores))
+        return np.argsort(-scores, kind='stable')[:n]
 
     def consensus_string(self):
         """
         Generates a consensus string for each position in the profile matrix.
 
-        :param motif_list: a list of DNA strings of equal length
         :return: a single DNA sequence representing the most common nucleotide for
-                 each position in the profile
-        """
-        consensus = list()
-        for i in range(self.n):
-            col = self.get(col=i)
-            a, c, g, t = col[0], col[1], col[2], col[3]
-            high_count = max(a, c, g, t)
-            if a == high_count:
-                consensus.append("A")
-            elif c == high_count:
-                consensus.append("C")
-            elif g == high_count:
-                consensus.append("G")
-            elif t == high_count:
-                consensus.append("T")
-        return ''.join(consensus)
+                 each position in the profile, preferring A, C, G, T in that
+                 order on ties
+        """
+        return decode_symbols(self.profile.argmax(axis=0).astype(np.uint8))
 
     def to_string(self):
         """
@@ -138,7 +211,7 @@ class Profile:
         :return: the profile string
         """
         string = list()
-        for row in self.profile:
+        for row in self.profile.tolist():
             for col in row:
                 string.append("{:.3f}  ".format(col))
             string.append('\n')
@@ -150,5 +223,32 @@ class Profile:
 
         :return: maximum entropy
         """
-        uniform_profile = Profile(self.from_count([[1] * self.n] * 4))
-        return uniform_profile.entropy_score()
+        return float(self.n * np.log2(self.m))
+
+
+def _with_ambiguous_row_(table, value):
+    # Adds a fifth row for the ambiguous code 4
+    return np.vstack((table, np.full((1, table.shape[1]), value)))
+
+
+def motif_codes(motif_list):
+    """
+    Encodes a list of equal-length motifs as a t x k array of nucleotide
+    codes.
+    """
+    if len(motif_list) == 0:
+        return np.zeros((0, 0), dtype=np.uint8)
+    k = len(motif_list[0])
+    return as_codes(''.join(motif_list)).reshape(len(motif_list), k)
+
+
+def count_matrix(codes):
+    """
+    Counts each nucleotide at each position of a set of motifs. Ambiguous
+    bases are not counted.
+
+    :param codes: a t x k array of nucleotide codes
+    :return: a 4 x k int64 array of counts
+    """
+    codes = np.asarray(codes, dtype=np.uint8)
+    return (codes[None, :, :] == np.arange(4, dtype=np.uint8)[:, None, None]).sum(axis=1)
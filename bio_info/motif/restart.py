@@ -0,0 +1,101 @@
+from multiprocessing import Pool
+
+import numpy as np
+from progressbar import progressbar
+
+from ..util.shared import share_arrays, attach_arrays, release_arrays
+from .profile import TIE_DECIMALS
+
+
+BATCH_SIZE = 8
+
+_shared = dict()
+
+
+def run_restarts(engine, codes, k, restarts, seed=None, workers=None, stop_after=None, **options):
+    """
+    Runs independent restarts of a motif search and keeps the best.
+    Restart i gets the i-th seed spawned from :param seed, and restarts
+    are compared in order (ties go to the earlier one), so the result is
+    the same for any number of workers.
+
+    :param engine: a module-level function engine(codes, k, seeds, **options)
+           returning a len(seeds) x t array of motif positions and an
+           array of their scores, where each restart depends only on its
+           own seed (such as gibbs_chains)
+    :param codes: a t x L array of nucleotide codes
+    :param k: the motif length
+    :param restarts: the number of restarts
+    :param seed: the seed all restart seeds are derived from
+    :param workers: if greater than 1, run batches of restarts in a pool of
+           this many processes that share :param codes
+    :param stop_after: if given, stop once this many restarts in a row
+           have not improved on the best score
+    :param options: passed to :param engine
+
+    :return: the best motif positions and their score
+    """
+    seeds = np.random.SeedSequence(seed).spawn(restarts)
+    return run_batches(engine, codes, k, seeds, workers, stop_after, **options)
+
+
+def run_batches(engine, codes, k, items, workers=None, stop_after=None, progress=True,
+                batch_size=BATCH_SIZE, **options):
+    """
+    Evaluates the items of a motif search (restart seeds, starting
+    motifs, ...) in batches and keeps the best result, comparing results
+    in item order so that ties go to the earliest item.
+
+    :param engine: a module-level function engine(codes, k, batch, **options)
+           returning a len(batch) x t array of motif positions and an array
+           of their scores
+    :param items: the list of items to split into batches
+    :param progress: whether to show a progress bar
+    :param batch_size: the number of items per batch
+    :param options: see run_restarts
+
+    :return: the best motif positions and their score
+    """
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    if workers is None or workers <= 1:
+        results = (engine(codes, k, batch, **options) for batch in batches)
+        if progress:
+            results = progressbar(results, max_value=len(batches))
+        return _best_(results, stop_after)
+    segments, specs = share_arrays({'codes': codes})
+    try:
+        with Pool(workers, _attach_, (specs,)) as pool:
+            tasks = [(engine, k, batch, options) for batch in batches]
+            results = pool.imap(_run_batch_, tasks)
+            if progress:
+                results = progressbar(results, max_value=len(batches))
+            return _best_(results, stop_after)
+    finally:
+        release_arrays(segments)
+
+
+def _best_(results, stop_after):
+    best_positions, best_score = None, float("inf")
+    since_best = 0
+    for positions, scores in results:
+        # Equal scores summed in a different order count as ties
+        scores = np.round(scores, TIE_DECIMALS)
+        for p, s in zip(positions, scores.tolist()):
+            if s < best_score:
+                best_positions, best_score = p, s
+                since_best = 0
+            else:
+                since_best += 1
+            if stop_after is not None and since_best >= stop_after:
+                return best_positions, best_score
+    return best_positions, best_score
+
+
+def _attach_(specs):
+    _shared.clear()
+    _shared.update(attach_arrays(specs))
+
+
+def _run_batch_(task):
+    engine, k, seeds, options = task
+    return engine(_shared['codes'], k, seeds, **options)
@@ -1,68 +1,93 @@
-import numpy as np
+import math
 
-from progressbar import progressbar
+import numpy as np
 
 from .util import *
+from .gibbs import gibbs_chains
+from .profile import TIE_DECIMALS
+from .restart import run_batches, run_restarts
 
 
-def find_profile_probable_kmer(profile, k, dna):
+def find_profile_probable_kmer(profile, k, dna, n=None):
     """
     Finds the most likely k-mer given a profile.
 
-    :param profile: a profile matrix stored as a list of lists
+    :param profile: a Profile
     :param k: the length of a k-mer
     :param dna: the DNA sequence to search
-    :return: the k-mer in :param dna with the highest probability
+    :param n: if given, return the n most likely k-mers instead of one
+    :return: the k-mer in :param dna with the highest probability (the
+             first one on ties), or a list of the n most likely k-mers;
+             a ValueError is raised if :param dna is shorter than k and
+             n is not given
     """
-    if type(profile) != Profile:
+    if not isinstance(profile, Profile):
         raise TypeError("param profile must be of type Profile")
-    index = 0
-    top_prob = 0
-    for i in range(len(dna) - k+1):
-        pattern = dna[i:i+k]
-        prob = profile.get(row=pattern_to_number(pattern[0]), col=0)
-        for j in range(1, len(pattern)):
-            prob *= profile.get(row=pattern_to_number(pattern[j]), col=j)
-        if prob > top_prob:
-            top_prob = prob
-            index = i
-    return dna[index:index+k]
-
-
-def greedy_motif_search(dna_list, k, scoring='entropy'):
+    if n is None:
+        index = profile.most_probable(dna, k)
+        return dna[index:index+k]
+    return [dna[i:i+k] for i in profile.most_probable(dna, k, n).tolist()]
+
+
+GREEDY_BATCH_SIZE = 64
+
+
+def greedy_motif_search(dna_list, k, scoring='entropy', workers=None):
+    """
+    Greedy motif search: each k-mer of the first string seeds a motif
+    list, which is extended with the profile-most-probable k-mer of each
+    following string, using the profile of the motifs chosen so far.
+
+    :param dna_list: a list of DNA strings
+    :param k: the length of k-mer
+    :param scoring: entropy or mismatch count
+    :param workers: optional number of processes to spread the seeds over
+
+    :return: the set of motifs with the lowest score (the first one found
+             on ties)
+    """
+    codes = encode_dna_list(dna_list)
     t = len(dna_list)
     # Generate initial motif matrix
-    best_motifs = list()
-    for dna in dna_list:
-        pattern = dna[0:k]
-        best_motifs.append(pattern)
-    if scoring == 'mismatch':
-        b_score = mismatch_score(best_motifs)
-    else:
-        b_score = entropy_score(best_motifs)
+    best_positions = np.zeros(t, dtype=np.int64)
+    b_score = round(float(count_score(count_matrix(codes[:, :k]), t, scoring)), TIE_DECIMALS)
 
     # Iteratively find best motif matrix
-    motif_list = ['A'] * t
-    for i in range(len(dna_list[0]) - k+1):  # for each k-mer in first DNA string
-        motif_list[0] = dna_list[0][i:i + k]
-        for j in range(1, t):
-            profile = Profile(motif_list[:j])
-            motif_list[j] = (find_profile_probable_kmer(
-                              profile, k, dna_list[j]))
-        # Get motif list score
-        if scoring == 'mismatch':
-            m_score = mismatch_score(motif_list)
-        else:
-            m_score = entropy_score(motif_list)
-        if m_score < b_score:
-            # Update best motifs
-            best_motifs = motif_list.copy()
-            b_score = m_score
-
-    return best_motifs    
-
-
-def randomized_motif_search(dna_list, k, n=1000, score='entropy'):
+    starts = list(range(len(dna_list[0]) - k + 1))
+    positions, m_score = run_batches(_greedy_motif_search_, codes, k, starts, workers,
+                                     progress=False, batch_size=GREEDY_BATCH_SIZE, scoring=scoring)
+    if positions is not None and m_score < b_score:
+        best_positions = positions
+    return [dna[p:p + k] for dna, p in zip(dna_list, best_positions.tolist())]
+
+
+def _greedy_motif_search_(codes, k, starts, scoring='entropy'):
+    # Extends every seed k-mer of the first string at once
+    t = len(codes)
+    windows, valid = motif_windows(codes, k)
+    columns = np.arange(k)
+    seeds = np.arange(len(starts))
+    # One-hot windows turn the scores of every seed's profile into one
+    # matrix product: scores[s, w] = sum over (base, column) of
+    # log_profile[s, base, column] * (windows[w, column] == base)
+    bases = np.arange(4)[:, None]
+    positions = np.zeros((len(starts), t), dtype=np.int64)
+    positions[:, 0] = starts
+    counts = np.zeros((len(starts), 4, k), dtype=np.int64)
+    for j in range(t):
+        if j > 0:
+            # Profile of motif_list[:j] with pseudocounts, in log space
+            log_profile = (np.log(counts + 1) - np.log(j + 4)).reshape(len(starts), 4 * k)
+            one_hot = (windows[j][:, None, :] == bases).reshape(-1, 4 * k)
+            scores = log_profile @ one_hot.T.astype(np.float64) + valid[j]
+            positions[:, j] = np.argmax(np.round(scores, TIE_DECIMALS), axis=1)
+        motifs = windows[j][positions[:, j]]
+        counts[seeds[:, None], motifs, columns] += 1
+    return positions, np.asarray(count_score(counts, t, scoring), dtype=np.float64)
+
+
+def randomized_motif_search(dna_list, k, n=1000, score='entropy', workers=None, seed=None,
+                            stop_after=None):
     """
     A wrapper for the randomized motif search algorithm.
 
@@ -70,134 +95,151 @@ def randomized_motif_search(dna_list, k, n=1000, score='entropy'):
     :param k: length of k-mer
     :param n: number of iterations
     :param score: entropy or mismatch count
+    :param workers: optional number of processes to spread the restarts over
+    :param seed: the seed each restart's seed is derived from; the result
+           does not depend on :param workers
+    :param stop_after: if given, stop once this many restarts in a row
+           have not improved on the best score
 
     :return: the set of motifs with the lowest score
     """
-    best_motifs = list()
-    best_score = float("inf")
-    for i in progressbar(range(n)):
-        motifs, low_score = _randomized_motif_search_(dna_list, k, score)
-        if low_score < best_score:
-            best_motifs = motifs
-            best_score = low_score
-    return best_motifs
-
-
-def _randomized_motif_search_(dna_list, k, score):
-    t = len(dna_list)
-    # Get random k-mers from each string
-    motifs = list()
-    for i in range(t):
-        index = random.randint(0, len(dna_list[0]) - k)
-        motifs.append(dna_list[i][index:index+k])
-    best_motifs = motifs.copy()
-    if score == 'entropy':
-        b_score = entropy_score(best_motifs)
-    else:
-        b_score = mismatch_score(best_motifs)
-    while True:
-        profile = Profile(motifs)
-        # Get profile-most-probable k-mer of each DNA sequence
-        motifs.clear()
-        for dna in dna_list:
-            motifs.append(find_profile_probable_kmer(profile, k, dna))
-        # Compare results
-        if score == 'entropy':
-            m_score = entropy_score(motifs)
-        else:
-            m_score = mismatch_score(motifs)
-        if m_score < b_score:
-            best_motifs = motifs.copy()
-            b_score = m_score
-        else:
-            return best_motifs, b_score
-
-
-def gibbs_sampler(dna_list, k, it=20, n=1000, score='entropy'):
+    positions, _ = run_restarts(_randomized_motif_search_, encode_dna_list(dna_list), k, n,
+                                seed, workers, stop_after, score=score)
+    return [dna[p:p + k] for dna, p in zip(dna_list, positions.tolist())]
+
+
+def _randomized_motif_search_(codes, k, seeds, score='entropy'):
+    t = len(codes)
+    windows, valid = motif_windows(codes, k)
+    columns = np.arange(k)
+    sequences = np.arange(t)
+    log_denominator = np.log(t + 4)
+    results = np.empty((len(seeds), t), dtype=np.int64)
+    scores = np.empty(len(seeds))
+    for r, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        # Start from a random window of each string
+        best_positions = np.argmax(valid + rng.gumbel(size=valid.shape), axis=1)
+        counts = count_matrix(windows[sequences, best_positions])
+        b_score = round(float(count_score(counts, t, score)), TIE_DECIMALS)
+        while True:
+            # Get profile-most-probable k-mer of each DNA sequence
+            log_profile = np.vstack((np.log(counts + 1) - log_denominator, np.full((1, k), -np.inf)))
+            window_scores = log_profile[windows, columns].sum(axis=2)
+            positions = np.argmax(np.round(window_scores, TIE_DECIMALS), axis=1)
+            counts = count_matrix(windows[sequences, positions])
+            m_score = round(float(count_score(counts, t, score)), TIE_DECIMALS)
+            if m_score < b_score:
+                best_positions, b_score = positions, m_score
+            else:
+                break
+        results[r], scores[r] = best_positions, b_score
+    return results, scores
+
+
+def gibbs_sampler(dna_list, k, it=20, n=1000, score='entropy', patience=100, seed=None,
+                  workers=None, stop_after=None):
     """
     Runs Gibbs sampler on a given list of DNA sequences to find the best
     set of motifs.
 
     :param dna_list: a list of DNA strings
     :param k: the desired k-mer length
-    :param it: the number of sampler iterations
-    :param n: lower-level iterations; to be deprecated
+    :param it: the number of independent sampler chains
+    :param n: the maximum number of iterations per chain
     :param score: entropy or mismatch count
+    :param patience: stop a chain once its best score has not improved
+           for this many iterations; None always runs n iterations
+    :param seed: the seed each chain's seed is derived from
+    :param workers: optional number of processes to spread the chains over
+    :param stop_after: if given, stop once this many chains in a row
+           have not improved on the best score
 
     :return: the set of motifs with the lowest score
     """
-    # TODO fix iteration method
-    best_motifs = list()
-    best_score = len(dna_list) * k  # impossibly large score
-    for i in progressbar(range(it)):
-        motifs, low_score = _gibbs_sampler_(dna_list, k, score, n)
-        if low_score < best_score:
-            best_motifs = motifs
-            best_score = low_score
-    return best_motifs
-
-
-def _gibbs_sampler_(dna_list, k, score, n):
-    t = len(dna_list)
-    # Randomly select k-mer from each DNA string
-    motifs = list()
-    for i in range(t):
-        index = random.randint(0, len(dna_list[0]) - k)
-        motifs.append(dna_list[i][index:index+k])
-    best_motifs = motifs.copy()
-    # Get initial best motifs score
-    if score == 'entropy':
-        b_score = entropy_score(best_motifs)
-    else:
-        b_score = mismatch_score(best_motifs)
-
-    # Replace motifs randomly
-    for x in range(n):
-        # Randomly remove one string
-        i = random.randint(0, t-1)  # choose random string to remove
-        # Generate profile
-        profile = Profile(motifs[:i] + motifs[i + 1:])
-        # Generate probabilities for removed string
-        removed = dna_list[i]
-        probabilities = list()
-        for m in range(len(removed) - k+1):
-            kmer = removed[m:m+k]
-            probabilities.append(profile.kmer_probability(kmer))
-        # Choose profile-random k-mer from removed DNA sequence
-        j = _biased_random_(len(removed) - k, probabilities)
-        motifs[i] = removed[j:j +k]
-        # Compare scores
-        if score == 'entropy':
-            m_score = entropy_score(motifs)
-        else:
-            m_score = mismatch_score(motifs)
-        if m_score < b_score:
-            best_motifs = motifs.copy()
-            b_score = m_score
-
-    return best_motifs, b_score
-
-
-def _biased_random_(max_index, probabilities):
-    total = sum(probabilities)
-    probs = [p / total for p in probabilities]
-    return np.random.choice(max_index+1, p=probs)
-
-
-def median_string_search(k, dna_list):
+    positions, _ = run_restarts(gibbs_chains, encode_dna_list(dna_list), k, it, seed, workers,
+                                stop_after, n=n, patience=patience, score=score)
+    return [dna[p:p + k] for dna, p in zip(dna_list, positions.tolist())]
+
+
+MEDIAN_SEED_PATTERNS = 256
+
+
+def median_string_search(k, dna_list, workers=None):
     """
-    Finds the median string of a set of DNA strings.
+    Finds the median string of a set of DNA strings: the pattern with the
+    smallest total distance to the strings. The prefix tree of patterns
+    is searched depth first in A, C, G, T order, and a subtree is pruned
+    as soon as the distance of its prefix (a lower bound for every
+    pattern below it) is no better than the best total so far. The
+    search starts from the best of a sample of k-mers of the first string.
 
     :param k: the desired k-mer length
     :param dna_list: a list of DNA strings
+    :param workers: optional number of processes to search the top-level
+           branches in
 
-    :return: the median string
+    :return: the median string (the first in lexicographic order on ties)
     """
-    best_d = math.inf  # infinity
-    for i in range(1, 4 ** k):
-        pattern = number_to_pattern(i, k)
-        new_d = distance_pattern_strings(pattern, dna_list)
-        if new_d < best_d:
-            best_d = new_d
-            median = pattern
-    return median
+    if min(len(dna) for dna in dna_list) < k:
+        raise ValueError("every string must have at least {} bases".format(k))
+    codes = encode_dna_list(dna_list)
+    lengths = [len(dna) for dna in dna_list]
+    # Any pattern beats this bound, so ties with a sampled k-mer are still
+    # found in lexicographic order
+    seeds, valid = motif_windows(codes[:1, :lengths[0]], k)
+    seeds = seeds[0][np.isfinite(valid[0])]
+    seeds = seeds[np.linspace(0, len(seeds) - 1, min(len(seeds), MEDIAN_SEED_PATTERNS)).astype(int)]
+    totals = sum(batch_hamming_distances(seeds, dna).min(axis=1).astype(np.int64) for dna in dna_list)
+    bound = int(totals.min()) + 1
+
+    prefix_length = 0
+    while workers is not None and workers > 1 and 4 ** prefix_length < 4 * workers and prefix_length < k:
+        prefix_length += 1
+    codes_found, _ = run_batches(_median_string_search_, codes, k, list(range(4 ** prefix_length)),
+                                 workers, progress=False, batch_size=1,
+                                 prefix_length=prefix_length, lengths=lengths, bound=bound)
+    return number_to_pattern(int(codes_found[0]), k)
+
+
+def _median_string_search_(codes, k, prefixes, prefix_length=0, lengths=None, bound=math.inf):
+    # Searches the subtree under each prefix code; returns the best pattern
+    # code and total distance of each (distance inf if none beats bound)
+    windows = np.lib.stride_tricks.sliding_window_view(codes, k, axis=1)
+    t, n = windows.shape[:2]
+    # mismatches[j, b] marks the windows whose j-th base is not b
+    mismatches = (windows.transpose(2, 0, 1)[:, None] !=
+                  np.arange(4, dtype=np.uint8)[None, :, None, None]).astype(np.int32)
+    root = np.zeros((t, n), dtype=np.int32)
+    if lengths is not None:
+        # Windows running into the padding can never be the closest
+        root[np.arange(n)[None, :] > np.asarray(lengths)[:, None] - k] = k + 1
+
+    results = np.full((len(prefixes), 1), -1, dtype=np.int64)
+    scores = np.full(len(prefixes), math.inf)
+    for i, prefix in enumerate(prefixes):
+        distances = root.copy()
+        for depth in range(prefix_length):
+            base = (prefix >> (2 * (prefix_length - 1 - depth))) & 3
+            distances += mismatches[depth, base]
+        best = [bound, -1]
+        _branch_(distances, prefix, prefix_length, k, mismatches, best)
+        if best[1] >= 0:
+            results[i, 0], scores[i] = best[1], best[0]
+    return results, scores
+
+
+def _branch_(distances, code, depth, k, mismatches, best):
+    # distances[i, w] is the Hamming distance between the prefix and the
+    # start of window w of string i, so the sum of row minima bounds the
+    # total distance of every pattern with this prefix
+    if depth == k:
+        total = int(distances.min(axis=1).sum())
+        if total < best[0]:
+            best[0], best[1] = total, code
+        return
+    children = distances[None] + mismatches[depth]
+    bounds = children.min(axis=2).sum(axis=1)
+    for base in range(4):
+        if bounds[base] < best[0]:
+            _branch_(children[base], code * 4 + base, depth + 1, k, mismatches, best)
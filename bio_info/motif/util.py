@@ -1,7 +1,15 @@
-from .profile import Profile
+from math import comb
+
+import numpy as np
+
+from .profile import Profile, count_matrix, motif_codes
 from ..util import *
 
 
+DENSE_TABLE_MAX_K = 13
+NEIGHBOR_COST = 8
+
+
 def entropy_score(motif_list):
     """
     Get entropy for a list of motifs.
@@ -9,12 +17,7 @@ def entropy_score(motif_list):
     :param motif_list: a list of DNA strings of equal length
     :return: the sum of the entropy scores for each index / column of the DNA strings
     """
-    ent_score = 0
-    profile = Profile(motif_list)
-    for i in range(len(profile.get(0))):
-        ent_score += get_entropy(profile.get(0, i), profile.get(1, i),
-                                 profile.get(2, i), profile.get(3, i))
-    return ent_score
+    return Profile(motif_list).entropy_score()
 
 
 def mismatch_score(motif_list):
@@ -24,13 +27,60 @@ def mismatch_score(motif_list):
     :param motif_list: a list of DNA strings of equal length
     :return: the sum of the non-matching nucleotides in each position
     """
-    total_mismatch = 0
-    for i in range(len(motif_list[0])):
-        col = [motif[i] for motif in motif_list]
-        a, c, g, t = get_nucleotide_count(col)
-        largest = max(a, c, g, t)
-        total_mismatch += len(col) - largest
-    return total_mismatch
+    counts = count_matrix(motif_codes(motif_list))
+    return int((len(motif_list) - counts.max(axis=0)).sum())
+
+
+def count_score(counts, t, score='entropy'):
+    """
+    Scores motif sets from their count matrices, so a score can be
+    updated in O(k) when one motif changes.
+
+    :param counts: a 4 x k count matrix, or an array of them with the
+           nucleotide axis second to last
+    :param t: the number of motifs counted
+    :param score: entropy or mismatch count
+
+    :return: the score (an array for stacked count matrices), equal to
+             entropy_score or mismatch_score of the motifs
+    """
+    counts = np.asarray(counts)
+    if score == 'mismatch':
+        return (t - counts.max(axis=-2)).sum(axis=-1)
+    p = (counts + 1) / (t + 4)
+    return -(p * np.log2(p)).sum(axis=(-2, -1))
+
+
+def encode_dna_list(dna_list):
+    """
+    Encodes a list of DNA strings as one array of nucleotide codes,
+    padding shorter strings with the ambiguous code 4.
+
+    :param dna_list: a list of DNA strings
+    :return: a t x L uint8 array, where L is the longest length
+    """
+    length = max(len(dna) for dna in dna_list)
+    codes = np.full((len(dna_list), length), 4, dtype=np.uint8)
+    for i, dna in enumerate(dna_list):
+        codes[i, :len(dna)] = as_codes(dna)
+    return codes
+
+
+def motif_windows(codes, k):
+    """
+    Views every window of length k of each encoded sequence.
+
+    :param codes: a t x L array of nucleotide codes
+    :param k: the window length
+    :return: a t x (L - k + 1) x k view of the windows, and a t x
+             (L - k + 1) array that is 0 for windows without ambiguous
+             bases and -inf for the rest
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(codes, k, axis=1)
+    valid = np.where((windows < 4).all(axis=2), 0.0, -np.inf)
+    if np.isinf(valid).all(axis=1).any():
+        raise ValueError("every sequence needs a window of {} unambiguous bases".format(k))
+    return windows, valid
 
 
 def distance_pattern_strings(pattern, dna_list):
@@ -43,18 +93,117 @@ def distance_pattern_strings(pattern, dna_list):
 
     :return: the sum of the minimum Hamming distance for each string
     """
-    k = len(pattern)
     total_d = 0
     for dna in dna_list:
-        hamming_d = float("inf")  # infinity
-        for i in range(len(dna) - k+1):
-            dist = hamming_distance(pattern, dna[i:i+k])
-            if dist < hamming_d:
-                hamming_d = dist
-        total_d += hamming_d
+        distances = hamming_distances(pattern, dna)
+        if len(distances) == 0:
+            total_d += float("inf")  # infinity
+        else:
+            total_d += int(distances.min())
     return total_d
 
 
+def distance_table(dna_list, k, candidates=None, block_size=1 << 22):
+    """
+    Finds the distance_pattern_strings value of every pattern of length k
+    (or of a set of candidates) in one sweep. For each string, the
+    d-neighborhoods of its distinct k-mers are enumerated at increasing
+    radius to fill an array of minimum distances indexed by pattern code,
+    switching to direct XOR/popcount distances once the patterns still
+    unreached are fewer than the next radius would generate. The
+    per-string arrays are then summed. The table can be kept and indexed
+    by any later search on the same strings.
+
+    :param dna_list: a list of DNA strings, each at least k bases long
+    :param k: the pattern length (at most DENSE_TABLE_MAX_K without
+           :param candidates)
+    :param candidates: an optional array of pattern codes to score
+           instead of all 4 ** k patterns
+    :param block_size: the maximum number of distances computed at once
+
+    :return: an int64 array of total distances, indexed by pattern code
+             (or aligned with :param candidates)
+    """
+    if candidates is None:
+        if k > DENSE_TABLE_MAX_K:
+            raise ValueError("k must be at most {} for a full table".format(DENSE_TABLE_MAX_K))
+        size = 4 ** k
+    else:
+        candidates = np.asarray(candidates, dtype=np.uint64)
+        size = len(candidates)
+    total = np.zeros(size, dtype=np.int64)
+    digits = None
+    for dna in dna_list:
+        codes = as_codes(dna)
+        if len(codes) < k:
+            raise ValueError("every string must have at least {} bases".format(k))
+        kmers = encode_kmers(codes, k)
+        ambiguous = kmers == INVALID_KMER
+        exact = np.unique(kmers[~ambiguous])
+        if candidates is None:
+            best = _sweep_neighborhoods_(exact, k, block_size)
+        else:
+            best = _closest_distances_(candidates, exact, k, block_size)
+        if ambiguous.any():
+            # An ambiguous base mismatches every pattern, so these windows
+            # are compared base by base
+            if digits is None:
+                patterns = np.arange(size, dtype=np.uint64) if candidates is None else candidates
+                shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.uint64)
+                digits = ((patterns[None, :] >> shifts[:, None]) & np.uint64(3)).astype(np.uint8)
+            windows = np.lib.stride_tricks.sliding_window_view(codes, k)[ambiguous]
+            for window in np.unique(windows, axis=0):
+                distances = np.full(size, np.count_nonzero(window > 3), dtype=np.uint8)
+                for j in np.flatnonzero(window <= 3).tolist():
+                    distances += digits[j] != window[j]
+                np.minimum(best, distances, out=best)
+        total += best
+    return total
+
+
+def _sweep_neighborhoods_(kmers, k, block_size):
+    # Minimum distance from every pattern code to a set of k-mers
+    best = np.full(4 ** k, k, dtype=np.uint8)
+    if len(kmers) == 0:
+        return best
+    reached = np.zeros(4 ** k, dtype=bool)
+    small = kmers.astype(np.uint32)  # codes fit in 32 bits for a dense table
+    unreached = 4 ** k
+    generated = 0  # masks within the previous radius
+    for r in range(k):
+        at_radius = comb(k, r) * 3 ** r
+        # Generating a neighbor costs several times more than a direct distance
+        if unreached <= NEIGHBOR_COST * at_radius:
+            remaining = np.flatnonzero(~reached)
+            best[remaining] = _closest_distances_(remaining, kmers, k, block_size)
+            return best
+        masks = neighborhood_masks(k, r)[generated:].astype(np.uint32)
+        generated += at_radius
+        step = max(block_size // len(masks), 1)
+        hit = np.zeros(4 ** k, dtype=bool)
+        for i in range(0, len(kmers), step):
+            hit[(small[i:i + step, None] ^ masks[None, :]).ravel()] = True
+        hit &= ~reached
+        best[hit] = r
+        reached |= hit
+        unreached -= int(np.count_nonzero(hit))
+        if unreached == 0:
+            break
+    return best
+
+
+def _closest_distances_(patterns, kmers, k, block_size):
+    # Minimum distance from each pattern code to a set of k-mers, directly
+    best = np.full(len(patterns), k, dtype=np.uint8)
+    if len(kmers) == 0:
+        return best
+    step = max(block_size // len(kmers), 1)
+    for i in range(0, len(patterns), step):
+        block = np.asarray(patterns[i:i + step], dtype=np.uint64)
+        best[i:i + step] = kmer_code_distances(block[:, None], kmers[None, :], k).min(axis=1)
+    return best
+
+
 def form_consensus_string(motif_list):
     """
     Generates a consensus string for each position in a motif matrix using the
@@ -64,16 +213,5 @@ def form_consensus_string(motif_list):
     :return: a single DNA sequence representing the most common nucleotide for
              each position in the given list of motifs
     """
-    consensus = list()
-    for i in range(len(motif_list[0])):
-        a, c, g, t = get_nucleotide_count(''.join(motif[i] for motif in motif_list))
-        high_count = max(a, c, g, t)
-        if a == high_count:
-            consensus.append("A")
-        elif c == high_count:
-            consensus.append("C")
-        elif g == high_count:
-            consensus.append("G")
-        elif t == high_count:
-            consensus.append("T")
-    return ''.join(consensus)
+    counts = count_matrix(motif_codes(motif_list))
+    return decode_symbols(counts.argmax(axis=0).astype(np.uint8))
@@ -0,0 +1,6 @@
+import sys
+
+from .pipeline import main
+
+
+sys.exit(main())
@@ -0,0 +1,377 @@
+from math import comb
+from multiprocessing import Pool
+
+import numpy as np
+
+from ..util.kmer import (encode_kmers, decode_kmers, reverse_complement_kmers,
+                         add_d_neighborhood, neighborhood_masks, record_sequence, INVALID_KMER)
+from ..util.packed import PackedDNA, as_codes
+from ..util.shared import share_arrays, attach_arrays, release_arrays
+
+
+DENSE_MAX_K = 13
+# A dense array of 4 ** k counts is only used once there are at least
+# 4 ** k / DENSE_RATIO k-mers to put in it; fewer are counted by sorting
+DENSE_RATIO = 8
+TASKS_PER_WORKER = 4
+
+
+class KmerCounts:
+    """
+    Counts of distinct k-mers held as two parallel arrays: the k-mer codes
+    in increasing order and their counts.
+    """
+    def __init__(self, kmers, counts, k, canonical=False):
+        """
+        :param kmers: a sorted array of distinct k-mer codes
+        :param counts: the count of each k-mer
+        :param k: the length of the k-mers
+        :param canonical: whether each code stands for a k-mer and its
+               reverse complement
+        """
+        self.kmers = np.asarray(kmers, dtype=np.uint64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.k = k
+        self.canonical = canonical
+
+    def __len__(self):
+        return len(self.kmers)
+
+    def get(self, pattern):
+        """
+        Gets the count of a single k-mer.
+
+        :param pattern: a DNA string or a k-mer code
+        :return: the number of times the k-mer was seen
+        """
+        if isinstance(pattern, str):
+            code = encode_kmers(pattern, self.k, self.canonical)[0]
+        else:
+            code = np.uint64(pattern)
+        i = np.searchsorted(self.kmers, code)
+        if i < len(self.kmers) and self.kmers[i] == code:
+            return int(self.counts[i])
+        return 0
+
+    def lookup(self, kmers):
+        """
+        Gets the counts of many k-mer codes at once.
+
+        :param kmers: an array of k-mer codes
+        :return: an array of counts, 0 for k-mers that were not seen
+        """
+        kmers = np.asarray(kmers, dtype=np.uint64)
+        i = np.minimum(np.searchsorted(self.kmers, kmers), max(len(self.kmers) - 1, 0))
+        if len(self.kmers) == 0:
+            return np.zeros(len(kmers), dtype=np.int64)
+        return np.where(self.kmers[i] == kmers, self.counts[i], 0)
+
+    def max_count(self):
+        """
+        Gets the largest count, or 0 if there are no k-mers.
+        """
+        return int(self.counts.max()) if len(self.counts) > 0 else 0
+
+    def top(self, n):
+        """
+        Gets the n most frequent k-mers, breaking ties by k-mer order.
+
+        :return: a list of (k-mer, count) tuples
+        """
+        order = np.lexsort((self.kmers, -self.counts))[:n]
+        return self._pairs_(order)
+
+    def above(self, threshold):
+        """
+        Gets every k-mer seen at least :param threshold times.
+
+        :return: a list of (k-mer, count) tuples in k-mer order
+        """
+        return self._pairs_(np.flatnonzero(self.counts >= threshold))
+
+    def to_dict(self):
+        """
+        Converts the counts to a dictionary of k-mer strings.
+        """
+        return dict(self._pairs_(slice(None)))
+
+    def _pairs_(self, index):
+        return list(zip(decode_kmers(self.kmers[index], self.k).tolist(),
+                        self.counts[index].tolist()))
+
+
+def count_kmers(dna, k, canonical=False, workers=None):
+    """
+    Counts every k-mer of one or more sequences from their integer codes.
+    For k <= DENSE_MAX_K and enough k-mers to fill a good part of it, the
+    counts are accumulated in a dense array of size 4 ** k; otherwise the
+    k-mers are counted by sorting. K-mers that contain an ambiguous base
+    are skipped.
+
+    :param dna: a string of DNA, a PackedDNA, an array of codes, or an
+           iterable of these, of (name, start, chunk) tuples from
+           read_chunks (with an overlap of k - 1) or of records from
+           read_records
+    :param k: the length of each k-mer
+    :param canonical: if True, count each k-mer together with its reverse
+           complement under the smaller of the two codes
+    :param workers: if greater than 1, count in a pool of this many
+           processes; a single sequence is shared with the workers and
+           split into overlapping chunks. The result is identical to the
+           serial count.
+
+    :return: a KmerCounts
+    """
+    if workers is not None and workers > 1:
+        return _parallel_count_kmers_(dna, k, canonical, workers)
+    if isinstance(dna, (str, bytes, PackedDNA, np.ndarray)):
+        dna = [dna]
+    total = None
+    parts = list()
+    seen = 0
+    for seq in dna:
+        kmers = encode_kmers(record_sequence(seq), k, canonical)
+        kmers = kmers[kmers != INVALID_KMER]
+        seen += len(kmers)
+        if total is None and _use_dense_(k, seen):
+            total = _dense_total_(k, parts)
+            parts = list()
+        if total is not None:
+            total += np.bincount(kmers.astype(np.intp), minlength=len(total))
+        else:
+            parts.append(np.unique(kmers, return_counts=True))
+    if total is not None:
+        kmers = np.flatnonzero(total).astype(np.uint64)
+        return KmerCounts(kmers, total[kmers.astype(np.intp)], k, canonical)
+    return KmerCounts(*merge_counts(parts), k, canonical)
+
+
+def count_kmers_with_mismatches(dna, k, d, canonical=False, block_size=1 << 22, workers=None):
+    """
+    Counts, for every pattern of length k, the k-mers of a sequence that
+    are within Hamming distance d of it. Each distinct k-mer of the
+    sequence adds its count to every pattern in its d-neighborhood, so the
+    sequence is only scanned once. For k <= DENSE_MAX_K and enough
+    neighbors to fill a good part of it, the counts are accumulated in a
+    dense array; otherwise the neighbors are counted by sorting them in
+    blocks, which needs memory for every distinct neighbor.
+
+    :param dna: a string of DNA, a PackedDNA, an array of codes, or an
+           iterable of these, or the (non-canonical) KmerCounts of the
+           sequence from count_kmers, which is then not counted again
+    :param k: the length of each k-mer
+    :param d: the maximum number of mismatches
+    :param canonical: if True, add the counts of each pattern's reverse
+           complement and key the result by the smaller code; see
+           :func:`merge_reverse_complements`
+    :param block_size: the maximum number of neighbors generated at once
+    :param workers: if greater than 1, use a pool of this many processes;
+           the patterns are split by prefix, so each worker fills its own
+           range of the result and no merge is needed
+
+    :return: a KmerCounts with every pattern that has a nonzero count
+    """
+    exact = dna if isinstance(dna, KmerCounts) else count_kmers(dna, k, workers=workers)
+    if workers is not None and workers > 1:
+        kmers, counts = _parallel_neighbor_counts_(exact, d, block_size, workers)
+    elif _use_dense_(k, len(exact) * _neighborhood_size_(k, d)):
+        total = np.zeros(4 ** k, dtype=np.int64)
+        add_d_neighborhood(total, exact.kmers, k, d, exact.counts, block_size)
+        kmers = np.flatnonzero(total).astype(np.uint64)
+        counts = total[kmers.astype(np.intp)]
+    else:
+        masks = neighborhood_masks(k, d)
+        step = max(block_size // len(masks), 1)
+        parts = list()
+        for i in range(0, len(exact), step):
+            neighbors = (exact.kmers[i:i + step, None] ^ masks[None, :]).ravel()
+            weights = np.repeat(exact.counts[i:i + step], len(masks))
+            unique, inverse = np.unique(neighbors, return_inverse=True)
+            parts.append((unique, np.bincount(inverse.ravel(), weights=weights,
+                                              minlength=len(unique)).astype(np.int64)))
+        kmers, counts = merge_counts(parts)
+    if canonical:
+        kmers, counts = merge_reverse_complements(kmers, counts, k)
+    return KmerCounts(kmers, counts, k, canonical)
+
+
+def merge_counts(parts):
+    """
+    Merges several (k-mers, counts) array pairs into one.
+
+    :param parts: a list of (sorted k-mer codes, counts) tuples
+    :return: the merged sorted k-mer codes and summed counts
+    """
+    if len(parts) == 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+    kmers = np.concatenate([p[0] for p in parts])
+    counts = np.concatenate([p[1] for p in parts])
+    merged, inverse = np.unique(kmers, return_inverse=True)
+    return merged, np.bincount(inverse.ravel(), weights=counts,
+                               minlength=len(merged)).astype(np.int64)
+
+
+def merge_reverse_complements(kmers, counts, k):
+    """
+    Combines the counts of each k-mer and its reverse complement under the
+    smaller code, so the count of a pattern P is Count(P) + Count(rcP). A
+    palindromic k-mer is its own reverse complement, so its count doubles.
+
+    :param kmers: an array of distinct k-mer codes
+    :param counts: the count of each k-mer
+    :param k: the length of the k-mers
+
+    :return: the sorted canonical codes and their combined counts
+    """
+    kmers = np.asarray(kmers, dtype=np.uint64)
+    counts = np.asarray(counts, dtype=np.int64)
+    rc_kmers = reverse_complement_kmers(kmers, k)
+    counts = np.where(rc_kmers == kmers, 2 * counts, counts)
+    return merge_counts([(np.minimum(kmers, rc_kmers), counts)])
+
+
+def _use_dense_(k, size):
+    # Whether size k-mers are better counted in a dense array than sorted
+    return k <= DENSE_MAX_K and 4 ** k <= DENSE_RATIO * size
+
+
+def _dense_total_(k, parts):
+    # A dense count array holding the sorted (k-mers, counts) parts so far
+    total = np.zeros(4 ** k, dtype=np.int64)
+    for kmers, counts in parts:
+        total[kmers.astype(np.intp)] += counts
+    return total
+
+
+def _neighborhood_size_(k, d):
+    return sum(comb(k, i) * 3 ** i for i in range(min(d, k) + 1))
+
+
+""" Parallel counting """
+
+_shared = dict()
+
+
+def _attach_(specs, settings):
+    _shared.clear()
+    _shared.update(settings)
+    _shared.update(attach_arrays(specs))
+
+
+def _parallel_count_kmers_(dna, k, canonical, workers):
+    if isinstance(dna, (str, bytes, PackedDNA, np.ndarray)):
+        codes = as_codes(dna)
+        n = len(codes)
+        segments, specs = share_arrays({'codes': codes})
+        step = -(-max(n - k + 1, 1) // (workers * TASKS_PER_WORKER))
+        tasks = [(start, min(start + step, n - k + 1)) for start in range(0, n - k + 1, step)]
+        task, pieces = _count_range_, tasks
+    else:
+        segments, specs = list(), dict()
+        task, pieces = _count_piece_, dna
+    try:
+        with Pool(workers, _attach_, (specs, {'k': k, 'canonical': canonical})) as pool:
+            total = None
+            parts = list()
+            seen = 0
+            for kmers, counts in pool.imap_unordered(task, pieces):
+                seen += int(counts.sum())
+                if total is None and _use_dense_(k, seen):
+                    total = _dense_total_(k, parts)
+                    parts = list()
+                if total is not None:
+                    total[kmers.astype(np.intp)] += counts
+                else:
+                    parts.append((kmers, counts))
+    finally:
+        release_arrays(segments)
+    if total is not None:
+        kmers = np.flatnonzero(total).astype(np.uint64)
+        return KmerCounts(kmers, total[kmers.astype(np.intp)], k, canonical)
+    return KmerCounts(*merge_counts(parts), k, canonical)
+
+
+def _count_range_(bounds):
+    start, end = bounds
+    return _count_piece_(_shared['codes'][start:end + _shared['k'] - 1])
+
+
+def _count_piece_(dna):
+    # Counts one chunk into sorted (k-mers, counts) arrays
+    k = _shared['k']
+    kmers = encode_kmers(record_sequence(dna), k, _shared['canonical'])
+    kmers = kmers[kmers != INVALID_KMER]
+    if _use_dense_(k, len(kmers)):
+        counts = np.bincount(kmers.astype(np.intp), minlength=4 ** k)
+        kmers = np.flatnonzero(counts)
+        return kmers.astype(np.uint64), counts[kmers]
+    return np.unique(kmers, return_counts=True)
+
+
+def _parallel_neighbor_counts_(exact, d, block_size, workers):
+    k = exact.k
+    # Patterns are split into 4 ** m ranges by their first m bases
+    m = 0
+    while 4 ** m < workers * TASKS_PER_WORKER and m < k:
+        m += 1
+    dense = _use_dense_(k, len(exact) * _neighborhood_size_(k, d))
+    arrays = {'kmers': exact.kmers, 'counts': exact.counts}
+    if dense:
+        arrays['total'] = np.zeros(4 ** k, dtype=np.int64)
+    segments, specs = share_arrays(arrays)
+    settings = {'k': k, 'd': d, 'm': m, 'block_size': block_size, 'dense': dense}
+    try:
+        with Pool(workers, _attach_, (specs, settings)) as pool:
+            parts = pool.map(_neighbor_range_, range(4 ** m))
+        if dense:
+            total = np.ndarray(specs['total'][1], np.int64, buffer=segments[-1].buf).copy()
+    finally:
+        release_arrays(segments)
+    if dense:
+        kmers = np.flatnonzero(total).astype(np.uint64)
+        return kmers, total[kmers.astype(np.intp)]
+    return (np.concatenate([p[0] for p in parts]),
+            np.concatenate([p[1] for p in parts]))
+
+
+def _neighbor_range_(prefix):
+    # Adds up every neighbor whose first m bases equal prefix. A k-mer
+    # starting with a reaches that range only through the masks whose
+    # first m bases are a ^ prefix.
+    k, m = _shared['k'], _shared['m']
+    kmers, counts = _shared['kmers'], _shared['counts']
+    shift = np.uint64(2 * (k - m))
+    width = 4 ** (k - m)
+    masks = neighborhood_masks(k, _shared['d'])
+    mask_prefixes = (masks >> shift).astype(np.intp)
+    masks = masks[np.argsort(mask_prefixes, kind='stable')]
+    mask_bounds = np.searchsorted(np.sort(mask_prefixes), np.arange(4 ** m + 1))
+    kmer_bounds = np.searchsorted(kmers, np.arange(4 ** m + 1, dtype=np.uint64) << shift)
+    base = np.uint64(prefix) << shift
+    dense = _shared['dense']
+    if dense:
+        total = _shared['total'][prefix * width:(prefix + 1) * width]
+    else:
+        parts = list()
+    for a in range(4 ** m):
+        group = masks[mask_bounds[a ^ prefix]:mask_bounds[(a ^ prefix) + 1]]
+        if len(group) == 0:
+            continue
+        step = max(_shared['block_size'] // len(group), 1)
+        for i in range(kmer_bounds[a], kmer_bounds[a + 1], step):
+            j = min(i + step, kmer_bounds[a + 1])
+            neighbors = ((kmers[i:j, None] ^ group[None, :]) - base).ravel().astype(np.intp)
+            weights = np.repeat(counts[i:j], len(group))
+            if dense and len(neighbors) * 4 >= width:
+                total += np.bincount(neighbors, weights=weights,
+                                     minlength=width).astype(np.int64)
+            elif dense:
+                np.add.at(total, neighbors, weights)
+            else:
+                unique, inverse = np.unique(neighbors, return_inverse=True)
+                parts.append((unique.astype(np.uint64) + base,
+                              np.bincount(inverse.ravel(), weights=weights,
+                                          minlength=len(unique)).astype(np.int64)))
+    if dense:
+        return None
+    return merge_counts(parts)
@@ -0,0 +1,244 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ..util.kmer import encode_kmers, decode_kmers, kmer_batches, INVALID_KMER
+from .count import KmerCounts, merge_counts
+
+
+COUNT_DTYPE = np.uint32
+COUNT_LIMIT = int(np.iinfo(COUNT_DTYPE).max)
+# Every bucket file is open while k-mers are distributed, so 4 ** this
+# must stay well under the per-process open file limit
+MAX_PREFIX_LENGTH = 4
+OPEN_FILE_RESERVE = 64
+
+
+class KmerDatabase(KmerCounts):
+    """
+    Sorted k-mer codes and their counts stored as two flat binary files
+    and read through memory maps, so a lookup only touches the pages its
+    binary search visits. Counts saturate at COUNT_LIMIT.
+
+    The directory holds kmers.bin (uint64), counts.bin (uint32) and
+    info.json with k, canonical and the number of k-mers.
+    """
+    def __init__(self, path):
+        """
+        Opens a database written by count_kmers_external or solid.
+
+        :param path: the database directory
+        """
+        with open(os.path.join(path, 'info.json')) as f:
+            info = json.load(f)
+        self.path = path
+        self.k = info['k']
+        self.canonical = info['canonical']
+        self.kmers = _map_(os.path.join(path, 'kmers.bin'), np.uint64, info['size'])
+        self.counts = _map_(os.path.join(path, 'counts.bin'), COUNT_DTYPE, info['size'])
+
+    def __iter__(self):
+        for kmers, counts in self.blocks():
+            yield from zip(decode_kmers(kmers, self.k).tolist(), counts.tolist())
+
+    def blocks(self, block_size=1 << 20):
+        """
+        Iterates over the database in k-mer order.
+
+        :return: a generator of (k-mer codes, counts) array pairs
+        """
+        for i in range(0, len(self), block_size):
+            yield np.asarray(self.kmers[i:i + block_size]), np.asarray(self.counts[i:i + block_size])
+
+    def top(self, n):
+        """
+        Gets the n most frequent k-mers, breaking ties by k-mer order,
+        holding at most one block and n candidates in memory.
+
+        :return: a list of (k-mer, count) tuples
+        """
+        best_kmers = np.zeros(0, dtype=np.uint64)
+        best_counts = np.zeros(0, dtype=np.int64)
+        for kmers, counts in self.blocks():
+            kmers = np.concatenate((best_kmers, kmers))
+            counts = np.concatenate((best_counts, counts.astype(np.int64)))
+            order = np.lexsort((kmers, -counts))[:n]
+            best_kmers, best_counts = kmers[order], counts[order]
+        return list(zip(decode_kmers(best_kmers, self.k).tolist(), best_counts.tolist()))
+
+    def above(self, threshold):
+        """
+        Gets every k-mer seen at least :param threshold times.
+
+        :return: a list of (k-mer, count) tuples in k-mer order
+        """
+        pairs = list()
+        for kmers, counts in self.blocks():
+            keep = counts >= threshold
+            pairs.extend(zip(decode_kmers(kmers[keep], self.k).tolist(), counts[keep].tolist()))
+        return pairs
+
+    def histogram(self, max_count=None):
+        """
+        Counts how many k-mers were seen each number of times.
+
+        :param max_count: if given, k-mers seen more often are added to
+               the last entry
+
+        :return: an array h where h[c] is the number of k-mers seen c times
+        """
+        histogram = np.zeros(1 if max_count is None else max_count + 1, dtype=np.int64)
+        for _, counts in self.blocks():
+            if max_count is not None:
+                counts = np.minimum(counts, max_count)
+            block = np.bincount(counts, minlength=len(histogram))
+            if len(block) > len(histogram):
+                block[:len(histogram)] += histogram
+                histogram = block
+            else:
+                histogram += block
+        return histogram
+
+    def solid(self, min_count, path):
+        """
+        Writes the k-mers seen at least :param min_count times, such as
+        those above the error peak of :func:`histogram`, to a new database.
+
+        :param path: the directory of the new database
+        :return: the new KmerDatabase
+        """
+        writer = _DatabaseWriter_(path, self.k, self.canonical)
+        for kmers, counts in self.blocks():
+            keep = counts >= min_count
+            writer.append(kmers[keep], counts[keep])
+        return writer.close()
+
+
+def count_kmers_external(dna, k, path, canonical=False, memory=1 << 30,
+                         prefix_length=4, temp_dir=None):
+    """
+    Counts k-mers that do not fit in memory. K-mers are first written to
+    one bucket file per prefix of :param prefix_length bases, then each
+    bucket is counted on its own and appended to the database, which is
+    sorted because the buckets are in prefix order. A bucket too large
+    for the memory budget is counted in several passes over sub-ranges of
+    its codes.
+
+    :param dna: a string of DNA, a PackedDNA, an array of codes, or an
+           iterable of these, of read_chunks tuples (with an overlap of
+           k - 1) or of read_records records
+    :param k: the length of each k-mer
+    :param path: the directory to write the database to
+    :param canonical: if True, count each k-mer together with its reverse
+           complement under the smaller of the two codes
+    :param memory: the approximate number of bytes of working memory
+    :param prefix_length: the number of leading bases used to pick a
+           bucket, giving 4 ** prefix_length buckets (at most
+           4 ** MAX_PREFIX_LENGTH); a ValueError is raised if the bucket
+           files would not fit under the open file limit
+    :param temp_dir: where to put the bucket files; defaults to the
+           system temporary directory
+
+    :return: the KmerDatabase
+    """
+    prefix_length = min(prefix_length, k, MAX_PREFIX_LENGTH)
+    buckets = 4 ** prefix_length
+    limit = _open_file_limit_()
+    if limit is not None and buckets + OPEN_FILE_RESERVE > limit:
+        raise ValueError("prefix_length {} needs {} open bucket files but the open file limit is {}; "
+                         "use a smaller prefix_length".format(prefix_length, buckets, limit))
+    shift = np.uint64(2 * (k - prefix_length))
+    # Encoding a batch takes about 40 bytes per base and counting about
+    # 32 bytes per k-mer (the codes, their sorted copy and the result)
+    batch_size = max(memory // 40, 1 << 16)
+    pass_size = max(memory // 32, 1 << 16)
+    work = tempfile.mkdtemp(prefix='kmers', dir=temp_dir)
+    try:
+        names = [os.path.join(work, '{}.bin'.format(b)) for b in range(buckets)]
+        sizes = np.zeros(buckets, dtype=np.int64)
+        files = [open(name, 'wb') for name in names]
+        try:
+            for codes in kmer_batches(dna, k, batch_size):
+                kmers = encode_kmers(codes, k, canonical)
+                kmers = kmers[kmers != INVALID_KMER]
+                prefixes = (kmers >> shift).astype(np.uint16)
+                order = np.argsort(prefixes, kind='stable')
+                bounds = np.searchsorted(prefixes[order], np.arange(buckets + 1))
+                kmers = kmers[order]
+                for b in np.flatnonzero(np.diff(bounds)).tolist():
+                    kmers[bounds[b]:bounds[b + 1]].tofile(files[b])
+                sizes += np.diff(bounds)
+        finally:
+            for f in files:
+                f.close()
+
+        writer = _DatabaseWriter_(path, k, canonical)
+        width = 1 << int(shift)
+        for b in range(buckets):
+            passes = max(-(-int(sizes[b]) // pass_size), 1)
+            step = -(-width // passes)
+            for start in range(0, width, step):
+                code_range = None
+                if passes > 1:
+                    code_range = (b * width + start, b * width + min(start + step, width))
+                writer.append(*_count_bucket_(names[b], int(sizes[b]), code_range, pass_size))
+            os.remove(names[b])
+        return writer.close()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def _count_bucket_(name, size, code_range, block_size):
+    # Counts the codes of a bucket file (only those in code_range, if
+    # given) one block at a time
+    parts = list()
+    for offset in range(0, size, block_size):
+        kmers = np.fromfile(name, dtype=np.uint64, count=block_size, offset=offset * 8)
+        if code_range is not None:
+            start, end = np.uint64(code_range[0]), np.uint64(code_range[1])
+            kmers = kmers[(kmers >= start) & (kmers < end)]
+        parts.append(np.unique(kmers, return_counts=True))
+        if len(parts) > 1:
+            parts = [merge_counts(parts)]
+    return merge_counts(parts)
+
+
+class _DatabaseWriter_:
+    # Appends sorted blocks to the files of a KmerDatabase
+    def __init__(self, path, k, canonical):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.info = {'k': k, 'canonical': canonical, 'size': 0}
+        self.kmers = open(os.path.join(path, 'kmers.bin'), 'wb')
+        self.counts = open(os.path.join(path, 'counts.bin'), 'wb')
+
+    def append(self, kmers, counts):
+        np.asarray(kmers, dtype=np.uint64).tofile(self.kmers)
+        np.minimum(counts, COUNT_LIMIT).astype(COUNT_DTYPE).tofile(self.counts)
+        self.info['size'] += len(kmers)
+
+    def close(self):
+        self.kmers.close()
+        self.counts.close()
+        with open(os.path.join(self.path, 'info.json'), 'w') as f:
+            json.dump(self.info, f)
+        return KmerDatabase(self.path)
+
+
+def _open_file_limit_():
+    # The soft limit on open files, or None if unknown or unlimited
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    return None if soft == resource.RLIM_INFINITY else soft
+
+
+def _map_(file_name, dtype, size):
+    if size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(file_name, dtype=dtype, mode='r', shape=(size,))
@@ -1,143 +1,207 @@
 from ..util import *
-import re
+from .count import (count_kmers, count_kmers_with_mismatches, merge_reverse_complements,
+                    KmerCounts)
+from .skew import track_skew
 
+import numpy as np
 
-def get_kmer_count_dict(dna, k, precision='exact', d=None):
+
+def get_kmer_count_dict(dna, k, precision='exact', d=None, workers=None):
     """
     Creates a dictionary of counts for each k-mer in a string.
     
-    :param dna: a string of DNA
+    :param dna: a string of DNA or a PackedDNA
     :param k: the length of each substring
     :param precision: how much precision is required in obtaining kmer_count
             exact: exact string matches
             mismatch: string matches with d or fewer differences
-            reverse: string matches reverse complement as well
+            reverse: string matches reverse complement as well, keyed by
+                     the lexicographically smaller of the pair; a
+                     palindrome counts twice, as its own reverse complement
             loose: includes mismatch and reverse options
     :param d: optional param indicating maximum number of mismatches (Hamming distance)
+    :param workers: optional number of processes to count with
     
-    :return: a dictionary of each k-mer and the number of times it appears, the largest count
+    :return: a dictionary of each k-mer and the number of times it appears, the largest count;
+             a string with symbols other than uppercase ACGT is counted string by string, so
+             case is kept and windows with N are counted like any other
     """
-    k_mers = dict()
-    largest_count = 0
+    if not isinstance(dna, PackedDNA) and not set(dna) <= set('ACGT'):
+        return _string_kmer_count_dict_(dna, k, precision, d)
+    exact = count_kmers(dna, k, workers=workers)
+    kmers, counts = exact.kmers, exact.counts
+    if precision == 'mismatch' or precision == 'loose':
+        counts = count_kmers_with_mismatches(exact, k, d, workers=workers).lookup(kmers)
+    if precision == 'reverse' or precision == 'loose':
+        kmers, counts = merge_reverse_complements(kmers, counts, k)
+    counts = KmerCounts(kmers, counts, k, precision == 'reverse' or precision == 'loose')
+
+    # Return dictionary of existing k-mers and their counts
+    return counts.to_dict(), counts.max_count()
+
 
-    # Run for all precision levels
-    for i in range(0, len(dna) - k):
+def _string_kmer_count_dict_(dna, k, precision, d):
+    # get_kmer_count_dict over the symbols of a string as they are
+    k_mers = dict()
+    for i in range(len(dna) - k + 1):
         seq = dna[i:i + k]
-        if seq in k_mers:
-            k_mers[seq] += 1
-            if k_mers[seq] > largest_count:
-                largest_count = k_mers[seq]
-        else:
-            k_mers[seq] = 1
+        k_mers[seq] = k_mers.get(seq, 0) + 1
 
     if precision == 'mismatch' or precision == 'loose':
         for k_mer in k_mers.keys():
-            indexes = find_approximate_match_indexes(dna, k_mer, d)
-            k_mers[k_mer] = len(indexes)
-            if k_mers[k_mer] > largest_count:
-                largest_count = k_mers[k_mer]
+            k_mers[k_mer] = int(np.count_nonzero(hamming_distances(k_mer, dna) <= d))
 
     if precision == 'reverse' or precision == 'loose':
         new_kmers = dict()
-        for k_mer in k_mers.keys():
-            rc_kmer = reverse_complement(k_mer)
-            # Only add if reverse complement isn't already in new dictionary
-            if rc_kmer not in new_kmers:
-                # Determine if reverse complement is also present in the DNA
-                if rc_kmer in k_mers:
-                    # Add reverse complement count to current count
-                    total_count = k_mers[k_mer] + k_mers[rc_kmer]
-                else:
-                    total_count = k_mers[k_mer]
-                # Add to new list of k-mers
-                new_kmers[k_mer] = total_count
-                if new_kmers[k_mer] > largest_count:
-                    largest_count = new_kmers[k_mer]
+        for k_mer, count in k_mers.items():
+            key = min(k_mer, reverse_complement(k_mer))
+            new_kmers[key] = count + k_mers.get(reverse_complement(k_mer), 0)
         k_mers = new_kmers
 
-    # Return dictionary of existing k-mers and their counts
-    return k_mers, largest_count
+    return k_mers, max(k_mers.values(), default=0)
 
     
+def frequent_words_with_mismatches(dna, k, d, reverse=False, n=None, workers=None):
+    """
+    Finds the most frequent k-mers with up to d mismatches, including
+    patterns that never appear exactly in the sequence.
+
+    :param dna: a string of DNA or a PackedDNA
+    :param k: the length of each k-mer
+    :param d: maximum number of mismatches (Hamming distance)
+    :param reverse: if True, also count approximate matches of each
+           pattern's reverse complement; each pair is reported once under
+           the lexicographically smaller pattern
+    :param n: if given, return the n most frequent patterns instead of
+           all patterns that share the largest count
+    :param workers: optional number of processes to count with
+
+    :return: a list of (pattern, count) tuples, most frequent first
+    """
+    counts = count_kmers_with_mismatches(dna, k, d, canonical=reverse, workers=workers)
+    if n is not None:
+        return counts.top(n)
+    return counts.above(counts.max_count())
+
+
+CHUNK_SIZE = 1 << 20
+
+
 def find_pattern_clumps(dna, k, L, t):
     """
     Find all patterns forming (L, t)-clumps in a given sequence of DNA.
     
-    :param dna: a string of DNA
+    :param dna: a string of DNA or a PackedDNA
     :param k: the length of each k-mer
     :param L: the size of the window determining clumps
     :param t: the number of required occurrences
     
-    :return: a list of patterns that meet the clumping requirements
+    :return: a set of patterns that meet the clumping requirements
     """
-    # Create dictionary of k-mers
-    k_mers = dict()
-    for i in range(len(dna) - k):
-        seq = dna[i:i + k]
-        if seq in k_mers:
-            k_mers[seq] += 1
-        else:
-            k_mers[seq] = 1
-
-    # Get list of more common k_mers
-    sequences = set()
-    for sequence, frequency in k_mers.items():
-        if frequency >= t:
-            sequences.add(sequence)
-
-    #  Create list of indexes for each common k_mer
-    k_mer_indexes = dict()
-    for pattern in sequences:
-        pattern_lookup = '(?=' + pattern + ')'  # to find overlapping matches
-        indexes = [s.start() for s in re.finditer(pattern_lookup, dna)]
-        k_mer_indexes[pattern] = indexes
-
-    # Look for clumps
-    sequences.clear()
-    for pattern in k_mer_indexes:
-        indexes = k_mer_indexes.get(pattern)
-        for i in range(0, len(indexes) - t + 1):
-            if indexes[i + t - 1] + k - indexes[i] <= L:  # make sure it completely fits
-                sequences.add(pattern)    
+    finder = ClumpFinder(k, L, t)
+    for i in range(0, len(dna), CHUNK_SIZE):
+        finder.update(dna[i:i + CHUNK_SIZE])
+    return finder.clumps()
+
+
+class ClumpFinder:
+    """
+    Streaming (L, t)-clump detection. Sequence is fed in consecutive
+    pieces; only the k-mers of the current window (the last L - k + 1
+    start positions) and the patterns found so far are kept between
+    pieces, so memory does not grow with the genome.
+    """
+    def __init__(self, k, L, t):
+        """
+        :param k: the length of each k-mer
+        :param L: the size of the window determining clumps
+        :param t: the number of required occurrences
+        """
+        self.k = k
+        self.L = L
+        self.t = t
+        self.length = 0
+        self._carry = np.zeros(0, dtype=np.uint8)
+        self._window_kmers = np.zeros(0, dtype=np.uint64)
+        self._window_positions = np.zeros(0, dtype=np.int64)
+        self._found = set()
+
+    def update(self, dna, start=None):
+        """
+        Adds the next piece of the sequence.
+
+        :param dna: a string of DNA, a PackedDNA or an array of codes
+        :param start: the position of :param dna within the whole sequence,
+               as given by read_chunks; bases before the current length
+               are skipped, so overlapping chunks can be passed directly
+        """
+        codes = as_codes(dna)
+        if start is not None:
+            if start > self.length:
+                raise ValueError("chunk starting at {} leaves a gap after {}".format(start, self.length))
+            codes = codes[self.length - start:]
+        sequence = np.concatenate((self._carry, codes))
+        first = self.length - len(self._carry)
+        self.length += len(codes)
+        self._carry = sequence[len(sequence) - min(self.k - 1, len(sequence)):]
+        kmers = encode_kmers(sequence, self.k)
+        positions = first + np.arange(len(kmers), dtype=np.int64)
+        valid = kmers != INVALID_KMER
+        kmers = np.concatenate((self._window_kmers, kmers[valid]))
+        positions = np.concatenate((self._window_positions, positions[valid]))
+
+        # A k-mer completes a clump when its (t - 1)th previous occurrence
+        # is still inside the window
+        span = self.L - self.k
+        order = np.argsort(kmers, kind='stable')
+        sorted_kmers = kmers[order]
+        sorted_positions = positions[order]
+        lag = self.t - 1
+        if lag >= 0 and len(sorted_kmers) > lag:
+            hits = ((sorted_kmers[lag:] == sorted_kmers[:len(sorted_kmers) - lag]) &
+                    (sorted_positions[lag:] - sorted_positions[:len(sorted_positions) - lag] <= span))
+            self._found.update(np.unique(sorted_kmers[lag:][hits]).tolist())
+
+        # Keep the k-mers that can still share a window with later ones
+        keep = positions > self.length - self.k - span
+        self._window_kmers = kmers[keep]
+        self._window_positions = positions[keep]
+
+    def clumps(self):
+        """
+        Gets the patterns that formed a clump in the sequence so far.
+
+        :return: a set of DNA strings
+        """
+        codes = np.array(sorted(self._found), dtype=np.uint64)
+        return set(decode_kmers(codes, self.k).tolist())
                 
                 
-def find_minimum_skew(dna, save_skew=False, file_name=None):
+def find_minimum_skew(dna, save_skew=False, file_name=None, step=1):
     """
-    Generates a list of indexes with the minimum G - C skew.
+    Generates a list of indexes with the minimum G - C skew. The skew is
+    computed with cumulative sums over chunks of the sequence, carrying the
+    running skew from one chunk to the next. Lowercase (soft-masked) g and
+    c count like G and C, so a lowercase string gives the same indexes as
+    its uppercase form.
     
-    :param dna: a string of DNA
+    :param dna: a string of DNA, a PackedDNA, or an iterable of consecutive
+           chunks of either (such as from read_chunks)
     :param save_skew: whether to save the skew list to a file
-    :param file_name: the file to save the skew to
+    :param file_name: the file to save the skew to, required with
+           :param save_skew; a .npy name stores the full skew in NumPy's
+           binary format, any other name stores position,skew CSV rows
+    :param step: the spacing of the CSV rows, for downsampled plotting
     
     :return: a list of DNA indexes with the lowest skew
     """
-    skew = list()
-    current_skew = 0
-    lowest_skew = 0
-    skew.append(current_skew)
-
-    # Find the skew for each position
-    for i in range(len(dna)):
-        if dna[i] == 'C':
-            current_skew -= 1
-        elif dna[i] == 'G':
-            current_skew += 1
-        skew.append(current_skew)
-        if lowest_skew > current_skew:
-            lowest_skew = current_skew
+    if save_skew and file_name is None:
+        raise ValueError("a file_name is required to save the skew")
+    to_npy = save_skew and file_name.endswith('.npy')
+    tracker = track_skew(dna, step=step if save_skew and not to_npy else None,
+                         keep_skew=to_npy, chunk_size=CHUNK_SIZE)
 
     if save_skew:
-        # Save skew to file
-        with open(file_name, 'w') as s:
-            for value in skew:
-                s.write("{},".format(value))
-
-    # Find the indexes with the lowest skew
-    minimum_indexes = list()
-    for i in range(len(skew)):
-        if skew[i] == lowest_skew:
-            minimum_indexes.append(i)
-
-    return minimum_indexes
-
+        tracker.save(file_name)
 
+    return tracker.minimum_positions().tolist()
@@ -0,0 +1,216 @@
+import argparse
+import json
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from ..util.fasta import read_chunks
+from ..util.packed import as_codes
+from ..util.str import reverse_complement
+from .count import count_kmers_with_mismatches
+from .skew import SkewTracker, gc_skew
+
+
+CHUNK_SIZE = 1 << 20
+TSV_COLUMNS = ("file", "record", "length", "minimum_skew", "window_start", "window_end",
+               "pattern", "reverse_complement", "count")
+
+
+def scan_origins(file_name, k=9, d=1, window=500, max_windows=3, n=5, chunk_size=CHUNK_SIZE):
+    """
+    Looks for the replication origin of every record in a FASTA file with
+    a single read of the file. While streaming, the skew is tracked and
+    only the chunks within :param window bases of a minimum skew position
+    seen so far are kept, so memory stays near a few chunks rather than
+    the whole genome. Afterwards the minimum skew positions are grouped
+    into windows, and the most frequent k-mers with mismatches and
+    reverse complements in each window are reported as DnaA box
+    candidates.
+
+    :param file_name: the FASTA file (optionally gzipped)
+    :param k: the length of the DnaA box candidates
+    :param d: the maximum number of mismatches
+    :param window: the length of the window searched around each group of
+           minimum skew positions; must be at least k
+    :param max_windows: the maximum number of windows per record
+    :param n: the number of candidates reported per window
+    :param chunk_size: the number of bases read at once
+
+    :return: a list with one dictionary per record, holding its name,
+             length, minimum skew and positions, windows (each with its
+             candidates) and the time spent in each stage
+    """
+    if window < k:
+        raise ValueError("window must be at least k")
+    results = list()
+    for name, tracker, kept, read_time in _stream_records_(file_name, chunk_size, window):
+        started = time.perf_counter()
+        positions = tracker.minimum_positions()
+        windows = list()
+        for start, end in _skew_windows_(positions, tracker.length, window)[:max_windows]:
+            counts = count_kmers_with_mismatches(_region_(kept, start, end), k, d, canonical=True)
+            candidates = list()
+            for pattern, count in counts.top(n):
+                candidates.append({"pattern": pattern,
+                                   "reverse_complement": reverse_complement(pattern),
+                                   "count": count})
+            windows.append({"start": start, "end": end, "candidates": candidates})
+        results.append({"file": file_name,
+                        "record": name,
+                        "length": tracker.length,
+                        "minimum_skew": tracker.minimum,
+                        "minimum_positions": positions.tolist(),
+                        "windows": windows,
+                        "timings": {"read_and_skew": read_time,
+                                    "frequent_words": time.perf_counter() - started}})
+    return results
+
+
+def scan_genomes(file_names, workers=None, **options):
+    """
+    Runs :func:`scan_origins` on many FASTA files, optionally in a pool of
+    processes.
+
+    :param file_names: the FASTA files
+    :param workers: the number of processes; None scans in this process
+    :param options: passed to scan_origins
+
+    :return: a generator of the results of each file, in the given order
+    """
+    if workers is None or workers <= 1:
+        for file_name in file_names:
+            yield scan_origins(file_name, **options)
+        return
+    with Pool(workers) as pool:
+        yield from pool.imap(_scan_, [(file_name, options) for file_name in file_names])
+
+
+def _scan_(task):
+    return scan_origins(task[0], **task[1])
+
+
+def _stream_records_(file_name, chunk_size, margin):
+    # Yields (name, skew tracker, kept chunks, seconds) per record from one
+    # read. Chunks go straight into the tracker; only those within margin
+    # bases of a position of the lowest skew so far are kept, as a
+    # dictionary of start to codes
+    name = None
+    for record, start, chunk in read_chunks(file_name, chunk_size):
+        if record != name:
+            if name is not None:
+                yield name, tracker, kept, time.perf_counter() - started
+            name, tracker, started = record, SkewTracker(), time.perf_counter()
+            # Position 0 holds the initial minimum of 0
+            kept, recent, keep_until = dict(), list(), margin
+        codes = as_codes(chunk)
+        offset, minimum = tracker.current, tracker.minimum
+        tracker.update(codes)
+        if tracker.minimum < minimum:
+            kept, keep_until = dict(), 0
+        hits = np.flatnonzero(gc_skew(codes)[1:] + offset == tracker.minimum)
+        if len(hits) > 0:
+            first, last = start + 1 + int(hits[0]), start + 1 + int(hits[-1])
+            for piece_start, piece in recent:
+                if piece_start + len(piece) > first - margin:
+                    kept[piece_start] = piece
+            keep_until = max(keep_until, last + margin)
+        if start < keep_until:
+            kept[start] = codes
+        end = start + len(codes)
+        recent.append((start, codes))
+        while recent and recent[0][0] + len(recent[0][1]) <= end - margin:
+            recent.pop(0)
+    if name is not None:
+        yield name, tracker, kept, time.perf_counter() - started
+
+
+def _region_(kept, start, end):
+    # Joins the kept chunks over [start, end)
+    pieces = list()
+    for piece_start, piece in sorted(kept.items()):
+        if piece_start < end and piece_start + len(piece) > start:
+            pieces.append(piece[max(start - piece_start, 0):end - piece_start])
+    return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.uint8)
+
+
+def _skew_windows_(positions, length, window):
+    # Groups minimum skew positions lying within one window of each other
+    # and centers a window on each group, largest groups first
+    if len(positions) == 0 or length == 0:
+        return list()
+    breaks = np.flatnonzero(np.diff(positions) > window) + 1
+    groups = np.split(positions, breaks)
+    groups.sort(key=lambda group: -len(group))
+    windows = list()
+    for group in groups:
+        center = (int(group[0]) + int(group[-1])) // 2
+        start = min(max(center - window // 2, 0), max(length - window, 0))
+        windows.append((start, min(start + window, length)))
+    return windows
+
+
+def write_tsv(results, output):
+    """
+    Writes one row per candidate of each scanned record.
+
+    :param results: the records returned by scan_origins
+    :param output: a writable text file
+    """
+    for result in results:
+        for w in result["windows"]:
+            for candidate in w["candidates"]:
+                row = (result["file"], result["record"], result["length"], result["minimum_skew"],
+                       w["start"], w["end"], candidate["pattern"],
+                       candidate["reverse_complement"], candidate["count"])
+                output.write("\t".join(map("{}".format, row)) + "\n")
+
+
+def main(argv=None):
+    """
+    Command-line entry point: scans FASTA files for replication origin
+    candidates and prints them as TSV or JSON, with per-stage timings on
+    stderr.
+    """
+    parser = argparse.ArgumentParser(prog="bio-oric",
+                                     description="Find DnaA box candidates near the minimum GC skew.")
+    parser.add_argument("files", nargs="+", help="FASTA files, one genome each")
+    parser.add_argument("-k", type=int, default=9, help="DnaA box length (default 9)")
+    parser.add_argument("-d", type=int, default=1, help="maximum mismatches (default 1)")
+    parser.add_argument("-w", "--window", type=int, default=500,
+                        help="window length around the minimum skew (default 500)")
+    parser.add_argument("--max-windows", type=int, default=3,
+                        help="windows per record (default 3)")
+    parser.add_argument("-n", type=int, default=5, help="candidates per window (default 5)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of genomes scanned in parallel")
+    parser.add_argument("--format", choices=("tsv", "json"), default="tsv")
+    parser.add_argument("-o", "--output", default=None, help="output file (default stdout)")
+    args = parser.parse_args(argv)
+    if args.window < args.k:
+        parser.error("--window must be at least -k")
+
+    options = {"k": args.k, "d": args.d, "window": args.window,
+               "max_windows": args.max_windows, "n": args.n}
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.format == "tsv":
+            output.write("\t".join(TSV_COLUMNS) + "\n")
+        else:
+            scanned = list()
+        for results in scan_genomes(args.files, args.workers, **options):
+            for result in results:
+                timings = " ".join("{}={:.3f}s".format(*item) for item in result["timings"].items())
+                sys.stderr.write("{}\t{}\t{}\n".format(result["file"], result["record"], timings))
+            if args.format == "tsv":
+                write_tsv(results, output)
+            else:
+                scanned.extend(results)
+        if args.format == "json":
+            json.dump(scanned, output, indent=2)
+            output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
@@ -0,0 +1,297 @@
+import math
+
+import numpy as np
+
+from ..util.kmer import encode_kmers, decode_kmers, kmer_batches, INVALID_KMER
+
+
+BATCH_SIZE = 1 << 20
+
+
+class CountMinSketch:
+    """
+    A count-min sketch of k-mer codes with conservative update. An
+    estimate never falls below the true count, and with probability at
+    least 1 - exp(-depth) it exceeds it by at most e / width times the
+    total count added.
+    """
+    def __init__(self, width, depth=4, seed=0):
+        """
+        :param width: the number of counters per row
+        :param depth: the number of rows (independent hashes)
+        :param seed: the hash seed; sketches can only be merged if they
+               share the width, depth and seed
+        """
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.table = np.zeros((depth, width), dtype=np.uint32)
+        self.total = 0
+
+    @classmethod
+    def from_error(cls, epsilon, delta, seed=0):
+        """
+        Sizes a sketch so that estimates exceed the true count by at most
+        :param epsilon times the total count with probability 1 - :param delta.
+        """
+        return cls(int(math.ceil(math.e / epsilon)), int(math.ceil(math.log(1 / delta))), seed)
+
+    @classmethod
+    def from_memory(cls, memory, depth=4, seed=0):
+        """
+        Sizes a sketch to use about :param memory bytes.
+        """
+        return cls(max(memory // (4 * depth), 1), depth, seed)
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+    def error_bound(self):
+        """
+        Gets the most an estimate exceeds the true count by, with
+        probability 1 - delta, given everything added so far.
+        """
+        return self.epsilon * self.total
+
+    def add(self, kmers, counts=None):
+        """
+        Adds k-mer codes to the sketch. Each distinct code in the batch
+        raises its counters only as far as its new estimate.
+
+        :param kmers: an array of k-mer codes
+        :param counts: an optional array of the amount to add for each code
+        """
+        kmers = np.asarray(kmers, dtype=np.uint64)
+        if counts is None:
+            kmers, counts = np.unique(kmers, return_counts=True)
+        else:
+            kmers, inverse = np.unique(kmers, return_inverse=True)
+            counts = np.bincount(inverse.ravel(), weights=counts, minlength=len(kmers))
+        if len(kmers) == 0:
+            return
+        cells = self._cells_(kmers)
+        estimates = self.table[np.arange(self.depth)[:, None], cells].min(axis=0)
+        target = np.minimum(estimates + counts.astype(np.int64), np.iinfo(np.uint32).max)
+        for row in range(self.depth):
+            np.maximum.at(self.table[row], cells[row], target.astype(np.uint32))
+        self.total += int(counts.sum())
+
+    def estimate(self, kmers):
+        """
+        Estimates the counts of k-mer codes.
+
+        :return: an int64 array of estimates
+        """
+        cells = self._cells_(np.asarray(kmers, dtype=np.uint64).reshape(-1))
+        return self.table[np.arange(self.depth)[:, None], cells].min(axis=0).astype(np.int64)
+
+    def merge(self, other):
+        """
+        Adds the counts of another sketch with the same shape and seed.
+        The merged estimates keep the same error bound for the combined
+        total.
+        """
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError("sketches must share width, depth and seed")
+        merged = self.table.astype(np.int64) + other.table
+        self.table = np.minimum(merged, np.iinfo(np.uint32).max).astype(np.uint32)
+        self.total += other.total
+
+    def _cells_(self, kmers):
+        # Double hashing: row r uses h1 + r * h2
+        h = _mix_(kmers ^ np.uint64(_mix_(np.uint64(self.seed))))
+        h1 = h & np.uint64(0xFFFFFFFF)
+        h2 = (h >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1 + rows * h2) % np.uint64(self.width)).astype(np.intp)
+
+
+class HyperLogLog:
+    """
+    A HyperLogLog estimate of the number of distinct k-mer codes, using
+    2 ** p one-byte registers. The relative standard error is about
+    1.04 / sqrt(2 ** p) (under 1% for p = 14).
+    """
+    def __init__(self, p=14, seed=0):
+        """
+        :param p: the number of hash bits used to pick a register, 4 to 18
+        :param seed: the hash seed
+        """
+        if not 4 <= p <= 18:
+            raise ValueError("p must be between 4 and 18")
+        self.p = p
+        self.seed = seed
+        self.registers = np.zeros(2 ** p, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, kmers):
+        """
+        Adds k-mer codes to the estimate.
+        """
+        h = _mix_(np.asarray(kmers, dtype=np.uint64) ^ np.uint64(_mix_(np.uint64(self.seed))))
+        index = (h >> np.uint64(64 - self.p)).astype(np.intp)
+        rest = h << np.uint64(self.p)
+        # The rank is the position of the first set bit, capped for rest == 0
+        rank = np.minimum(_leading_zeros_(rest) + 1, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self):
+        """
+        Estimates the number of distinct codes added, using linear counting
+        while many registers are still empty.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and empty > 0:
+            return m * math.log(m / empty)
+        return float(raw)
+
+    def merge(self, other):
+        """
+        Combines another estimate with the same p and seed.
+        """
+        if (self.p, self.seed) != (other.p, other.seed):
+            raise ValueError("estimates must share p and seed")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+
+class HeavyHitters:
+    """
+    Tracks a fixed number of candidate heavy hitters by their count-min
+    estimates. After each batch the candidates are the highest-estimated
+    codes among the previous candidates and the new batch. A k-mer whose
+    true count exceeds the capacity-th largest estimate is kept.
+    """
+    def __init__(self, sketch, capacity):
+        """
+        :param sketch: the CountMinSketch the estimates come from
+        :param capacity: the number of candidates to keep
+        """
+        self.sketch = sketch
+        self.capacity = capacity
+        self.kmers = np.zeros(0, dtype=np.uint64)
+
+    def update(self, kmers):
+        """
+        Offers the codes of a batch that was already added to the sketch.
+        """
+        candidates = np.union1d(self.kmers, kmers)
+        if len(candidates) > self.capacity:
+            estimates = self.sketch.estimate(candidates)
+            keep = np.lexsort((candidates, -estimates))[:self.capacity]
+            candidates = np.sort(candidates[keep])
+        self.kmers = candidates
+
+    def top(self, n):
+        """
+        Gets the n candidates with the highest estimates.
+
+        :return: arrays of codes and estimates, highest first
+        """
+        estimates = self.sketch.estimate(self.kmers)
+        order = np.lexsort((self.kmers, -estimates))[:n]
+        return self.kmers[order], estimates[order]
+
+
+class KmerSketch:
+    """
+    Approximate k-mer statistics of one or more sequences in a fixed
+    amount of memory: a count-min sketch for frequencies, a heavy-hitters
+    tracker for the most frequent k-mers, and HyperLogLog for the number
+    of distinct k-mers.
+    """
+    def __init__(self, k, canonical=False, memory=1 << 24, capacity=1000, depth=4, p=14, seed=0):
+        """
+        :param k: the length of each k-mer
+        :param canonical: if True, count each k-mer together with its
+               reverse complement under the smaller of the two codes
+        :param memory: the approximate number of bytes for the count-min
+               table; HyperLogLog adds 2 ** :param p bytes and the tracker
+               8 * :param capacity bytes
+        :param capacity: the number of heavy-hitter candidates to keep
+        :param depth: the number of count-min rows
+        :param p: the HyperLogLog precision
+        :param seed: the hash seed
+        """
+        self.k = k
+        self.canonical = canonical
+        self.counts = CountMinSketch.from_memory(memory, depth, seed)
+        self.distinct = HyperLogLog(p, seed)
+        self.heavy = HeavyHitters(self.counts, capacity)
+
+    def update(self, dna):
+        """
+        Adds every k-mer of a sequence.
+
+        :param dna: a string of DNA, a PackedDNA, an array of codes, or an
+               iterable of these, of read_chunks tuples (with an overlap
+               of k - 1) or of read_records records
+        """
+        for codes in kmer_batches(dna, self.k, BATCH_SIZE):
+            kmers = encode_kmers(codes, self.k, self.canonical)
+            kmers, counts = np.unique(kmers[kmers != INVALID_KMER], return_counts=True)
+            self.counts.add(kmers, counts)
+            self.distinct.add(kmers)
+            self.heavy.update(kmers)
+        return self
+
+    def estimate(self, pattern):
+        """
+        Estimates the count of a k-mer; never below the true count, and
+        at most error_bound() above it with probability 1 - delta.
+
+        :param pattern: a DNA string or a k-mer code
+        """
+        if isinstance(pattern, (str, bytes)):
+            pattern = encode_kmers(pattern, self.k, self.canonical)[0]
+        return int(self.counts.estimate(pattern)[0])
+
+    def error_bound(self):
+        """
+        Gets the most a count estimate exceeds the true count by, with
+        probability 1 - delta.
+        """
+        return self.counts.error_bound()
+
+    def distinct_count(self):
+        """
+        Estimates the number of distinct k-mers seen.
+        """
+        return self.distinct.estimate()
+
+    def top(self, n):
+        """
+        Gets the n most frequent k-mers by estimated count.
+
+        :return: a list of (k-mer, estimate) tuples
+        """
+        kmers, estimates = self.heavy.top(n)
+        return list(zip(decode_kmers(kmers, self.k).tolist(), estimates.tolist()))
+
+
+def _mix_(x):
+    # The splitmix64 finalizer; uint64 arithmetic wraps around, which
+    # NumPy warns about for scalars
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _leading_zeros_(x):
+    zeros = np.zeros(x.shape, dtype=np.int64)
+    for bits in (32, 16, 8, 4, 2, 1):
+        small = x < (np.uint64(1) << np.uint64(64 - bits))
+        zeros += np.where(small, bits, 0)
+        x = np.where(small, x << np.uint64(bits), x)
+    return zeros + (x == 0)
@@ -0,0 +1,185 @@
+import numpy as np
+
+from ..util.packed import PackedDNA, as_codes
+
+
+_C_ = 1
+_G_ = 2
+
+
+def gc_skew(dna):
+    """
+    Computes the cumulative G - C skew of a sequence with one cumulative
+    sum. Lowercase g and c count like G and C.
+
+    :param dna: a string of DNA, a PackedDNA or an array of codes
+    :return: an int32 array of length len(dna) + 1 where entry i is the
+             skew of the first i bases
+    """
+    codes = as_codes(dna)
+    skew = np.zeros(len(codes) + 1, dtype=np.int32)
+    np.cumsum(_skew_steps_(codes), out=skew[1:], dtype=np.int32)
+    return skew
+
+
+def track_skew(dna, step=None, keep_skew=False, chunk_size=1 << 20):
+    """
+    Runs a SkewTracker over a whole sequence, one chunk at a time.
+
+    :param dna: a string of DNA, a PackedDNA, an array of codes, or an
+           iterable of consecutive chunks of these or of (name, start,
+           chunk) tuples from read_chunks
+    :param step: passed to SkewTracker
+    :param keep_skew: passed to SkewTracker
+    :param chunk_size: the number of bases processed at once when
+           :param dna is a single sequence
+
+    :return: the updated SkewTracker
+    """
+    tracker = SkewTracker(step, keep_skew)
+    if isinstance(dna, (str, bytes, PackedDNA, np.ndarray)):
+        for i in range(0, len(dna), chunk_size):
+            tracker.update(dna[i:i + chunk_size])
+    else:
+        for chunk in dna:
+            if isinstance(chunk, tuple):
+                tracker.update(chunk[2], start=chunk[1])
+            else:
+                tracker.update(chunk)
+    return tracker
+
+
+def _skew_steps_(codes):
+    return (codes == _G_).astype(np.int8) - (codes == _C_).astype(np.int8)
+
+
+class SkewTracker:
+    """
+    Running G - C skew over a sequence fed in consecutive pieces. Only the
+    running offset, the extreme positions, and the optional samples or
+    full skew are kept between pieces.
+    """
+    def __init__(self, step=None, keep_skew=False):
+        """
+        :param step: if given, record the skew (and G + C count) at every
+               multiple of :param step for downsampled or windowed output
+        :param keep_skew: if True, keep the full skew as an int32 array
+        """
+        self.step = step
+        self.keep_skew = keep_skew
+        self.length = 0
+        self.current = 0
+        self.gc = 0
+        self.minimum = 0
+        self.maximum = 0
+        self._minimum_positions = [np.zeros(1, dtype=np.int64)]
+        self._maximum_positions = [np.zeros(1, dtype=np.int64)]
+        self._samples = [np.zeros((1, 2), dtype=np.int64)] if step else list()
+        self._skew = [np.zeros(1, dtype=np.int32)] if keep_skew else list()
+
+    def update(self, dna, start=None):
+        """
+        Adds the next piece of the sequence.
+
+        :param dna: a string of DNA, a PackedDNA or an array of codes
+        :param start: the position of :param dna within the whole sequence,
+               as given by read_chunks; bases before the current length
+               are skipped, so overlapping chunks can be passed directly
+        """
+        codes = as_codes(dna)
+        if start is not None:
+            if start > self.length:
+                raise ValueError("chunk starting at {} leaves a gap after {}".format(start, self.length))
+            codes = codes[self.length - start:]
+        if len(codes) == 0:
+            return
+        skew = self.current + np.cumsum(_skew_steps_(codes), dtype=np.int64)
+        positions = self.length + 1 + np.arange(len(codes), dtype=np.int64)
+
+        low = int(skew.min())
+        if low < self.minimum:
+            self.minimum = low
+            self._minimum_positions = list()
+        if low == self.minimum:
+            self._minimum_positions.append(positions[skew == low])
+        high = int(skew.max())
+        if high > self.maximum:
+            self.maximum = high
+            self._maximum_positions = list()
+        if high == self.maximum:
+            self._maximum_positions.append(positions[skew == high])
+
+        gc = self.gc + np.cumsum((codes == _C_) | (codes == _G_), dtype=np.int64)
+        if self.step:
+            sampled = positions % self.step == 0
+            self._samples.append(np.stack((skew[sampled], gc[sampled]), axis=1))
+        if self.keep_skew:
+            self._skew.append(skew.astype(np.int32))
+        self.length += len(codes)
+        self.current = int(skew[-1])
+        self.gc = int(gc[-1])
+
+    def minimum_positions(self):
+        """
+        Gets every position where the skew is lowest.
+
+        :return: a sorted array of positions (0 is before the first base)
+        """
+        return np.concatenate(self._minimum_positions)
+
+    def maximum_positions(self):
+        """
+        Gets every position where the skew is highest.
+        """
+        return np.concatenate(self._maximum_positions)
+
+    def skew(self):
+        """
+        Gets the full skew; only available with keep_skew.
+        """
+        if not self.keep_skew:
+            raise ValueError("skew was not kept; create the tracker with keep_skew=True")
+        return np.concatenate(self._skew)
+
+    def samples(self):
+        """
+        Gets the skew at every multiple of step.
+
+        :return: an array of positions and an array of skew values
+        """
+        samples = self._sample_array_()
+        return np.arange(len(samples), dtype=np.int64) * self.step, samples[:, 0]
+
+    def windowed(self):
+        """
+        Gets the normalized skew (G - C) / (G + C) of each complete,
+        non-overlapping window of step bases.
+
+        :return: an array of window start positions and an array of
+                 skew values (0 for windows without G or C)
+        """
+        samples = self._sample_array_()
+        change = np.diff(samples, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.where(change[:, 1] > 0, change[:, 0] / change[:, 1], 0.0)
+        return np.arange(len(values), dtype=np.int64) * self.step, values
+
+    def save(self, file_name):
+        """
+        Saves the skew. A .npy name stores the full skew in NumPy's binary
+        format (requires keep_skew); any other name stores the sampled skew
+        as position,skew CSV rows (requires step).
+        """
+        if file_name.endswith('.npy'):
+            np.save(file_name, self.skew())
+            return
+        positions, values = self.samples()
+        with open(file_name, 'w') as s:
+            s.write("position,skew\n")
+            for position, value in zip(positions.tolist(), values.tolist()):
+                s.write("{},{}\n".format(position, value))
+
+    def _sample_array_(self):
+        if not self.step:
+            raise ValueError("no samples were recorded; create the tracker with a step")
+        return np.concatenate(self._samples)
@@ -1,3 +1,6 @@
+from bio_info.util.packed import PackedDNA
+
+
 amino_acids = ["G", "A", "S", "P", "V", "T", "C", "I",
                "L", "N", "D", "K", "Q", "E", "M", "H",
                "F", "R", "Y", "W"]
@@ -24,11 +27,24 @@ rna_amino_dict = {
 
 
 def kmer_composition(k, dna, sort=False):
+    """
+    Lists every k-mer of a sequence in order of position.
+
+    :param k: the length of each k-mer
+    :param dna: a string of DNA or a PackedDNA; k-mers of a PackedDNA
+           are zero-copy views of it
+    :param sort: if True, sort the k-mers lexicographically
+
+    :return: the list of k-mers
+    """
     kmers = list()
     for i in range(len(dna) - k+1):
         kmers.append(dna[i:i+k])
     if sort:
-        kmers.sort()
+        if isinstance(dna, PackedDNA):
+            kmers.sort(key=PackedDNA.to_str)
+        else:
+            kmers.sort()
     return kmers
 
 
@@ -1,4 +1,16 @@
 from .str import (get_nucleotide_count, hamming_distance, pattern_to_number,
                   number_to_pattern, read_fasta, get_entropy, get_d_neighborhood,
-                  find_approximate_match_indexes, reverse_complement, generate)
+                  find_approximate_match_indexes, reverse_complement,
+                  reverse_complement_all, reverse_complement_inplace, generate)
 from .graph import Graph
+from .packed import PackedDNA, encode_symbols, decode_symbols, as_codes
+from .kmer import (encode_kmers, decode_kmers, reverse_complement_kmers,
+                   canonical_kmers, iter_d_neighborhood, neighborhood_masks,
+                   d_neighborhood, add_d_neighborhood, record_sequence, kmer_batches,
+                   MAX_K, INVALID_KMER)
+from .fasta import (read_records, read_chunks, open_sequence_file, FastaIndex,
+                    build_fasta_index, write_fasta, write_fastq)
+from .distance import hamming_distances, batch_hamming_distances, kmer_code_distances
+from .match import HammingMatcher
+from .simulate import SequenceGenerator, train_markov
+from .fmindex import FMIndex, suffix_array
@@ -0,0 +1,91 @@
+import numpy as np
+
+from .packed import as_codes
+
+
+_EVEN_BITS_ = np.uint64(0x5555555555555555)
+_POPCOUNT_ = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def hamming_distances(pattern, dna):
+    """
+    Finds the Hamming distance between a pattern and every k-mer of a
+    sequence in one pass per pattern position.
+
+    :param pattern: a string of DNA, a PackedDNA or an array of codes
+    :param dna: a string of DNA, a PackedDNA or an array of codes
+
+    :return: an array with the distance of the k-mer starting at each
+             index of :param dna; see batch_hamming_distances for how
+             symbols are compared
+    """
+    return batch_hamming_distances([pattern], dna)[0]
+
+
+def batch_hamming_distances(patterns, dna):
+    """
+    Finds the Hamming distance between many patterns of the same length
+    and every k-mer of a sequence. When every input is a string, symbols
+    are compared exactly, so case matters and N only matches N. Otherwise
+    everything is compared as nucleotide codes, where lowercase matches
+    uppercase, U matches T and all ambiguous symbols (N, R, ...) match
+    each other.
+
+    :param patterns: a list of patterns (strings, PackedDNA or code
+           arrays) or a 2-D array of pattern codes
+    :param dna: a string of DNA, a PackedDNA or an array of codes
+
+    :return: a 2-D array with one row of distances per pattern
+    """
+    if isinstance(patterns, np.ndarray) and patterns.ndim == 2:
+        pattern_codes = patterns.astype(np.uint8)
+    elif isinstance(dna, (str, bytes)) and all(isinstance(p, (str, bytes)) for p in patterns):
+        pattern_codes = np.array([_symbols_(p) for p in patterns], dtype=np.uint8)
+        dna = _symbols_(dna)
+    else:
+        pattern_codes = np.array([as_codes(p) for p in patterns], dtype=np.uint8)
+    m, k = pattern_codes.shape if pattern_codes.ndim == 2 else (len(pattern_codes), 0)
+    codes = as_codes(dna)
+    n = len(codes) - k + 1
+    dtype = np.uint8 if k < 256 else np.uint32
+    if n <= 0:
+        return np.zeros((m, 0), dtype=dtype)
+    distances = np.zeros((m, n), dtype=dtype)
+    for j in range(k):
+        distances += codes[None, j:j + n] != pattern_codes[:, j, None]
+    return distances
+
+
+def kmer_code_distances(kmers1, kmers2, k):
+    """
+    Finds Hamming distances between encoded k-mers with XOR and popcount.
+    The arrays are broadcast against each other, so a column of patterns
+    and a row of k-mers gives the full distance matrix.
+
+    :param kmers1: an array of k-mer codes
+    :param kmers2: an array of k-mer codes
+    :param k: the length of the k-mers
+
+    :return: an array of mismatch counts
+    """
+    diff = np.bitwise_xor(np.asarray(kmers1, dtype=np.uint64),
+                          np.asarray(kmers2, dtype=np.uint64))
+    # A base differs if either bit of its 2-bit code differs
+    diff = (diff | (diff >> np.uint64(1))) & _EVEN_BITS_
+    if k < 32:
+        diff &= np.uint64((1 << (2 * k)) - 1)
+    return _popcount_(diff)
+
+
+def _symbols_(dna):
+    # The raw bytes of a string, for exact symbol comparison
+    if isinstance(dna, str):
+        dna = dna.encode('ascii')
+    return np.frombuffer(dna, dtype=np.uint8)
+
+
+def _popcount_(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    as_bytes = np.ascontiguousarray(values)[..., None].view(np.uint8)
+    return _POPCOUNT_[as_bytes].sum(axis=-1, dtype=np.uint8)
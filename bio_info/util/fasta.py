@@ -0,0 +1,379 @@
+import gzip
+import mmap
+import os
+
+from .packed import PackedDNA
+
+
+BLOCK_SIZE = 1 << 20
+_WHITESPACE_ = b" \t\r\n"
+
+
+def open_sequence_file(file_name, use_mmap=False):
+    """
+    Opens a FASTA/FASTQ file for binary reading. Gzip input is detected
+    from its magic number.
+
+    :param file_name: the name of the file
+    :param use_mmap: if True, memory-map the file instead of reading it
+           through a buffered handle; not available for gzip input
+
+    :return: a binary file-like object supporting read and readline
+    """
+    with open(file_name, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        if use_mmap:
+            raise ValueError("gzip-compressed files cannot be memory-mapped")
+        return gzip.open(file_name, 'rb')
+    if use_mmap:
+        with open(file_name, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return open(file_name, 'rb')
+
+
+def read_records(file_name, packed=False, use_mmap=False, block_size=BLOCK_SIZE):
+    """
+    Streams the records of a FASTA or FASTQ file one at a time. The format
+    is taken from the first character of the file.
+
+    :param file_name: the name of the (optionally gzipped) file
+    :param packed: if True, yield each sequence as a PackedDNA
+    :param use_mmap: if True, memory-map the file
+    :param block_size: the number of bytes read at a time
+
+    :return: a generator of (name, sequence) tuples for FASTA and
+             (name, sequence, quality) tuples for FASTQ, where name is
+             the first word of the header; sequence before the first
+             FASTA header raises a ValueError
+    """
+    with open_sequence_file(file_name, use_mmap) as handle:
+        if _peek_(handle) == b'@':
+            for name, seq, quality in _fastq_records_(handle):
+                yield name, _to_sequence_(seq, packed), quality.decode('ascii')
+            return
+        name = None
+        pieces = list()
+        for header, piece in _fasta_pieces_(handle, block_size):
+            if header is not None:
+                if name is not None:
+                    yield name, _to_sequence_(b''.join(pieces), packed)
+                name = header
+                pieces.clear()
+            else:
+                pieces.append(piece)
+        if name is not None:
+            yield name, _to_sequence_(b''.join(pieces), packed)
+
+
+def read_chunks(file_name, size, overlap=0, packed=False, use_mmap=False,
+                block_size=BLOCK_SIZE):
+    """
+    Streams fixed-size chunks of every record in a FASTA or FASTQ file
+    without holding a whole record in memory. Consecutive chunks of a
+    record share :param overlap bases, so using k - 1 keeps every k-mer
+    inside exactly one chunk.
+
+    :param file_name: the name of the (optionally gzipped) file
+    :param size: the number of bases in each chunk
+    :param overlap: the number of bases repeated from the previous chunk
+    :param packed: if True, yield each chunk as a PackedDNA
+    :param use_mmap: if True, memory-map the file
+    :param block_size: the number of bytes read at a time
+
+    :return: a generator of (name, start, chunk) tuples, where start is
+             the offset of the chunk within its record; the last chunk
+             of a record may be shorter than :param size; sequence
+             before the first FASTA header raises a ValueError
+    """
+    if not 0 <= overlap < size:
+        raise ValueError("overlap must be at least 0 and less than size")
+    step = size - overlap
+    with open_sequence_file(file_name, use_mmap) as handle:
+        if _peek_(handle) == b'@':
+            pieces = ((header, piece) for name, seq, _ in _fastq_records_(handle)
+                      for header, piece in ((name, None), (None, seq)))
+        else:
+            pieces = _fasta_pieces_(handle, block_size)
+        name = None
+        buffer = bytearray()
+        start = 0
+        emitted = False
+        for header, piece in pieces:
+            if header is not None:
+                if name is not None and len(buffer) > (overlap if emitted else 0):
+                    yield name, start, _to_sequence_(bytes(buffer), packed)
+                name = header
+                buffer.clear()
+                start = 0
+                emitted = False
+                continue
+            buffer += piece
+            while len(buffer) >= size:
+                yield name, start, _to_sequence_(bytes(buffer[:size]), packed)
+                del buffer[:step]
+                start += step
+                emitted = True
+        if name is not None and len(buffer) > (overlap if emitted else 0):
+            yield name, start, _to_sequence_(bytes(buffer), packed)
+
+
+def write_fasta(records, file_name, width=60):
+    """
+    Writes (name, sequence) records to a FASTA file as they are produced.
+    Files ending in .gz are gzip-compressed.
+
+    :param records: an iterable of (name, sequence) tuples, where the
+           sequence is a string or a PackedDNA
+    :param file_name: the name of the output file
+    :param width: the number of bases per line
+    """
+    with _open_output_(file_name) as f:
+        for name, seq, *_ in records:
+            if isinstance(seq, PackedDNA):
+                seq = seq.to_str()
+            f.write(">{}\n".format(name).encode('ascii'))
+            data = seq.encode('ascii')
+            f.write(b"\n".join(data[i:i + width] for i in range(0, len(data), width)))
+            f.write(b"\n")
+
+
+def write_fastq(records, file_name):
+    """
+    Writes (name, sequence, quality) records to a FASTQ file as they are
+    produced. Pairs of records are written one after the other. Files
+    ending in .gz are gzip-compressed.
+
+    :param records: an iterable of records or of pairs of records
+    :param file_name: the name of the output file
+    """
+    with _open_output_(file_name) as f:
+        for record in records:
+            pair = record if isinstance(record[0], tuple) else (record,)
+            for name, seq, quality in pair:
+                f.write("@{}\n{}\n+\n{}\n".format(name, seq, quality).encode('ascii'))
+
+
+def _open_output_(file_name):
+    if file_name.endswith('.gz'):
+        return gzip.open(file_name, 'wb')
+    return open(file_name, 'wb')
+
+
+def _peek_(handle):
+    if isinstance(handle, mmap.mmap):
+        return handle[:1]
+    return handle.peek(1)[:1]
+
+
+def _to_sequence_(seq, packed):
+    if packed:
+        return PackedDNA(seq)
+    return seq.decode('ascii')
+
+
+def _fasta_pieces_(handle, block_size):
+    # Yields (name, None) at the start of each record and (None, bases)
+    # for each run of sequence with line breaks removed
+    header = None
+    started = False
+    while True:
+        block = handle.read(block_size)
+        if not block:
+            break
+        pos = 0
+        while pos < len(block):
+            if header is not None:
+                end = block.find(b'\n', pos)
+                if end < 0:
+                    header += block[pos:]
+                    break
+                header += block[pos:end]
+                yield _header_name_(header), None
+                header = None
+                started = True
+                pos = end + 1
+                continue
+            gt = block.find(b'>', pos)
+            end = len(block) if gt < 0 else gt
+            piece = block[pos:end].translate(None, _WHITESPACE_)
+            if piece:
+                if not started:
+                    raise ValueError("sequence data before the first FASTA header")
+                yield None, piece
+            if gt < 0:
+                break
+            header = bytearray()
+            pos = gt + 1
+    if header is not None:
+        yield _header_name_(header), None
+
+
+def _fastq_records_(handle):
+    while True:
+        header = handle.readline()
+        if not header:
+            return
+        if not header.strip():
+            continue
+        seq = handle.readline().strip()
+        handle.readline()
+        quality = handle.readline().strip()
+        if len(quality) != len(seq):
+            raise ValueError("truncated FASTQ record: {}".format(header.decode('ascii').strip()))
+        yield _header_name_(header[1:]), seq, quality
+
+
+def _header_name_(header):
+    words = bytes(header).split(None, 1)
+    return words[0].decode('ascii') if words else ''
+
+
+class FastaIndex:
+    """
+    Random access to the records of a FASTA file through a samtools
+    faidx-compatible (.fai) index. Each line of the index holds the
+    record name, length, byte offset of the first base, bases per line
+    and bytes per line.
+    """
+    def __init__(self, file_name, index_name=None):
+        """
+        Loads the index of a FASTA file, building and saving it first if
+        it does not exist or is older than the FASTA file.
+
+        :param file_name: the name of an uncompressed FASTA file
+        :param index_name: the name of the index; defaults to
+               :param file_name with .fai appended
+        """
+        self.file_name = file_name
+        self.index_name = index_name or file_name + '.fai'
+        if (not os.path.exists(self.index_name) or
+                os.path.getmtime(self.index_name) < os.path.getmtime(file_name)):
+            self.entries = build_fasta_index(file_name, self.index_name)
+        else:
+            self.entries = _read_fai_(self.index_name)
+        self._handle = None
+        self._data = None
+
+    @property
+    def names(self):
+        return list(self.entries.keys())
+
+    def length(self, name):
+        """
+        Gets the number of bases in a record.
+        """
+        return self.entries[name][0]
+
+    def fetch(self, name, start=0, end=None, packed=False):
+        """
+        Reads a region of a record without parsing the rest of the file.
+
+        :param name: the record name
+        :param start: the 0-based start of the region
+        :param end: the end of the region (exclusive); defaults to the
+               end of the record
+        :param packed: if True, return the region as a PackedDNA
+
+        :return: the bases in [start, end)
+        """
+        if name not in self.entries:
+            raise KeyError("no record named {} in {}".format(name, self.file_name))
+        length, offset, line_bases, line_width = self.entries[name]
+        if end is None or end > length:
+            end = length
+        start = max(start, 0)
+        if start >= end:
+            return _to_sequence_(b'', packed)
+        if self._data is None:
+            self._handle = open(self.file_name, 'rb')
+            self._data = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+        first = offset + (start // line_bases) * line_width + start % line_bases
+        last = offset + ((end - 1) // line_bases) * line_width + (end - 1) % line_bases
+        region = self._data[first:last + 1].translate(None, _WHITESPACE_)
+        return _to_sequence_(region, packed)
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._handle.close()
+            self._data = None
+            self._handle = None
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def build_fasta_index(file_name, index_name=None):
+    """
+    Scans a FASTA file and writes a samtools faidx-compatible index.
+    Every line of a record except the last must have the same width, and
+    every line must belong to a record.
+
+    :param file_name: the name of an uncompressed FASTA file
+    :param index_name: the name of the index; defaults to
+           :param file_name with .fai appended
+
+    :return: a dictionary of record name to (length, offset, line
+             bases, line width)
+    """
+    entries = dict()
+    name = None
+    offset = 0
+    with open_sequence_file(file_name) as f:
+        if isinstance(f, gzip.GzipFile):
+            raise ValueError("cannot index a gzip-compressed FASTA file")
+        pos = 0
+        for line in f:
+            if line.startswith(b'>'):
+                if name is not None:
+                    entries[name] = (length, offset, line_bases, line_width)
+                name = _header_name_(line[1:])
+                if name in entries:
+                    raise ValueError("duplicate record name {} in {}".format(name, file_name))
+                length, line_bases, line_width = 0, 0, 0
+                ended = False
+                offset = pos + len(line)
+            elif name is None:
+                if line.strip():
+                    raise ValueError("sequence data before the first header in {}".format(file_name))
+            else:
+                bases = len(line.rstrip(b'\r\n'))
+                if bases == 0:
+                    # A blank line ends the record's sequence; bases after
+                    # it would shift every offset computed from the index
+                    ended = True
+                elif ended or (line_bases > 0 and
+                               (bases > line_bases or (bases == line_bases and
+                                                       len(line) != line_width))):
+                    raise ValueError("record {} in {} has uneven line lengths".format(name, file_name))
+                else:
+                    if line_bases == 0:
+                        line_bases, line_width = bases, len(line)
+                    # Only the last line of a record may be shorter
+                    ended = bases < line_bases
+                    length += bases
+            pos += len(line)
+        if name is not None:
+            entries[name] = (length, offset, line_bases, line_width)
+
+    with open(index_name or file_name + '.fai', 'w') as fai:
+        for name, (length, offset, line_bases, line_width) in entries.items():
+            fai.write("{}\t{}\t{}\t{}\t{}\n".format(name, length, offset, line_bases, line_width))
+    return entries
+
+
+def _read_fai_(index_name):
+    entries = dict()
+    with open(index_name) as fai:
+        for line in fai:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) >= 5:
+                entries[fields[0]] = tuple(int(v) for v in fields[1:5])
+    return entries
@@ -0,0 +1,163 @@
+import numpy as np
+
+from .packed import as_codes
+
+
+SENTINEL = 0
+SYMBOLS = 6  # sentinel, A, C, G, T, N
+OCC_STEP = 128
+
+
+class FMIndex:
+    """
+    A full-text index over one DNA sequence built from its suffix array
+    and Burrows-Wheeler transform. Exact queries use backward search, so
+    counting a pattern costs O(len(pattern)) rank lookups no matter how
+    long the indexed sequence is.
+    """
+    def __init__(self, dna=None):
+        """
+        Builds the index of a sequence.
+
+        :param dna: a string of DNA, a PackedDNA or an array of codes
+        """
+        if dna is None:
+            return
+        self.text = as_codes(dna).copy()
+        symbols = self.text.astype(np.int64) + 1
+        self.sa = suffix_array(symbols)
+        self.bwt = np.append(symbols, SENTINEL)[self.sa - 1].astype(np.uint8)
+        counts = np.bincount(self.bwt, minlength=SYMBOLS)
+        self.c = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        # occ[i, c] is the number of c's in bwt[:i * OCC_STEP]
+        rows = -(-len(self.bwt) // OCC_STEP) + 1
+        occ = np.zeros((rows, SYMBOLS), dtype=np.int64)
+        for symbol in range(SYMBOLS):
+            hits = np.concatenate(([0], np.cumsum(self.bwt == symbol)))
+            occ[:, symbol] = hits[np.minimum(np.arange(rows) * OCC_STEP, len(self.bwt))]
+        self.occ = occ
+
+    def __len__(self):
+        return len(self.text)
+
+    def _rank_(self, symbol, i):
+        block = i // OCC_STEP
+        start = block * OCC_STEP
+        return int(self.occ[block, symbol]) + int(np.count_nonzero(self.bwt[start:i] == symbol))
+
+    def interval(self, pattern):
+        """
+        Finds the suffix array interval of every suffix starting with a
+        pattern by backward search.
+
+        :param pattern: a string of DNA, a PackedDNA or an array of codes
+        :return: the half-open interval (lo, hi) of suffix array rows
+        """
+        lo, hi = 0, len(self.bwt)
+        for code in as_codes(pattern)[::-1].tolist():
+            symbol = code + 1
+            lo = int(self.c[symbol]) + self._rank_(symbol, lo)
+            hi = int(self.c[symbol]) + self._rank_(symbol, hi)
+            if lo >= hi:
+                return lo, lo
+        return lo, hi
+
+    def count(self, pattern):
+        """
+        Counts the exact occurrences of a pattern.
+        """
+        lo, hi = self.interval(pattern)
+        return hi - lo
+
+    def locate(self, pattern):
+        """
+        Finds the positions of every exact occurrence of a pattern.
+
+        :return: a sorted array of start positions
+        """
+        lo, hi = self.interval(pattern)
+        return np.sort(self.sa[lo:hi])
+
+    def search(self, pattern, d):
+        """
+        Finds every occurrence of a pattern with at most d mismatches by
+        seed and extend: the pattern is cut into d + 1 seeds, at least one
+        of which must match exactly, and each seed hit is checked against
+        the full pattern.
+
+        :param pattern: a string of DNA, a PackedDNA or an array of codes
+        :param d: the maximum number of mismatches
+
+        :return: an array of start positions and an array of their
+                 Hamming distances
+        """
+        pattern = as_codes(pattern)
+        k = len(pattern)
+        if d == 0 or k <= d:
+            if k <= d:
+                positions = np.arange(max(len(self.text) - k + 1, 0))
+            else:
+                positions = self.locate(pattern)
+            return self._verify_(pattern, positions, d)
+        bounds = np.linspace(0, k, d + 2).astype(int)
+        candidates = list()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            hits = self.locate(pattern[start:end]) - start
+            candidates.append(hits[(hits >= 0) & (hits <= len(self.text) - k)])
+        return self._verify_(pattern, np.unique(np.concatenate(candidates)), d)
+
+    def _verify_(self, pattern, positions, d):
+        positions = np.asarray(positions, dtype=np.int64)
+        distances = np.zeros(len(positions), dtype=np.int64)
+        for j, code in enumerate(pattern.tolist()):
+            distances += self.text[positions + j] != code
+        keep = distances <= d
+        return positions[keep], distances[keep].astype(np.uint8)
+
+    def save(self, file_name):
+        """
+        Saves the index to a NumPy .npz file.
+        """
+        np.savez(file_name, text=self.text, sa=self.sa, bwt=self.bwt, c=self.c, occ=self.occ)
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Loads an index saved with :func:`save`.
+        """
+        index = cls()
+        with np.load(file_name) as data:
+            index.text = data['text']
+            index.sa = data['sa']
+            index.bwt = data['bwt']
+            index.c = data['c']
+            index.occ = data['occ']
+        return index
+
+
+def suffix_array(symbols):
+    """
+    Builds the suffix array of a sequence of positive integers, with
+    a smaller end-of-text sentinel appended, by prefix doubling.
+
+    :param symbols: an integer array with every value above 0
+    :return: the suffix array (including the sentinel suffix) as an
+             int32 or int64 array
+    """
+    rank = np.append(np.asarray(symbols, dtype=np.int64), SENTINEL)
+    n = len(rank)
+    dtype = np.int32 if n < 2 ** 31 else np.int64
+    base = max(n, SYMBOLS) + 1
+    h = 1
+    while True:
+        second = np.zeros(n, dtype=np.int64)
+        second[:n - h] = rank[h:] + 1
+        key = rank * base + second
+        sa = np.argsort(key, kind='stable')
+        sorted_key = key[sa]
+        new_rank = np.concatenate(([0], np.cumsum(sorted_key[1:] != sorted_key[:-1])))
+        rank = np.empty(n, dtype=np.int64)
+        rank[sa] = new_rank
+        if new_rank[-1] == n - 1 or h >= n:
+            return sa.astype(dtype)
+        h *= 2
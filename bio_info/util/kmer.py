@@ -0,0 +1,245 @@
+from functools import lru_cache
+from itertools import combinations, product
+
+import numpy as np
+
+from .packed import PackedDNA, as_codes, _DECODE_
+
+
+MAX_K = 31
+INVALID_KMER = np.uint64(0xFFFFFFFFFFFFFFFF)
+NEIGHBORHOOD_CACHE_SIZE = 4096
+_SEPARATOR_ = np.array([4], dtype=np.uint8)
+
+
+def encode_kmers(dna, k, canonical=False):
+    """
+    Encodes every k-mer of a sequence as an integer using the same
+    numbering as pattern_to_number. Runs in O(n log k) array operations
+    by doubling the encoded window width.
+
+    :param dna: a string of DNA, a PackedDNA or an array of codes
+    :param k: the length of each k-mer, at most 31
+    :param canonical: if True, encode the smaller of each k-mer and its
+           reverse complement
+
+    :return: a uint64 array with one code per position; windows that
+             contain an ambiguous base are set to INVALID_KMER
+    """
+    if not 0 < k <= MAX_K:
+        raise ValueError("k must be between 1 and {}".format(MAX_K))
+    codes = as_codes(dna)
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.uint64)
+    ambiguous = codes > 3
+    codes = np.where(ambiguous, np.uint8(0), codes)
+    kmers = _window_codes_(codes, k)
+    if canonical:
+        rc_kmers = _window_codes_(3 - codes[::-1], k)[::-1]
+        kmers = np.minimum(kmers, rc_kmers)
+    if ambiguous.any():
+        counts = np.concatenate(([0], np.cumsum(ambiguous)))
+        kmers[counts[k:] - counts[:-k] > 0] = INVALID_KMER
+    return kmers
+
+
+def _window_codes_(codes, k):
+    n = len(codes) - k + 1
+    result = np.zeros(n, dtype=np.uint64)
+    width = 0  # result[i] encodes codes[i:i + width]
+    block = codes.astype(np.uint64)
+    size = 1  # block[i] encodes codes[i:i + size]
+    remaining = k
+    while remaining:
+        if remaining & 1:
+            result = (result << np.uint64(2 * size)) | block[width:width + n]
+            width += size
+        remaining >>= 1
+        if remaining:
+            block = (block[:-size] << np.uint64(2 * size)) | block[size:]
+            size *= 2
+    return result
+
+
+def reverse_complement_kmers(kmers, k):
+    """
+    Finds the reverse complement of each encoded k-mer.
+
+    :param kmers: an array of k-mer codes
+    :param k: the length of each k-mer
+
+    :return: a uint64 array of reverse complement codes
+    """
+    kmers = np.asarray(kmers, dtype=np.uint64)
+    rc_kmers = np.zeros(len(kmers), dtype=np.uint64)
+    remaining = ~kmers
+    for _ in range(k):
+        rc_kmers = (rc_kmers << np.uint64(2)) | (remaining & np.uint64(3))
+        remaining = remaining >> np.uint64(2)
+    return rc_kmers
+
+
+def canonical_kmers(kmers, k):
+    """
+    Maps each encoded k-mer to the smaller of itself and its reverse
+    complement.
+    """
+    kmers = np.asarray(kmers, dtype=np.uint64)
+    return np.minimum(kmers, reverse_complement_kmers(kmers, k))
+
+
+def decode_kmers(kmers, k):
+    """
+    Converts an array of k-mer codes back to DNA strings.
+
+    :param kmers: an array of k-mer codes
+    :param k: the length of each k-mer
+
+    :return: a NumPy string array with one k-mer per code
+    """
+    kmers = np.asarray(kmers, dtype=np.uint64).reshape(-1)
+    shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.uint64)
+    digits = ((kmers[:, None] >> shifts) & np.uint64(3)).astype(np.uint8)
+    letters = np.ascontiguousarray(_DECODE_[digits])
+    return letters.view("S{}".format(k)).ravel().astype("U{}".format(k))
+
+
+def iter_d_neighborhood(code, k, d):
+    """
+    Iterates over every k-mer within Hamming distance d of an encoded
+    k-mer, including the k-mer itself. Neighbors are generated by choosing
+    the mismatch positions and then the substituted bases, so each one is
+    produced exactly once and no intermediate sets are built.
+
+    :param code: the k-mer code
+    :param k: the length of the k-mer
+    :param d: the maximum number of mismatches
+
+    :return: a generator of neighbor codes in order of distance
+    """
+    yield code
+    for r in range(1, min(d, k) + 1):
+        for positions in combinations(range(k), r):
+            shifts = [2 * (k - 1 - p) for p in positions]
+            # XOR with 1, 2 or 3 turns a base into each of the other three
+            for substitutions in product((1, 2, 3), repeat=r):
+                mask = 0
+                for shift, sub in zip(shifts, substitutions):
+                    mask |= sub << shift
+                yield code ^ mask
+
+
+@lru_cache(maxsize=64)
+def neighborhood_masks(k, d):
+    """
+    Gets the XOR masks that map an encoded k-mer to each of its
+    d-neighbors. The first mask is 0 (the k-mer itself).
+
+    :return: a read-only uint64 array of masks
+    """
+    masks = np.fromiter(iter_d_neighborhood(0, k, d), dtype=np.uint64)
+    masks.flags.writeable = False
+    return masks
+
+
+def d_neighborhood(code, k, d, cache=True):
+    """
+    Gets the d-neighborhood of an encoded k-mer as an array.
+
+    :param code: the k-mer code
+    :param k: the length of the k-mer
+    :param d: the maximum number of mismatches
+    :param cache: if True, look the result up in a bounded LRU cache
+           keyed by (code, k, d)
+
+    :return: a read-only uint64 array of neighbor codes
+    """
+    if cache:
+        return _cached_d_neighborhood_(int(code), k, d)
+    return np.uint64(code) ^ neighborhood_masks(k, d)
+
+
+@lru_cache(maxsize=NEIGHBORHOOD_CACHE_SIZE)
+def _cached_d_neighborhood_(code, k, d):
+    neighbors = np.uint64(code) ^ neighborhood_masks(k, d)
+    neighbors.flags.writeable = False
+    return neighbors
+
+
+def add_d_neighborhood(counts, kmers, k, d, weights=None, block_size=1 << 22):
+    """
+    Adds one to a dense count array for every d-neighbor of every given
+    k-mer, without materializing more than :param block_size neighbors
+    at a time.
+
+    :param counts: an array of length 4 ** k indexed by k-mer code
+    :param kmers: an array of k-mer codes
+    :param k: the length of the k-mers
+    :param d: the maximum number of mismatches
+    :param weights: an optional array with the amount to add for each k-mer
+    :param block_size: the maximum number of neighbors per batch
+
+    :return: :param counts, updated in place
+    """
+    kmers = np.asarray(kmers, dtype=np.uint64)
+    masks = neighborhood_masks(k, d)
+    step = max(block_size // len(masks), 1)
+    for i in range(0, len(kmers), step):
+        neighbors = (kmers[i:i + step, None] ^ masks[None, :]).ravel().astype(np.intp)
+        if weights is None:
+            block_weights = None
+        else:
+            block_weights = np.repeat(np.asarray(weights)[i:i + step], len(masks))
+        if len(neighbors) * 4 >= len(counts):
+            counts += np.bincount(neighbors, weights=block_weights,
+                                  minlength=len(counts)).astype(counts.dtype)
+        else:
+            np.add.at(counts, neighbors, 1 if block_weights is None else block_weights)
+    return counts
+
+
+def record_sequence(item):
+    """
+    Picks the sequence out of a read_chunks or read_records tuple; any
+    other item is returned as it is.
+    """
+    if isinstance(item, tuple):
+        return item[2] if isinstance(item[1], int) else item[1]
+    return item
+
+
+def kmer_batches(dna, k, size):
+    """
+    Splits one or more sequences into code arrays of about :param size
+    bases for batch k-mer encoding. Consecutive batches of a sequence
+    overlap by k - 1 bases, and short sequences are joined with an
+    ambiguous base so that no k-mer spans two of them.
+
+    :param dna: a string of DNA, a PackedDNA, an array of codes, or an
+           iterable of these, of read_chunks tuples (with an overlap of
+           k - 1) or of read_records records
+    :param k: the length of each k-mer
+    :param size: the approximate number of bases per batch
+
+    :return: a generator of uint8 code arrays
+    """
+    if isinstance(dna, (str, bytes, PackedDNA, np.ndarray)):
+        codes = as_codes(dna)
+        for i in range(0, max(len(codes) - k + 1, 1), size):
+            yield codes[i:i + size + k - 1]
+        return
+    pending = list()
+    pending_size = 0
+    for item in dna:
+        codes = as_codes(record_sequence(item))
+        if len(codes) > size:
+            yield from kmer_batches(codes, k, size)
+            continue
+        pending.extend((codes, _SEPARATOR_))
+        pending_size += len(codes) + 1
+        if pending_size >= size:
+            yield np.concatenate(pending)
+            pending = list()
+            pending_size = 0
+    if pending:
+        yield np.concatenate(pending)
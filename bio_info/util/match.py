@@ -0,0 +1,157 @@
+import numpy as np
+
+from .packed import as_codes
+
+
+# The number of 64-bit counter words search_many works on at once
+BLOCK_WORDS = 1 << 18
+
+
+class HammingMatcher:
+    """
+    Bit-parallel (bitap-style) approximate matching under Hamming
+    distance. The sequence is stored as one bit vector per nucleotide, so
+    each pattern position costs a handful of whole-sequence bitwise
+    operations instead of a comparison per base. Mismatch counts are kept
+    in bit-sliced counters with one bit vector per counter bit.
+    """
+    def __init__(self, dna):
+        """
+        Builds the nucleotide bit vectors for a sequence.
+
+        :param dna: a string of DNA, a PackedDNA or an array of codes
+        """
+        codes = as_codes(dna)
+        self.n = len(codes)
+        # Ambiguous bases get their own vector so they only match themselves
+        self._words = [_to_words_(codes == symbol) for symbol in range(5)]
+
+    def search(self, pattern, d):
+        """
+        Finds every position where a pattern matches with at most d
+        mismatches.
+
+        :param pattern: a string of DNA, a PackedDNA or an array of codes
+        :param d: the maximum number of mismatches
+
+        :return: an array of start positions and an array of their
+                 Hamming distances
+        """
+        _, positions, distances = self._search_block_(as_codes(pattern)[None, :], d)
+        return positions, distances
+
+    def _search_block_(self, patterns, d):
+        # Advances the counters of several patterns of the same length
+        # together, one pattern position at a time; each symbol's vector
+        # is shifted once per position and shared by every pattern
+        count, k = patterns.shape
+        windows = self.n - k + 1
+        if windows <= 0 or k == 0 or count == 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                    np.zeros(0, dtype=np.uint8))
+        m = -(-windows // 64)
+        width = max(d, 1).bit_length()
+        symbols = np.minimum(patterns, 4).astype(np.intp)
+        counter = np.zeros((width, count, m), dtype=np.uint64)
+        overflow = np.zeros((count, m), dtype=np.uint64)
+        carry = np.empty((count, m), dtype=np.uint64)
+        tmp = np.empty((count, m), dtype=np.uint64)
+        shifted = np.empty((5, m), dtype=np.uint64)
+        for j in range(k):
+            # carry = positions i where dna[i + j] != pattern[j]
+            for symbol in np.unique(symbols[:, j]).tolist():
+                self._shift_(symbol, j, shifted[symbol], tmp[0])
+            np.take(shifted, symbols[:, j], axis=0, out=carry)
+            np.invert(carry, out=carry)
+            for b in range(width):
+                np.bitwise_and(counter[b], carry, out=tmp)
+                counter[b] ^= carry
+                carry, tmp = tmp, carry
+            overflow |= carry
+        # Only unpack the words that still hold candidate positions
+        live = np.invert(overflow, out=overflow)
+        if windows % 64:
+            live[:, -1] &= np.uint64((1 << (windows % 64)) - 1)
+        words = np.flatnonzero(live)
+        bits = np.unpackbits(live.reshape(-1)[words].view(np.uint8), bitorder='little')
+        hits, offsets = np.nonzero(bits.reshape(-1, 64))
+        words = words[hits]
+        rows, positions = words // m, (words % m) * 64 + offsets
+        distances = np.zeros(len(positions), dtype=np.uint8)
+        for b in range(width):
+            values = counter[b].reshape(-1)[words] >> offsets.astype(np.uint64)
+            distances |= ((values & np.uint64(1)) << np.uint64(b)).astype(np.uint8)
+        keep = distances <= d
+        return rows[keep], positions[keep], distances[keep]
+
+    def _shift_(self, symbol, j, out, tmp):
+        # Bit i of out is bit i + j of the symbol's vector
+        words = self._words[symbol]
+        q, r = divmod(j, 64)
+        m = len(out)
+        if r == 0:
+            np.copyto(out, words[q:q + m])
+        else:
+            np.right_shift(words[q:q + m], np.uint64(r), out=out)
+            np.left_shift(words[q + 1:q + 1 + m], np.uint64(64 - r), out=tmp)
+            out |= tmp
+
+    def search_many(self, patterns, d, reverse_complement=False):
+        """
+        Searches for many patterns against the same bit vectors. Patterns
+        of the same length are searched together in blocks of at most
+        BLOCK_WORDS counter words, so the sequence vectors are shifted
+        once per pattern position for the whole block rather than once
+        per pattern.
+
+        :param patterns: a list of patterns
+        :param d: the maximum number of mismatches
+        :param reverse_complement: if True, also search for the reverse
+               complement of each pattern
+
+        :return: four arrays, one entry per match ordered by pattern,
+                 strand and position: the index of the pattern, the start
+                 position, the Hamming distance and whether the match is
+                 to the reverse complement
+        """
+        strands = list()
+        for codes in (as_codes(pattern) for pattern in patterns):
+            strands.append(codes)
+            if reverse_complement:
+                rc_codes = codes[::-1]
+                strands.append(np.where(rc_codes > 3, rc_codes, 3 - rc_codes))
+        if len(strands) == 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                    np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=bool))
+        # Each pattern holds its counter bits plus two scratch vectors
+        words = (max(d, 1).bit_length() + 3) * max(-(-self.n // 64), 1)
+        step = max(BLOCK_WORDS // words, 1)
+        groups = dict()
+        for s, codes in enumerate(strands):
+            groups.setdefault(len(codes), list()).append(s)
+        found = [None] * len(strands)
+        for group in groups.values():
+            for start in range(0, len(group), step):
+                block = group[start:start + step]
+                rows, pos, dist = self._search_block_(np.array([strands[s] for s in block],
+                                                               dtype=np.uint8), d)
+                bounds = np.searchsorted(rows, np.arange(len(block) + 1))
+                for r, s in enumerate(block):
+                    found[s] = (pos[bounds[r]:bounds[r + 1]], dist[bounds[r]:bounds[r + 1]])
+        sizes = [len(pos) for pos, _ in found]
+        strand_indexes = np.repeat(np.arange(len(strands), dtype=np.int64), sizes)
+        strands_per_pattern = 2 if reverse_complement else 1
+        return (strand_indexes // strands_per_pattern,
+                np.concatenate([pos for pos, _ in found]),
+                np.concatenate([dist for _, dist in found]),
+                strand_indexes % strands_per_pattern == 1)
+
+
+def _to_words_(bits):
+    # Bit i of the vector is bit i % 64 of word i // 64; the vector is
+    # padded with zero words so shifted reads never run past the end
+    packed = np.packbits(bits, bitorder='little')
+    words = np.zeros(-(-len(packed) // 8) + 2, dtype=np.uint64)
+    words.view(np.uint8)[:len(packed)] = packed
+    return words
+
@@ -0,0 +1,201 @@
+import numpy as np
+
+
+_ENCODE_ = np.full(256, 4, dtype=np.uint8)
+_ENCODE_[np.frombuffer(b"ACGTUacgtu", dtype=np.uint8)] = [0, 1, 2, 3, 3, 0, 1, 2, 3, 3]
+
+_DECODE_ = np.frombuffer(b"ACGTN", dtype=np.uint8)
+_SHIFTS_ = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+
+def encode_symbols(dna):
+    """
+    Converts a DNA string to an array of nucleotide codes.
+
+    :param dna: a string (or bytes) of DNA
+    :return: a uint8 array with A=0, C=1, G=2, T=3 and 4 for any
+             ambiguous symbol
+    """
+    if isinstance(dna, str):
+        dna = dna.encode("ascii")
+    return _ENCODE_[np.frombuffer(dna, dtype=np.uint8)]
+
+
+def decode_symbols(codes):
+    """
+    Converts an array of nucleotide codes back to a DNA string.
+
+    :param codes: an array of codes from 0 to 4
+    :return: the DNA string, with 4 decoded as N
+    """
+    return _DECODE_[np.asarray(codes, dtype=np.uint8)].tobytes().decode("ascii")
+
+
+def as_codes(dna):
+    """
+    Gets the nucleotide codes of a DNA string or packed sequence.
+
+    :param dna: a string of DNA, a PackedDNA or an array of codes
+    :return: a uint8 array with ambiguous positions set to 4
+    """
+    if isinstance(dna, PackedDNA):
+        return dna.symbol_codes()
+    if isinstance(dna, (str, bytes)):
+        return encode_symbols(dna)
+    return np.asarray(dna, dtype=np.uint8)
+
+
+class PackedDNA:
+    """
+    A DNA sequence stored at 2 bits per base with a separate bit mask
+    for ambiguous (N) positions. Slicing with a step of 1 returns a view
+    that shares memory with the original sequence. A packed sequence is
+    equal to another with the same bases and to the string it decodes to.
+    """
+    def __init__(self, dna=""):
+        """
+        Packs a DNA string. Any symbol other than A, C, G, T (or U) is
+        recorded in the mask and decodes as N.
+
+        :param dna: a string (or bytes) of DNA
+        """
+        packed = PackedDNA.from_codes(encode_symbols(dna))
+        self._bits = packed._bits
+        self._mask = packed._mask
+        self._start = 0
+        self._length = packed._length
+
+    @classmethod
+    def from_str(cls, dna):
+        """
+        Creates a packed sequence from a DNA string.
+        """
+        return cls(dna)
+
+    @classmethod
+    def from_codes(cls, codes, mask=None):
+        """
+        Creates a packed sequence from an array of nucleotide codes.
+
+        :param codes: an array of codes, where values above 3 are
+               treated as ambiguous
+        :param mask: an optional boolean array marking ambiguous positions
+        :return: the packed sequence
+        """
+        codes = np.asarray(codes, dtype=np.uint8)
+        length = len(codes)
+        ambiguous = codes > 3
+        if mask is not None:
+            ambiguous |= np.asarray(mask, dtype=bool)
+        padded = np.zeros(-(-length // 4) * 4, dtype=np.uint8)
+        padded[:length] = np.where(ambiguous, 0, codes)
+        bits = np.bitwise_or.reduce(padded.reshape(-1, 4) << _SHIFTS_, axis=1)
+        return cls._view_(bits.astype(np.uint8),
+                          np.packbits(ambiguous) if ambiguous.any() else None,
+                          0, length)
+
+    @classmethod
+    def _view_(cls, bits, mask, start, length):
+        packed = cls.__new__(cls)
+        packed._bits = bits
+        packed._mask = mask
+        packed._start = start
+        packed._length = length
+        return packed
+
+    def to_str(self):
+        """
+        Converts the packed sequence back to a DNA string.
+
+        :return: the DNA string, with ambiguous positions as N
+        """
+        return decode_symbols(self.symbol_codes())
+
+    def codes(self):
+        """
+        Unpacks the 2-bit codes of the sequence. Ambiguous positions
+        have the code 0; use :func:`mask` to find them.
+
+        :return: a uint8 array with A=0, C=1, G=2, T=3
+        """
+        first = self._start // 4
+        last = -(-(self._start + self._length) // 4)
+        unpacked = (self._bits[first:last, None] >> _SHIFTS_) & 3
+        offset = self._start - first * 4
+        return unpacked.ravel()[offset:offset + self._length]
+
+    def mask(self):
+        """
+        Gets the ambiguity mask of the sequence.
+
+        :return: a boolean array that is True at ambiguous positions
+        """
+        if self._mask is None:
+            return np.zeros(self._length, dtype=bool)
+        first = self._start // 8
+        last = -(-(self._start + self._length) // 8)
+        offset = self._start - first * 8
+        unpacked = np.unpackbits(self._mask[first:last])
+        return unpacked[offset:offset + self._length].astype(bool)
+
+    def symbol_codes(self):
+        """
+        Unpacks the sequence with ambiguous positions set to 4.
+        """
+        codes = self.codes()
+        if self._mask is not None:
+            codes = np.where(self.mask(), np.uint8(4), codes)
+        return codes
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes used by the (possibly shared) buffers.
+        """
+        size = self._bits.nbytes
+        if self._mask is not None:
+            size += self._mask.nbytes
+        return size
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._length)
+            if step == 1:
+                return PackedDNA._view_(self._bits, self._mask, self._start + start,
+                                        max(stop - start, 0))
+            return PackedDNA.from_codes(self.symbol_codes()[key])
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError("PackedDNA index out of range")
+        return self[key:key + 1].to_str()
+
+    def __iter__(self):
+        return iter(self.to_str())
+
+    def __eq__(self, other):
+        # A string is only equal to the string the sequence decodes to,
+        # so equal objects always share a hash; pack a string to compare
+        # it with case, U and ambiguous symbols normalised
+        if isinstance(other, PackedDNA):
+            return (self._length == other._length and
+                    np.array_equal(self.symbol_codes(), other.symbol_codes()))
+        if isinstance(other, str):
+            return self.to_str() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.to_str())
+
+    def __str__(self):
+        return self.to_str()
+
+    def __repr__(self):
+        if self._length > 20:
+            preview = "{}...{}".format(self[:8].to_str(), self[-8:].to_str())
+        else:
+            preview = self.to_str()
+        return "PackedDNA('{}', length={})".format(preview, self._length)
@@ -0,0 +1,53 @@
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+# Segments attached in this process, kept open while their arrays are in use
+_attached = list()
+
+
+def share_arrays(arrays):
+    """
+    Copies arrays into shared memory so that worker processes can read
+    them without pickling.
+
+    :param arrays: a dictionary of name to array
+    :return: the list of segments (to pass to release_arrays once the
+             workers are done) and a picklable description of the arrays
+             for attach_arrays
+    """
+    segments = list()
+    specs = dict()
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        segment = SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=segment.buf)[...] = array
+        segments.append(segment)
+        specs[name] = (segment.name, array.shape, array.dtype.str)
+    return segments, specs
+
+
+def attach_arrays(specs):
+    """
+    Opens arrays shared with share_arrays, typically in a pool
+    initializer.
+
+    :param specs: the description returned by share_arrays
+    :return: a dictionary of name to array backed by the shared segment
+    """
+    arrays = dict()
+    for name, (segment_name, shape, dtype) in specs.items():
+        segment = SharedMemory(name=segment_name)
+        _attached.append(segment)
+        arrays[name] = np.ndarray(shape, dtype, buffer=segment.buf)
+    return arrays
+
+
+def release_arrays(segments):
+    """
+    Frees the segments created by share_arrays.
+    """
+    for segment in segments:
+        segment.close()
+        segment.unlink()
@@ -0,0 +1,252 @@
+import numpy as np
+
+from .kmer import encode_kmers, INVALID_KMER
+from .packed import PackedDNA, as_codes, decode_symbols
+
+
+PEPTIDE_SYMBOLS = "ILVFMCAGPTSYWQNHEDKR"
+
+
+class SequenceGenerator:
+    """
+    Reproducible random DNA for building benchmark inputs. All sampling
+    goes through one seeded NumPy generator, so the same seed and calls
+    always give the same sequences.
+    """
+    def __init__(self, seed=None):
+        """
+        :param seed: the seed for the random number generator; None
+               draws fresh entropy from the operating system
+        """
+        self.rng = np.random.default_rng(seed)
+
+    """ Backgrounds """
+
+    def codes(self, length, gc=None, markov=None):
+        """
+        Generates a random sequence as an array of nucleotide codes.
+
+        :param length: the number of bases
+        :param gc: the expected fraction of G and C; defaults to 0.5
+        :param markov: an optional (4 ** m) x 4 transition matrix for an
+               order-m Markov background, as returned by train_markov;
+               row i holds the next-base probabilities after the m-mer
+               with code i
+
+        :return: a uint8 array of codes
+        """
+        if markov is not None:
+            return self._markov_codes_(length, np.asarray(markov, dtype=float))
+        return self.rng.choice(4, size=length, p=_base_probabilities_(gc)).astype(np.uint8)
+
+    def sequence(self, length, gc=None, markov=None, packed=False):
+        """
+        Generates a random DNA sequence. Takes the same background options
+        as :func:`codes`.
+
+        :param packed: if True, return a PackedDNA instead of a string
+        """
+        codes = self.codes(length, gc, markov)
+        if packed:
+            return PackedDNA.from_codes(codes)
+        return decode_symbols(codes)
+
+    def peptide(self, length):
+        """
+        Generates a random peptide string.
+        """
+        letters = np.frombuffer(PEPTIDE_SYMBOLS.encode('ascii'), dtype=np.uint8)
+        return letters[self.rng.integers(0, len(letters), length)].tobytes().decode('ascii')
+
+    def _markov_codes_(self, length, transitions, block_size=4096):
+        states = len(transitions)
+        order = int(round(np.log(states) / np.log(4)))
+        if 4 ** order != states or transitions.shape[1:] != (4,):
+            raise ValueError("transition matrix must have shape (4 ** m, 4)")
+        cdf = np.cumsum(transitions / transitions.sum(axis=1, keepdims=True), axis=1)
+        codes = np.empty(length, dtype=np.uint8)
+        head = min(order, length)
+        composition = transitions.mean(axis=0)
+        codes[:head] = self.rng.choice(4, size=head, p=composition / composition.sum())
+        remaining = length - head
+        if remaining == 0:
+            return codes
+        blocks = -(-remaining // block_size)
+        u = self.rng.random(blocks * block_size).reshape(blocks, block_size)
+        # Pass 1: the end state of every block for every possible start state
+        # (the chain is a composition of per-base state maps, so blocks can
+        # be resolved independently and chained afterwards). Chains driven by
+        # the same random numbers soon coalesce, after which one is enough.
+        end_states = np.tile(np.arange(states), (blocks, 1))
+        for j in range(block_size):
+            end_states = _markov_step_(end_states, u[:, j, None], cdf, states)[0]
+            if (j % 16 == 15 and end_states.shape[1] > 1 and
+                    (end_states == end_states[:, :1]).all()):
+                end_states = end_states[:, :1]
+        start = 0
+        for i in range(head):
+            start = (start * 4 + int(codes[i])) % states
+        starts = np.empty(blocks, dtype=np.int64)
+        for b in range(blocks):
+            starts[b] = start
+            start = end_states[b, min(start, end_states.shape[1] - 1)]
+        # Pass 2: regenerate every block from its actual start state
+        output = np.empty((blocks, block_size), dtype=np.uint8)
+        state = starts
+        for j in range(block_size):
+            state, output[:, j] = _markov_step_(state, u[:, j], cdf, states)
+        codes[head:] = output.ravel()[:remaining]
+        return codes
+
+    """ Motifs """
+
+    def mutate(self, dna, rate):
+        """
+        Substitutes each base with one of the other three bases with a
+        given probability.
+
+        :param dna: a string of DNA, a PackedDNA or an array of codes
+        :param rate: the per-base substitution probability, or an array
+               of probabilities with one entry per position
+
+        :return: the mutated codes as a uint8 array
+        """
+        codes = as_codes(dna).copy()
+        hits = self.rng.random(len(codes)) < rate
+        shift = self.rng.integers(1, 4, int(hits.sum()), dtype=np.uint8)
+        codes[hits] = np.where(codes[hits] > 3, codes[hits], (codes[hits] + shift) % 4)
+        return codes
+
+    def plant(self, dna, motif, count=1, rate=0.0):
+        """
+        Inserts non-overlapping copies of a motif into a sequence,
+        overwriting the bases there.
+
+        :param dna: a string of DNA, a PackedDNA or an array of codes
+        :param motif: the motif to plant
+        :param count: the number of copies
+        :param rate: the substitution probability applied to each copy
+
+        :return: the new sequence (same type as :param dna, codes for
+                 arrays) and a sorted array of the planted positions
+        """
+        codes = as_codes(dna).copy()
+        motif = as_codes(motif)
+        k = len(motif)
+        if count * k > len(codes):
+            raise ValueError("not enough room to plant {} copies".format(count))
+        # Choosing from the shortened range and spreading out keeps copies apart
+        offsets = np.sort(self.rng.choice(len(codes) - count * k + 1, size=count, replace=False))
+        positions = offsets + np.arange(count) * k
+        for position in positions:
+            codes[position:position + k] = self.mutate(motif, rate)
+        return _like_(codes, dna), positions
+
+    def motif_dataset(self, t, length, motif, rate=0.0, gc=None, markov=None):
+        """
+        Builds the input of a motif search: t random sequences that each
+        contain one (optionally mutated) copy of a motif.
+
+        :return: the list of DNA strings and an array of planted positions
+        """
+        dna_list = list()
+        positions = np.empty(t, dtype=np.int64)
+        for i in range(t):
+            dna, planted = self.plant(self.codes(length, gc, markov), motif, 1, rate)
+            dna_list.append(decode_symbols(dna))
+            positions[i] = planted[0]
+        return dna_list, positions
+
+    """ Reads """
+
+    def reads(self, reference, n, length, error_rate=0.0, paired=False,
+              insert_size=300, insert_sd=30, batch_size=100000, name="read"):
+        """
+        Samples sequencing reads from a reference with substitution errors.
+        Reads are generated in vectorized batches and yielded one record at
+        a time, so they can be streamed straight to write_fastq.
+
+        :param reference: a string of DNA, a PackedDNA or an array of codes
+        :param n: the number of reads (or read pairs)
+        :param length: the length of each read
+        :param error_rate: the substitution probability, either one value or
+               an array with one value per read position (an error profile)
+        :param paired: if True, yield pairs of records from both ends of a
+               fragment, the second on the reverse strand
+        :param insert_size: the mean fragment length for paired reads
+        :param insert_sd: the standard deviation of the fragment length
+        :param batch_size: the number of reads generated at once
+        :param name: the prefix of each read name
+
+        :return: a generator of (name, sequence, quality) records, or of
+                 pairs of records if :param paired
+        """
+        codes = as_codes(reference)
+        profile = np.broadcast_to(np.asarray(error_rate, dtype=float), (length,))
+        phred = np.clip(np.round(-10 * np.log10(np.maximum(profile, 1e-10))), 0, 60)
+        quality = (phred.astype(np.uint8) + 33).tobytes().decode('ascii')
+        windows = np.lib.stride_tricks.sliding_window_view(codes, length)
+        for first in range(0, n, batch_size):
+            size = min(batch_size, n - first)
+            if paired:
+                fragments = self.rng.normal(insert_size, insert_sd, size).round().astype(np.int64)
+                fragments = np.clip(fragments, length, len(codes))
+                starts = self.rng.integers(0, len(codes) - fragments + 1)
+                forward = self._sequence_errors_(windows[starts], profile)
+                reverse = windows[starts + fragments - length][:, ::-1]
+                reverse = self._sequence_errors_(np.where(reverse > 3, reverse, 3 - reverse), profile)
+                for i in range(size):
+                    read_name = "{}{}".format(name, first + i)
+                    yield ((read_name + "/1", decode_symbols(forward[i]), quality),
+                           (read_name + "/2", decode_symbols(reverse[i]), quality))
+            else:
+                starts = self.rng.integers(0, len(codes) - length + 1, size)
+                sampled = self._sequence_errors_(windows[starts], profile)
+                for i in range(size):
+                    yield "{}{}".format(name, first + i), decode_symbols(sampled[i]), quality
+
+    def _sequence_errors_(self, reads, profile):
+        reads = reads.copy()
+        hits = self.rng.random(reads.shape) < profile
+        shift = self.rng.integers(1, 4, int(hits.sum()), dtype=np.uint8)
+        reads[hits] = np.where(reads[hits] > 3, reads[hits], (reads[hits] + shift) % 4)
+        return reads
+
+
+def train_markov(dna, order, pseudocount=1):
+    """
+    Estimates an order-m Markov background from a sequence.
+
+    :param dna: a string of DNA, a PackedDNA or an array of codes
+    :param order: the number of preceding bases each base depends on
+    :param pseudocount: the count added to every transition
+
+    :return: a (4 ** order) x 4 matrix of transition probabilities
+    """
+    counts = np.full(4 ** (order + 1), pseudocount, dtype=float)
+    if order + 1 <= len(dna):
+        kmers = encode_kmers(dna, order + 1)
+        kmers = kmers[kmers != INVALID_KMER].astype(np.intp)
+        counts += np.bincount(kmers, minlength=len(counts))
+    counts = counts.reshape(4 ** order, 4)
+    return counts / counts.sum(axis=1, keepdims=True)
+
+
+def _base_probabilities_(gc):
+    if gc is None:
+        gc = 0.5
+    return [(1 - gc) / 2, gc / 2, gc / 2, (1 - gc) / 2]
+
+
+def _markov_step_(state, u, cdf, states):
+    symbol = ((u > cdf[state, 0]).astype(np.uint8) + (u > cdf[state, 1]) +
+              (u > cdf[state, 2])).astype(np.uint8)
+    return (state * 4 + symbol) % states, symbol
+
+
+def _like_(codes, original):
+    if isinstance(original, str):
+        return decode_symbols(codes)
+    if isinstance(original, PackedDNA):
+        return PackedDNA.from_codes(codes)
+    return codes
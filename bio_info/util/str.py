@@ -1,14 +1,23 @@
 import math
-import random
+
+import numpy as np
+
+from .distance import hamming_distances
+from .kmer import iter_d_neighborhood, decode_kmers, MAX_K
+from .packed import PackedDNA, as_codes
+from .simulate import SequenceGenerator
 
 
 def get_nucleotide_count(dna):
     """
     Count the number of each nucleotide in the given DNA string.
     
-    :param dna: a string of DNA
+    :param dna: a string of DNA or a PackedDNA
     :return: the number of A's, C's, G's, and T's
     """
+    if isinstance(dna, PackedDNA):
+        counts = np.bincount(dna.symbol_codes(), minlength=5)
+        return tuple(int(n) for n in counts[:4])
     a, c, g, t = 0, 0, 0, 0
     for i in range(len(dna)):
         val = dna[i].upper()
@@ -27,11 +36,15 @@ def hamming_distance(dna1, dna2):
     """
     Finds the Hamming Distance between two strings of DNA.
     
-    :param dna1: a string of DNA
-    :param dna2: a string of DNA
+    :param dna1: a string of DNA or a PackedDNA
+    :param dna2: a string of DNA or a PackedDNA
 
     :return: the computed Hamming Distance
     """
+    if isinstance(dna1, PackedDNA) or isinstance(dna2, PackedDNA):
+        codes1 = as_codes(dna1)
+        codes2 = as_codes(dna2)[:len(codes1)]
+        return int(np.count_nonzero(codes1 != codes2))
     distance = 0
     for i in range(len(dna1)):
         if dna1[i] != dna2[i]:
@@ -44,14 +57,13 @@ def pattern_to_number(pattern):
     """
     Converts a DNA string to a number.
     
-    :param pattern:
-    :return:
+    :param pattern: a string of DNA
+    :return: the base-4 number of :param pattern with A=0, C=1, G=2, T=3
     """
-    if len(pattern) == 0:
-        return 0
-    last = pattern[len(pattern) - 1]
-    prefix = pattern[:len(pattern) - 1]
-    return 4 * pattern_to_number(prefix) + _symbol_to_number_(last)
+    num = 0
+    for symbol in pattern:
+        num = 4 * num + _symbol_to_number_(symbol)
+    return num
 
 
 def _symbol_to_number_(symbol):
@@ -69,17 +81,15 @@ def number_to_pattern(num, k):
     """
     Converts a number back to a DNA string.
     
-    :param num:
-    :param k:
-    :return:
+    :param num: the number of a k-mer
+    :param k: the length of the k-mer
+    :return: the DNA string represented by :param num
     """
-    if k == 1:
-        return _number_to_symbol_(num)
-    prefix_num = int(num / 4)
-    remainder = num % 4
-    symbol = _number_to_symbol_(remainder)
-    prefix_pattern = number_to_pattern(prefix_num, k - 1)
-    return prefix_pattern + symbol
+    pattern = list()
+    for _ in range(k):
+        pattern.append(_number_to_symbol_(num % 4))
+        num //= 4
+    return ''.join(reversed(pattern))
 
 
 def _number_to_symbol_(num):
@@ -142,24 +152,37 @@ def get_entropy(a_freq, c_freq, g_freq, t_freq):
 
 def get_d_neighborhood(dna, d):
     """
-
+    Finds all DNA strings within a given Hamming distance of a pattern.
     
-    :param dna:
-    :param d:
-    :return:
+    :param dna: a string of DNA
+    :param d: the maximum number of mismatches
+    :return: the set of neighboring strings, including :param dna; a
+             pattern longer than MAX_K or with symbols other than
+             uppercase ACGT is expanded string by string, substituting
+             only uppercase A, C, G and T
     """
-    if d == 0:
-        return dna
-    if len(dna) == 1:
-        return {'A', 'C', 'G', 'T'}
-    neighborhood = set()
-    suffix_neighbors = get_d_neighborhood(dna[1:], d)
-    for pattern in suffix_neighbors:
-        if hamming_distance(dna[1:], pattern) < d:
-            for nucleotide in {'A', 'C', 'G', 'T'}:
-                neighborhood.add('{}{}'.format(nucleotide, pattern))
-        else:
-            neighborhood.add('{}{}'.format(dna[0], pattern))
+    k = len(dna)
+    if d == 0 or k == 0:
+        return {dna}
+    if k > MAX_K or not set(dna) <= set('ACGT'):
+        return _string_d_neighborhood_(dna, d)
+    neighbors = np.fromiter(iter_d_neighborhood(pattern_to_number(dna), k, d), dtype=np.uint64)
+    return set(decode_kmers(neighbors, k).tolist())
+
+
+def _string_d_neighborhood_(dna, d):
+    # Grows the neighborhood one base to the left at a time: every suffix
+    # neighbor keeps the pattern's own base, and those with mismatches to
+    # spare also take each of A, C, G and T
+    neighborhood = {''}
+    for i in range(len(dna) - 1, -1, -1):
+        suffix = dna[i + 1:]
+        grown = set()
+        for pattern in neighborhood:
+            grown.add(dna[i] + pattern)
+            if hamming_distance(suffix, pattern) < d:
+                grown.update(nucleotide + pattern for nucleotide in 'ACGT')
+        neighborhood = grown
     return neighborhood
 
 
@@ -167,62 +190,103 @@ def find_approximate_match_indexes(dna, pattern, d):
     """
     Finds all indexes of substrings that match a pattern with at most d mismatches.
     
-    :param dna: a string of DNA
+    :param dna: a string of DNA or a PackedDNA
     :param pattern: the pattern to be matched
     :param d: maximum number of mismatches (Hamming Distance)
     
-    :return: a list of start indexes for matched strings
+    :return: a list of start indexes for matched strings; two strings are
+             compared character by character, as hamming_distance does
     """
-    indexes = list()
-    k = len(pattern)
-    for i in range(len(dna) - k+1):
-        substr = dna[i:i + k]
-        if hamming_distance(pattern, substr) <= d:
-            indexes.append(i)
-    return indexes
+    distances = hamming_distances(pattern, dna)
+    return np.flatnonzero(distances <= d).tolist()
+
+
+_IUPAC_ = b"ACGTUNRYSWKMBDHVacgtunryswkmbdhv"
+_DNA_COMPLEMENT_ = bytes.maketrans(_IUPAC_, b"TGCAANYRSWMKVHDBtgcaanyrswmkvhdb")
+_RNA_COMPLEMENT_ = bytes.maketrans(_IUPAC_, b"UGCAANYRSWMKVHDBugcaanyrswmkvhdb")
+_CODE_COMPLEMENT_ = np.array([3, 2, 1, 0, 4], dtype=np.uint8)
 
 
 def reverse_complement(dna, rna=False):
     """
-    Find the reverse complement of a given DNA string.
+    Find the reverse complement of a given DNA string in a single
+    table-driven pass. IUPAC ambiguity codes are complemented and case
+    is preserved.
 
-    :param dna: the string of DNA
+    :param dna: the string (or bytes) of DNA or a PackedDNA
+    :param rna: if True, complement A with U instead of T
     :return: the reverse complement of :param dna
     """
-    tmp = "Z"
+    if isinstance(dna, PackedDNA):
+        return PackedDNA.from_codes(_CODE_COMPLEMENT_[dna.symbol_codes()[::-1]])
+    table = _RNA_COMPLEMENT_ if rna else _DNA_COMPLEMENT_
+    if isinstance(dna, (bytes, bytearray)):
+        return dna.translate(table)[::-1]
+    return dna.encode('ascii').translate(table)[::-1].decode('ascii')
 
-    # Swap A & T
-    c_dna = dna.replace("A", tmp)
-    if rna:
-        c_dna = c_dna.replace("U", "A")
-        c_dna = c_dna.replace(tmp, "U")
-    else:
-        c_dna = c_dna.replace("T", "A")
-        c_dna = c_dna.replace(tmp, "T")
 
-    # Swap C & G
-    c_dna = c_dna.replace("C", tmp)
-    c_dna = c_dna.replace("G", "C")
-    c_dna = c_dna.replace(tmp, "G")
+def reverse_complement_all(sequences, rna=False):
+    """
+    Finds the reverse complements of a batch of sequences at once.
 
-    # Reverse string
-    rc_dna = ""
-    for i in range(len(c_dna)):
-        rc_dna += c_dna[len(c_dna) - i - 1]
+    :param sequences: a list of DNA strings, or an array of nucleotide
+           codes where the last axis runs along each sequence
+    :param rna: if True, complement A with U instead of T
+    :return: a list of reverse complement strings, or an array of codes
+             with the same shape as :param sequences
+    """
+    if isinstance(sequences, np.ndarray):
+        return _CODE_COMPLEMENT_[sequences[..., ::-1]]
+    if len(sequences) == 0:
+        return list()
+    # Reversing the joined batch also reverses the order of the sequences
+    joined = reverse_complement('\n'.join(sequences), rna)
+    return joined.split('\n')[::-1]
 
-    return rc_dna
 
+def reverse_complement_inplace(buffer, rna=False, block_size=1 << 20):
+    """
+    Reverse complements a mutable buffer of DNA characters in place,
+    swapping blocks from both ends so only one block is copied at a time.
+
+    :param buffer: a bytearray, writable memoryview or uint8 array of
+           ASCII nucleotides
+    :param rna: if True, complement A with U instead of T
+    :param block_size: the number of bytes swapped per step
+    :return: :param buffer
+    """
+    table = np.frombuffer(_RNA_COMPLEMENT_ if rna else _DNA_COMPLEMENT_, dtype=np.uint8)
+    data = buffer if isinstance(buffer, np.ndarray) else np.frombuffer(buffer, dtype=np.uint8)
+    lo, hi = 0, len(data)
+    while hi > lo:
+        size = min(block_size, (hi - lo) // 2)
+        if size == 0:
+            data[lo] = table[data[lo]]
+            break
+        front = table[data[lo:lo + size]]
+        data[lo:lo + size] = table[data[hi - size:hi][::-1]]
+        data[hi - size:hi] = front[::-1]
+        lo += size
+        hi -= size
+    return buffer
+
+
+def generate(length, count=1, type="dna", seed=None):
+    """
+    Generates random DNA or peptide strings.
+
+    :param length: the length of each string
+    :param count: the number of strings
+    :param type: dna or peptide
+    :param seed: an optional seed for reproducible output
 
-# TODO add random DNA / peptide generation class
-def generate(length, count=1, type="dna"):
+    :return: a single string if :param count is 1, otherwise a list
+    """
+    generator = SequenceGenerator(seed)
     if type == "peptide":
-        data = "ILVFMCAGPTSYWQNHEDKR"
+        data = [generator.peptide(length) for i in range(count)]
     else:
-        data = "ACGT"
+        data = [generator.sequence(length) for i in range(count)]
     if count == 1:
-        return ''.join(random.choice(data) for i in range(length))
-    else:
-        dna = list()
-        for i in range(count):
-            dna.append(''.join(random.choice(data) for i in range(length)))
-        return dna
+        return data[0]
+    return data
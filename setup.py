@@ -9,4 +9,7 @@ setup(name="bio_info",
       install_requires=[
           "progressbar2",
           "numpy"
-      ])
+      ],
+      entry_points={
+          "console_scripts": ["bio-oric=bio_info.oric.pipeline:main"]
+      })
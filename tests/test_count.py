@@ -0,0 +1,216 @@
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from bio_info.oric.count import count_kmers, count_kmers_with_mismatches
+from bio_info.oric.find import (get_kmer_count_dict, frequent_words_with_mismatches,
+                                find_pattern_clumps, ClumpFinder, find_minimum_skew)
+from bio_info.oric.skew import SkewTracker, gc_skew, track_skew
+from bio_info.util import PackedDNA, reverse_complement, hamming_distance, read_chunks, write_fasta
+
+
+def _random_dna_(rng, length, alphabet="ACGT"):
+    return ''.join(rng.choice(list(alphabet), length))
+
+
+def _windows_(dna, k):
+    return [dna[i:i + k] for i in range(len(dna) - k + 1) if 'N' not in dna[i:i + k]]
+
+
+def _canonical_(kmer):
+    return min(kmer, reverse_complement(kmer))
+
+
+def _neighbors_(kmer, d):
+    # Every string within Hamming distance d, built one substitution at a time
+    found = {kmer}
+    for _ in range(d):
+        found |= {n[:i] + b + n[i + 1:] for n in found for i in range(len(n)) for b in "ACGT"}
+    return found
+
+
+def _mismatch_counts_(dna, k, d, canonical=False):
+    counts = Counter()
+    for window in _windows_(dna, k):
+        for neighbor in _neighbors_(window, d):
+            counts[neighbor] += 1
+    if not canonical:
+        return dict(counts)
+    # Count(P) + Count(rcP), which doubles a palindrome's count
+    return {_canonical_(pattern): count + counts[reverse_complement(pattern)]
+            for pattern, count in counts.items()}
+
+
+@pytest.mark.parametrize("k", [3, 8, 15])
+@pytest.mark.parametrize("canonical", [False, True])
+def test_count_kmers_matches_brute_force(k, canonical):
+    rng = np.random.default_rng(k)
+    dna = _random_dna_(rng, 800, "ACGTN")
+    windows = _windows_(dna, k)
+    expected = Counter(_canonical_(w) for w in windows) if canonical else Counter(windows)
+    counts = count_kmers(dna, k, canonical)
+    assert counts.to_dict() == dict(expected)
+    assert count_kmers(PackedDNA(dna), k, canonical).to_dict() == dict(expected)
+    assert counts.get(windows[0]) == expected[_canonical_(windows[0]) if canonical else windows[0]]
+    assert counts.max_count() == max(expected.values())
+
+
+def test_count_kmers_over_chunks(tmp_path):
+    rng = np.random.default_rng(4)
+    records = [("a", _random_dna_(rng, 500)), ("b", _random_dna_(rng, 90))]
+    file_name = str(tmp_path / "seqs.fa")
+    write_fasta(records, file_name)
+    expected = Counter(w for _, dna in records for w in _windows_(dna, 6))
+    assert count_kmers(read_chunks(file_name, 64, overlap=5), 6).to_dict() == dict(expected)
+
+
+def test_dense_counting_only_for_enough_kmers():
+    rng = np.random.default_rng(9)
+    # Reads add up past 4 ** 6 / 8 k-mers, so counting switches to a dense array midway
+    reads = [_random_dna_(rng, 40) for _ in range(30)]
+    expected = Counter(w for read in reads for w in _windows_(read, 6))
+    assert count_kmers(reads, 6).to_dict() == dict(expected)
+    assert count_kmers(reads, 6, workers=2).to_dict() == dict(expected)
+    tracemalloc.start()
+    try:
+        dna = _random_dna_(rng, 50)
+        assert count_kmers(dna, 13).to_dict() == dict(Counter(_windows_(dna, 13)))
+        assert count_kmers_with_mismatches(dna, 12, 1).to_dict() == _mismatch_counts_(dna, 12, 1)
+        # Far below the 4 ** 13 * 8 bytes of a dense array
+        assert tracemalloc.get_traced_memory()[1] < 1 << 24
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("k, d", [(4, 1), (5, 2), (14, 1)])
+@pytest.mark.parametrize("canonical", [False, True])
+def test_count_kmers_with_mismatches_matches_brute_force(k, d, canonical):
+    rng = np.random.default_rng(10 * k + d)
+    dna = _random_dna_(rng, 150)
+    expected = _mismatch_counts_(dna, k, d, canonical)
+    assert count_kmers_with_mismatches(dna, k, d, canonical).to_dict() == expected
+
+
+@pytest.mark.parametrize("canonical", [False, True])
+def test_parallel_counts_match_serial(canonical):
+    rng = np.random.default_rng(7)
+    dna = _random_dna_(rng, 3000, "ACGTN")
+    for k in (4, 15):
+        serial = count_kmers(dna, k, canonical)
+        parallel = count_kmers(dna, k, canonical, workers=2)
+        assert parallel.kmers.tolist() == serial.kmers.tolist()
+        assert parallel.counts.tolist() == serial.counts.tolist()
+    serial = count_kmers_with_mismatches(dna, 5, 1, canonical)
+    parallel = count_kmers_with_mismatches(dna, 5, 1, canonical, workers=2)
+    assert parallel.to_dict() == serial.to_dict()
+    reads = [dna[i:i + 90] for i in range(0, len(dna), 90)]
+    assert count_kmers(reads, 6, canonical, workers=2).to_dict() == count_kmers(reads, 6, canonical).to_dict()
+
+
+def _count_dict_(dna, k, precision, d):
+    # Counts every window symbol by symbol, as the original string code did
+    windows = [dna[i:i + k] for i in range(len(dna) - k + 1)]
+    counts = Counter(windows)
+    if precision in ('mismatch', 'loose'):
+        counts = {kmer: sum(hamming_distance(kmer, w) <= d for w in windows) for kmer in counts}
+    if precision in ('reverse', 'loose'):
+        counts = {_canonical_(kmer): count + counts.get(reverse_complement(kmer), 0)
+                  for kmer, count in counts.items()}
+    return dict(counts)
+
+
+@pytest.mark.parametrize("k", [4, 5])
+@pytest.mark.parametrize("alphabet", ["ACGT", "ACGTNacgt"])
+def test_kmer_count_dict_precisions(k, alphabet):
+    rng = np.random.default_rng(5)
+    dna = _random_dna_(rng, 300, alphabet)
+    for precision in ('exact', 'mismatch', 'reverse', 'loose'):
+        expected = _count_dict_(dna, k, precision, 1)
+        assert get_kmer_count_dict(dna, k, precision, 1) == (expected, max(expected.values()))
+    if alphabet == "ACGT":
+        assert get_kmer_count_dict(PackedDNA(dna), k, 'loose', 1)[0] == _count_dict_(dna, k, 'loose', 1)
+
+
+def test_frequent_words_with_mismatches():
+    dna = "ACGTTGCATGTCGCATGATGCATGAGAGCT"
+    # The textbook example: the most frequent 4-mers with one mismatch
+    assert sorted(p for p, _ in frequent_words_with_mismatches(dna, 4, 1)) == ["ATGC", "ATGT", "GATG"]
+    expected = _mismatch_counts_(dna, 4, 1, canonical=True)
+    top = max(expected.values())
+    assert (frequent_words_with_mismatches(dna, 4, 1, reverse=True) ==
+            sorted((p, c) for p, c in expected.items() if c == top))
+
+
+def test_reverse_counts_double_palindromes():
+    dna = "ACGTACGTACGTTTTT"
+    assert frequent_words_with_mismatches(dna, 4, 0, reverse=True) == [("ACGT", 6)]
+    rng = np.random.default_rng(8)
+    # Short palindromic repeats make sure palindromes reach the top counts
+    dna = ''.join(rng.choice(["ACGT", "GATC", "AATT", "CA", "TG", "G"], 60))
+    for k, d in [(4, 0), (4, 1), (6, 1), (14, 1)]:
+        expected = _mismatch_counts_(dna, k, d, canonical=True)
+        assert count_kmers_with_mismatches(dna, k, d, canonical=True).to_dict() == expected
+        top = max(expected.values())
+        assert (frequent_words_with_mismatches(dna, k, d, reverse=True) ==
+                sorted((p, c) for p, c in expected.items() if c == top))
+
+
+def _brute_clumps_(dna, k, L, t):
+    found = set()
+    for start in range(len(dna) - L + 1):
+        window = dna[start:start + L]
+        found |= {kmer for kmer, count in Counter(_windows_(window, k)).items() if count >= t}
+    return found
+
+
+@pytest.mark.parametrize("k, L, t", [(3, 20, 2), (4, 50, 3), (2, 10, 4)])
+def test_clumps_match_brute_force(k, L, t):
+    rng = np.random.default_rng(k * L)
+    dna = _random_dna_(rng, 400)
+    expected = _brute_clumps_(dna, k, L, t)
+    assert find_pattern_clumps(dna, k, L, t) == expected
+    finder = ClumpFinder(k, L, t)
+    for start in range(0, len(dna), 37):
+        finder.update(dna[max(start - 3, 0):start + 37], start=max(start - 3, 0))
+    assert finder.clumps() == expected
+
+
+def test_minimum_skew_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(6)
+    dna = _random_dna_(rng, 1000)
+    skew = [0]
+    for base in dna:
+        skew.append(skew[-1] + (base == 'G') - (base == 'C'))
+    low = min(skew)
+    assert gc_skew(dna).tolist() == skew
+    assert find_minimum_skew(dna) == [i for i, s in enumerate(skew) if s == low]
+    tracker = track_skew((dna[i:i + 33] for i in range(0, len(dna), 33)), step=10, keep_skew=True)
+    assert tracker.skew().tolist() == skew
+    assert tracker.maximum_positions().tolist() == [i for i, s in enumerate(skew) if s == max(skew)]
+    positions, values = tracker.samples()
+    assert values.tolist() == skew[::10]
+    csv_name = str(tmp_path / "skew.csv")
+    find_minimum_skew(dna, save_skew=True, file_name=csv_name, step=100)
+    with open(csv_name) as f:
+        rows = f.read().split()
+    assert rows[1:] == ["{},{}".format(i, skew[i]) for i in range(0, len(dna) + 1, 100)]
+    npy_name = str(tmp_path / "skew.npy")
+    find_minimum_skew(dna, save_skew=True, file_name=npy_name)
+    assert np.load(npy_name).tolist() == skew
+
+
+def test_minimum_skew_folds_case_and_needs_a_file_name():
+    assert find_minimum_skew("ggccGGNNCC") == find_minimum_skew("GGCCGGNNCC") == [0, 4, 10]
+    with pytest.raises(ValueError):
+        find_minimum_skew("GGCC", save_skew=True)
+
+
+def test_windowed_skew():
+    dna = "GGGC" + "CCAT" + "AAAA"
+    tracker = SkewTracker(step=4)
+    tracker.update(dna)
+    starts, values = tracker.windowed()
+    assert starts.tolist() == [0, 4, 8]
+    assert values.tolist() == [0.5, -1.0, 0.0]
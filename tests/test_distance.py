@@ -0,0 +1,42 @@
+import numpy as np
+
+from bio_info.util import PackedDNA, hamming_distance, find_approximate_match_indexes
+from bio_info.util.distance import hamming_distances, batch_hamming_distances
+
+
+def _brute_distances_(pattern, dna):
+    k = len(pattern)
+    return [hamming_distance(pattern, dna[i:i + k]) for i in range(len(dna) - k + 1)]
+
+
+def test_hamming_distances_match_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        dna = ''.join(rng.choice(list("ACGT"), 60))
+        pattern = ''.join(rng.choice(list("ACGT"), int(rng.integers(1, 9))))
+        assert hamming_distances(pattern, dna).tolist() == _brute_distances_(pattern, dna)
+
+
+def test_batch_matches_single_patterns():
+    dna = "ACGTTGCANNACGGTACC"
+    patterns = ["ACG", "TTG", "NNA"]
+    batch = batch_hamming_distances(patterns, dna)
+    for row, pattern in zip(batch, patterns):
+        assert row.tolist() == _brute_distances_(pattern, dna)
+
+
+def test_strings_compare_symbols_exactly():
+    assert hamming_distances("acgt", "ACGT").tolist() == [4]
+    assert hamming_distances("N", "R").tolist() == [1]
+    assert hamming_distances("N", "N").tolist() == [0]
+    assert hamming_distances("ACGU", "ACGT").tolist() == [1]
+    assert find_approximate_match_indexes("ACGTacgt", "acgt", 0) == [4]
+    assert find_approximate_match_indexes("ACGTNCGT", "NCGT", 0) == [4]
+    assert find_approximate_match_indexes("ACGTRCGT", "NCGT", 0) == []
+
+
+def test_codes_fold_case_and_ambiguity():
+    packed = PackedDNA("ACGTRCGT")
+    assert hamming_distances("acgt", packed)[0] == 0
+    assert hamming_distances("N", PackedDNA("R")).tolist() == [0]
+    assert find_approximate_match_indexes(packed, "NCGT", 0) == [4]
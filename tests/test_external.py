@@ -0,0 +1,58 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from bio_info.oric import external
+from bio_info.oric.external import count_kmers_external, KmerDatabase
+from bio_info.util import reverse_complement
+
+
+def _random_dna_(rng, length):
+    return ''.join(rng.choice(list("ACGT"), length))
+
+
+def _brute_counts_(sequences, k, canonical=False):
+    counts = Counter()
+    for dna in sequences:
+        for i in range(len(dna) - k + 1):
+            kmer = dna[i:i + k]
+            if 'N' in kmer:
+                continue
+            if canonical:
+                kmer = min(kmer, reverse_complement(kmer))
+            counts[kmer] += 1
+    return counts
+
+
+@pytest.mark.parametrize("canonical", [False, True])
+def test_counts_match_brute_force(tmp_path, canonical):
+    rng = np.random.default_rng(1)
+    dna = _random_dna_(rng, 3000) + "NN" + _random_dna_(rng, 500)
+    database = count_kmers_external(dna, 6, str(tmp_path / "db"), canonical=canonical)
+    assert dict(database) == _brute_counts_([dna], 6, canonical)
+    assert list(dict(database)) == sorted(dict(database))
+
+
+def test_multiple_passes_and_reads(tmp_path):
+    rng = np.random.default_rng(2)
+    reads = [_random_dna_(rng, int(rng.integers(5, 80))) for _ in range(400)]
+    # A tiny memory budget forces many batches and several passes per bucket
+    database = count_kmers_external(reads, 5, str(tmp_path / "db"), memory=1, prefix_length=2)
+    expected = _brute_counts_(reads, 5)
+    assert dict(database) == expected
+    reopened = KmerDatabase(str(tmp_path / "db"))
+    assert reopened.top(3) == sorted(expected.items(), key=lambda item: (-item[1], item[0]))[:3]
+    assert reopened.above(3) == sorted((kmer, c) for kmer, c in expected.items() if c >= 3)
+    histogram = reopened.histogram()
+    assert histogram.tolist() == np.bincount(list(expected.values())).tolist()
+    solid = reopened.solid(2, str(tmp_path / "solid"))
+    assert dict(solid) == {kmer: c for kmer, c in expected.items() if c >= 2}
+
+
+def test_prefix_length_over_open_file_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(external, "_open_file_limit_", lambda: 100)
+    with pytest.raises(ValueError, match="open file limit"):
+        count_kmers_external("ACGTACGT", 6, str(tmp_path / "db"), prefix_length=4)
+    database = count_kmers_external("ACGTACGT", 6, str(tmp_path / "db"), prefix_length=2)
+    assert dict(database) == _brute_counts_(["ACGTACGT"], 6)
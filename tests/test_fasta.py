@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from bio_info.util.fasta import (read_records, read_chunks, build_fasta_index, write_fasta,
+                                 write_fastq, FastaIndex)
+
+
+def _write_(tmp_path, text, name="seqs.fa"):
+    path = tmp_path / name
+    path.write_bytes(text.encode('ascii'))
+    return str(path)
+
+
+def test_sequence_before_first_header(tmp_path):
+    file_name = _write_(tmp_path, "ACGT\n>r1\nACGT\n")
+    with pytest.raises(ValueError):
+        list(read_records(file_name))
+    with pytest.raises(ValueError):
+        list(read_chunks(file_name, 2))
+    with pytest.raises(ValueError):
+        build_fasta_index(file_name)
+
+
+def test_blank_lines_before_first_header(tmp_path):
+    file_name = _write_(tmp_path, "\n\n>r1\nACGT\n")
+    assert list(read_records(file_name)) == [("r1", "ACGT")]
+    assert build_fasta_index(file_name) == {"r1": (4, 6, 4, 5)}
+
+
+def test_blank_line_inside_record(tmp_path):
+    file_name = _write_(tmp_path, ">r1\nACGT\n\nACGT\n")
+    with pytest.raises(ValueError):
+        build_fasta_index(file_name)
+    file_name = _write_(tmp_path, ">r1\n\nACGT\n", "leading.fa")
+    with pytest.raises(ValueError):
+        build_fasta_index(file_name)
+
+
+def test_blank_line_after_record(tmp_path):
+    file_name = _write_(tmp_path, ">r1\nACGT\nAC\n\n>r2\nGG\n")
+    assert build_fasta_index(file_name) == {"r1": (6, 4, 4, 5), "r2": (2, 17, 2, 3)}
+
+
+def _random_records_(seed, count=5):
+    rng = np.random.default_rng(seed)
+    return [("seq{}".format(i), ''.join(rng.choice(list("ACGTN"), int(rng.integers(0, 300)))))
+            for i in range(count)]
+
+
+@pytest.mark.parametrize("name", ["seqs.fa", "seqs.fa.gz"])
+def test_fasta_round_trip(tmp_path, name):
+    records = _random_records_(1)
+    file_name = str(tmp_path / name)
+    write_fasta(records, file_name, width=17)
+    assert list(read_records(file_name)) == records
+    packed = list(read_records(file_name, packed=True))
+    assert [(n, s.to_str()) for n, s in packed] == records
+    if not name.endswith('.gz'):
+        assert list(read_records(file_name, use_mmap=True, block_size=5)) == records
+
+
+def test_fastq_round_trip(tmp_path):
+    records = [(name, seq, 'I' * len(seq)) for name, seq in _random_records_(2) if seq]
+    file_name = str(tmp_path / "reads.fq.gz")
+    write_fastq(records, file_name)
+    assert list(read_records(file_name)) == records
+    chunks = list(read_chunks(file_name, 1000))
+    assert [(name, chunk) for name, _, chunk in chunks] == [(n, s) for n, s, _ in records]
+
+
+@pytest.mark.parametrize("size, overlap", [(1, 0), (10, 0), (10, 4), (64, 63)])
+def test_chunks_rebuild_records(tmp_path, size, overlap):
+    records = _random_records_(3)
+    file_name = str(tmp_path / "seqs.fa")
+    write_fasta(records, file_name, width=13)
+    rebuilt = dict()
+    for name, start, chunk in read_chunks(file_name, size, overlap, block_size=7):
+        assert len(chunk) <= size
+        sequence = rebuilt.setdefault(name, "")
+        assert start == len(sequence) - (overlap if sequence else 0)
+        rebuilt[name] = sequence[:start] + chunk
+    assert rebuilt == {name: seq for name, seq in records if seq}
+
+
+def test_index_fetch_matches_slices(tmp_path):
+    records = _random_records_(4)
+    file_name = str(tmp_path / "seqs.fa")
+    write_fasta(records, file_name, width=11)
+    rng = np.random.default_rng(5)
+    with FastaIndex(file_name) as index:
+        assert index.names == [name for name, _ in records]
+        for name, seq in records:
+            assert index.length(name) == len(seq)
+            assert index.fetch(name) == seq
+            for _ in range(20):
+                start, end = sorted(rng.integers(0, len(seq) + 2, 2).tolist())
+                assert index.fetch(name, start, end) == seq[start:end]
+            assert index.fetch(name, 0, 5, packed=True).to_str() == seq[:5]
+    # The saved index is reused and matches samtools' column layout
+    assert FastaIndex(file_name).entries == build_fasta_index(file_name)
+    with pytest.raises(KeyError):
+        FastaIndex(file_name).fetch("missing")
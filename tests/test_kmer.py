@@ -0,0 +1,100 @@
+from itertools import product
+
+import numpy as np
+import pytest
+
+from bio_info.util import (encode_kmers, decode_kmers, reverse_complement_kmers, canonical_kmers,
+                           d_neighborhood, add_d_neighborhood, kmer_batches, pattern_to_number,
+                           number_to_pattern, reverse_complement, hamming_distance,
+                           get_d_neighborhood)
+
+
+def _random_dna_(rng, length, alphabet="ACGT"):
+    return ''.join(rng.choice(list(alphabet), length))
+
+
+def test_pattern_number_round_trip():
+    for k in range(1, 5):
+        for number, pattern in enumerate(''.join(p) for p in product("ACGT", repeat=k)):
+            assert pattern_to_number(pattern) == number
+            assert number_to_pattern(number, k) == pattern
+    assert number_to_pattern(pattern_to_number("T" * 31), 31) == "T" * 31
+
+
+@pytest.mark.parametrize("k", [1, 2, 5, 16, 31])
+def test_encode_kmers_matches_pattern_to_number(k):
+    rng = np.random.default_rng(k)
+    dna = _random_dna_(rng, 200, "ACGTN")
+    kmers = encode_kmers(dna, k)
+    assert len(kmers) == len(dna) - k + 1
+    for i, code in enumerate(kmers.tolist()):
+        window = dna[i:i + k]
+        if 'N' in window:
+            assert code == 0xFFFFFFFFFFFFFFFF
+        else:
+            assert code == pattern_to_number(window)
+            assert decode_kmers([code], k)[0] == window
+
+
+def test_canonical_kmers():
+    rng = np.random.default_rng(1)
+    dna = _random_dna_(rng, 300)
+    k = 7
+    kmers = encode_kmers(dna, k)
+    rc = reverse_complement_kmers(kmers, k)
+    for i, code in enumerate(rc.tolist()):
+        assert code == pattern_to_number(reverse_complement(dna[i:i + k]))
+    expected = [min(dna[i:i + k], reverse_complement(dna[i:i + k])) for i in range(len(kmers))]
+    assert decode_kmers(encode_kmers(dna, k, canonical=True), k).tolist() == expected
+    assert canonical_kmers(kmers, k).tolist() == encode_kmers(dna, k, canonical=True).tolist()
+
+
+@pytest.mark.parametrize("k, d", [(1, 1), (4, 0), (4, 2), (5, 3), (6, 6)])
+def test_d_neighborhood_matches_brute_force(k, d):
+    pattern = "ACGTTG"[:k]
+    expected = {''.join(p) for p in product("ACGT", repeat=k)
+                if hamming_distance(pattern, ''.join(p)) <= d}
+    neighbors = d_neighborhood(pattern_to_number(pattern), k, d)
+    assert len(neighbors) == len(expected)
+    assert set(decode_kmers(neighbors, k).tolist()) == expected
+    assert get_d_neighborhood(pattern, d) == expected
+    assert d_neighborhood(pattern_to_number(pattern), k, d, cache=False).tolist() == neighbors.tolist()
+
+
+def test_d_neighborhood_of_long_or_unusual_patterns():
+    pattern = "A" * 33
+    neighbors = get_d_neighborhood(pattern, 1)
+    assert len(neighbors) == 1 + 3 * 33
+    assert all(hamming_distance(pattern, n) <= 1 for n in neighbors)
+    assert get_d_neighborhood("acg", 0) == {"acg"}
+    for pattern, d in [("ACGX", 1), ("aCgN", 2), ("ACGTNACGTACGTACGTACGTACGTACGTACGT", 1)]:
+        expected = {pattern}
+        for _ in range(d):
+            expected |= {n[:i] + b + n[i + 1:] for n in expected for i in range(len(n)) for b in "ACGT"}
+        assert get_d_neighborhood(pattern, d) == expected
+
+
+def test_add_d_neighborhood():
+    rng = np.random.default_rng(2)
+    k, d = 4, 1
+    kmers = rng.integers(0, 4 ** k, 50).astype(np.uint64)
+    weights = rng.integers(1, 5, 50)
+    expected = np.zeros(4 ** k, dtype=np.int64)
+    for code, weight in zip(kmers.tolist(), weights.tolist()):
+        expected[d_neighborhood(code, k, d).astype(np.intp)] += weight
+    counts = add_d_neighborhood(np.zeros(4 ** k, dtype=np.int64), kmers, k, d, weights, block_size=64)
+    assert counts.tolist() == expected.tolist()
+
+
+def test_kmer_batches_cover_every_kmer_once():
+    rng = np.random.default_rng(3)
+    k = 5
+    dna = _random_dna_(rng, 1000)
+    batches = list(kmer_batches(dna, k, 97))
+    kmers = np.concatenate([encode_kmers(b, k) for b in batches])
+    assert sorted(kmers.tolist()) == sorted(encode_kmers(dna, k).tolist())
+    reads = [_random_dna_(rng, int(rng.integers(1, 40))) for _ in range(100)]
+    records = [("r{}".format(i), read) for i, read in enumerate(reads)]
+    kmers = np.concatenate([encode_kmers(b, k) for b in kmer_batches(records, k, 50)])
+    expected = [code for read in reads for code in encode_kmers(read, k).tolist()]
+    assert sorted(kmers[kmers != 0xFFFFFFFFFFFFFFFF].tolist()) == sorted(expected)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from bio_info.util import HammingMatcher, FMIndex, suffix_array, reverse_complement, match
+
+
+def _random_dna_(rng, length, alphabet="ACGT"):
+    return ''.join(rng.choice(list(alphabet), length))
+
+
+def _brute_matches_(dna, pattern, d):
+    k = len(pattern)
+    positions, distances = list(), list()
+    for i in range(len(dna) - k + 1):
+        distance = sum(a != b for a, b in zip(dna[i:i + k], pattern))
+        if distance <= d:
+            positions.append(i)
+            distances.append(distance)
+    return positions, distances
+
+
+@pytest.mark.parametrize("d", [0, 1, 2, 4])
+def test_hamming_matcher_matches_brute_force(d):
+    rng = np.random.default_rng(d)
+    dna = _random_dna_(rng, 700, "ACGTN")
+    matcher = HammingMatcher(dna)
+    for k in (1, 5, 9, 64, 70):
+        pattern = dna[100:100 + k] if k % 2 else _random_dna_(rng, k)
+        positions, distances = matcher.search(pattern, d)
+        assert (positions.tolist(), distances.tolist()) == _brute_matches_(dna, pattern, d)
+
+
+def test_hamming_matcher_search_many():
+    rng = np.random.default_rng(7)
+    dna = _random_dna_(rng, 300)
+    patterns = [dna[10:16], _random_dna_(rng, 6)]
+    indexes, positions, distances, reverse = HammingMatcher(dna).search_many(patterns, 1, True)
+    expected = set()
+    for i, pattern in enumerate(patterns):
+        for strand, is_reverse in ((pattern, False), (reverse_complement(pattern), True)):
+            for p, dist in zip(*_brute_matches_(dna, strand, 1)):
+                expected.add((i, p, dist, is_reverse))
+    found = set(zip(indexes.tolist(), positions.tolist(), distances.tolist(), reverse.tolist()))
+    assert found == expected
+
+
+@pytest.mark.parametrize("block_words", [1, 100, 1 << 18])
+def test_search_many_blocks_patterns_of_each_length(monkeypatch, block_words):
+    monkeypatch.setattr(match, "BLOCK_WORDS", block_words)
+    rng = np.random.default_rng(9)
+    dna = _random_dna_(rng, 500, "ACGTN")
+    patterns = [_random_dna_(rng, int(rng.integers(1, 9)), "ACGTN") for _ in range(40)]
+    patterns += [dna[50:56], "", dna[-70:]]
+    indexes, positions, distances, reverse = HammingMatcher(dna).search_many(patterns, 2, True)
+    expected = list()
+    for i, pattern in enumerate(patterns):
+        for strand, is_reverse in ((pattern, False), (reverse_complement(pattern), True)):
+            if pattern:
+                expected.extend((i, p, dist, is_reverse)
+                                for p, dist in zip(*_brute_matches_(dna, strand, 2)))
+    assert list(zip(indexes.tolist(), positions.tolist(), distances.tolist(),
+                    reverse.tolist())) == expected
+
+
+def test_suffix_array_matches_sorted_suffixes():
+    rng = np.random.default_rng(8)
+    for length in (1, 2, 10, 257):
+        symbols = rng.integers(1, 4, length)
+        sa = suffix_array(symbols)
+        text = symbols.tolist() + [0]
+        assert sa.tolist() == sorted(range(length + 1), key=lambda i: text[i:])
+
+
+@pytest.mark.parametrize("d", [0, 1, 2])
+def test_fm_index_matches_brute_force(tmp_path, d):
+    rng = np.random.default_rng(10 + d)
+    dna = _random_dna_(rng, 2000)
+    index = FMIndex(dna)
+    file_name = str(tmp_path / "index.npz")
+    index.save(file_name)
+    loaded = FMIndex.load(file_name)
+    for k in (1, 3, 8, 12):
+        for pattern in (dna[500:500 + k], _random_dna_(rng, k)):
+            exact, _ = _brute_matches_(dna, pattern, 0)
+            assert index.count(pattern) == len(exact)
+            assert index.locate(pattern).tolist() == exact
+            positions, distances = loaded.search(pattern, d)
+            assert (positions.tolist(), distances.tolist()) == _brute_matches_(dna, pattern, d)
@@ -0,0 +1,211 @@
+import math
+from collections import Counter
+from fractions import Fraction
+from itertools import product
+
+import numpy as np
+import pytest
+
+from bio_info.motif.gibbs import gibbs_chains
+from bio_info.motif.profile import Profile, count_matrix, motif_codes
+from bio_info.motif.restart import run_batches
+from bio_info.motif.search import (gibbs_sampler, randomized_motif_search, greedy_motif_search,
+                                   find_profile_probable_kmer, median_string_search)
+from bio_info.motif.util import (entropy_score, mismatch_score, form_consensus_string,
+                                 distance_pattern_strings, distance_table, encode_dna_list)
+from bio_info.util import SequenceGenerator
+
+
+def _noisy_ties_(codes, k, items):
+    # Every item scores 0.3, computed in an order that leaves float noise
+    scores = np.array([0.1 + 0.2 if item % 2 == 0 else 0.3 for item in items])
+    return np.array([[item] for item in items]), scores
+
+
+def test_restarts_with_equal_scores_keep_the_first():
+    positions, score = run_batches(_noisy_ties_, np.zeros((1, 4)), 2, list(range(6)),
+                                   progress=False, batch_size=4)
+    assert positions.tolist() == [0]
+    assert score == 0.3
+    positions, _ = run_batches(_noisy_ties_, np.zeros((1, 4)), 2, list(range(1, 6)),
+                               progress=False, batch_size=2)
+    assert positions.tolist() == [1]
+
+
+def test_sampled_searches_do_not_depend_on_workers():
+    dna_list, _ = SequenceGenerator(3).motif_dataset(6, 80, 'ACGTTGCA', rate=0.1)
+    serial = gibbs_sampler(dna_list, 8, it=6, n=200, seed=11)
+    assert gibbs_sampler(dna_list, 8, it=6, n=200, seed=11, workers=2) == serial
+    serial = randomized_motif_search(dna_list, 8, n=20, seed=11)
+    assert randomized_motif_search(dna_list, 8, n=20, seed=11, workers=2) == serial
+
+
+def _entropy_(motifs):
+    # The exact entropy as coefficients of log2 of each prime, which are
+    # linearly independent, so equal scores give equal coefficients
+    t = len(motifs)
+    coefficients = Counter()
+    for column in zip(*motifs):
+        for base in "ACGT":
+            p = Fraction(column.count(base) + 1, t + 4)
+            for prime, power in _factors_(p.numerator).items():
+                coefficients[prime] -= p * power
+            for prime, power in _factors_(p.denominator).items():
+                coefficients[prime] += p * power
+    return {prime: c for prime, c in coefficients.items() if c != 0}
+
+
+def _factors_(n):
+    factors = Counter()
+    prime = 2
+    while n > 1:
+        while n % prime == 0:
+            factors[prime] += 1
+            n //= prime
+        prime += 1
+    return factors
+
+
+def _less_(first, second):
+    if first == second:
+        return False
+    value = lambda score: sum(float(c) * math.log2(prime) for prime, c in score.items())
+    return value(first) < value(second)
+
+
+def _greedy_reference_(dna_list, k):
+    best = [dna[:k] for dna in dna_list]
+    for i in range(len(dna_list[0]) - k + 1):
+        motifs = [dna_list[0][i:i + k]]
+        for dna in dna_list[1:]:
+            motifs.append(find_profile_probable_kmer(Profile(motifs), k, dna))
+        if _less_(_entropy_(motifs), _entropy_(best)):
+            best = motifs
+    return best
+
+
+def test_greedy_search_keeps_the_first_of_equal_scores():
+    # Seeds 4 and 5 give different motif sets with exactly equal entropy
+    dna_list = ['TTTGGTAATT', 'TCATCGGTAT', 'TGCGCTTGCC', 'AGAAATCAGG', 'AACTAACATT']
+    assert greedy_motif_search(dna_list, 5) == _greedy_reference_(dna_list, 5)
+    # The best seed ties with the first k-mers of each string
+    for dna_list in (['CCG', 'TTC', 'TTA'], ['AGG', 'TTG', 'ATT'],
+                     ['ACTGGT', 'ATCACA', 'ATTGCC'], ['GGG', 'TCA', 'GTA', 'AAC', 'AAA']):
+        assert greedy_motif_search(dna_list, 2) == [dna[:2] for dna in dna_list]
+    rng = np.random.default_rng(23)
+    for _ in range(40):
+        t, k = int(rng.integers(2, 5)), int(rng.integers(2, 6))
+        dna_list = [''.join(rng.choice(list("ACGT"), int(rng.integers(k, 25)))) for _ in range(t)]
+        assert greedy_motif_search(dna_list, k) == _greedy_reference_(dna_list, k)
+
+
+def _random_dna_(rng, length):
+    return ''.join(rng.choice(list("ACGT"), length))
+
+
+def test_profile_scores_match_exact_products():
+    rng = np.random.default_rng(30)
+    for _ in range(20):
+        k = int(rng.integers(1, 7))
+        motifs = [_random_dna_(rng, k) for _ in range(int(rng.integers(1, 6)))]
+        profile = Profile(motifs)
+        t = len(motifs)
+        exact = [[Fraction(column.count(base) + 1, t + 4) for column in zip(*motifs)] for base in "ACGT"]
+        dna = _random_dna_(rng, 60)
+        products = list()
+        for i in range(len(dna) - k + 1):
+            value = Fraction(1)
+            for j, base in enumerate(dna[i:i + k]):
+                value *= exact["ACGT".index(base)][j]
+            products.append(value)
+        assert np.allclose(np.exp(profile.scores(dna)), [float(p) for p in products])
+        best = products.index(max(products))
+        assert profile.most_probable(dna) == best
+        assert find_profile_probable_kmer(profile, k, dna) == dna[best:best + k]
+        order = sorted(range(len(products)), key=lambda i: -products[i])[:3]
+        assert find_profile_probable_kmer(profile, k, dna, n=3) == [dna[i:i + k] for i in order]
+
+
+def test_profile_ambiguous_kmers_are_impossible():
+    profile = Profile(["ACGTA", "ACCTA", "TCGTA"])
+    assert profile.kmer_probability("ACGNA") == 0.0
+    assert profile.kmer_log_probability("ACGNA") == -math.inf
+    assert math.isclose(profile.kmer_probability("ACGTA"),
+                        math.exp(profile.kmer_log_probability("ACGTA")))
+    assert profile.scores("ACGNA").tolist() == [-math.inf]
+
+
+def test_profile_needs_a_window():
+    profile = Profile(["ACGTA", "ACCTA", "TCGTA"])
+    with pytest.raises(ValueError):
+        profile.most_probable("ACGT")
+    with pytest.raises(ValueError):
+        find_profile_probable_kmer(profile, 5, "ACGT")
+    assert profile.most_probable("ACGT", n=2).tolist() == []
+    assert find_profile_probable_kmer(profile, 5, "ACGT", n=2) == []
+
+
+def test_profile_matches_motif_scores():
+    motifs = ["TCGGGGGTTTTT", "CCGGTGACTTAC", "ACGGGGATTTTC", "TTGGGGACTTTT",
+              "AAGGGGACTTCC", "TTGGGGACTTCC", "TCGGGGATTCAT", "TCGGGGATTCCT",
+              "TAGGGGAACTAC", "TCGGGTATAACC"]
+    assert mismatch_score(motifs) == 30
+    assert form_consensus_string(motifs) == "TCGGGGATTTCC"
+    exact = 0.0
+    for column in zip(*motifs):
+        for base in "ACGT":
+            p = (column.count(base) + 1) / (len(motifs) + 4)
+            exact -= p * math.log2(p)
+    assert math.isclose(entropy_score(motifs), exact)
+    assert math.isclose(Profile(count_matrix(motif_codes(motifs))).entropy_score(), exact)
+
+
+def test_distance_table_matches_brute_force():
+    rng = np.random.default_rng(31)
+    for k in (1, 3, 5):
+        dna_list = [_random_dna_(rng, int(rng.integers(k, 25))) for _ in range(4)]
+        distances = [distance_pattern_strings(''.join(p), dna_list) for p in product("ACGT", repeat=k)]
+        assert distance_table(dna_list, k).tolist() == distances
+        candidates = np.array([3, 0, 4 ** k - 1], dtype=np.uint64)
+        assert distance_table(dna_list, k, candidates).tolist() == [distances[int(c)] for c in candidates]
+
+
+def test_median_string_matches_brute_force():
+    rng = np.random.default_rng(32)
+    for k in (1, 3, 5):
+        dna_list = [_random_dna_(rng, int(rng.integers(k, 25))) for _ in range(4)]
+        patterns = [''.join(p) for p in product("ACGT", repeat=k)]
+        distances = [distance_pattern_strings(p, dna_list) for p in patterns]
+        expected = patterns[distances.index(min(distances))]
+        assert median_string_search(k, dna_list) == expected
+        assert median_string_search(k, dna_list, workers=2) == expected
+    dna_list, _ = SequenceGenerator(32).motif_dataset(8, 120, 'ACGTTGCATG')
+    assert median_string_search(10, dna_list) == 'ACGTTGCATG'
+
+
+def test_greedy_search_finds_a_planted_motif():
+    dna_list, positions = SequenceGenerator(32).motif_dataset(8, 120, 'ACGTTGCATG')
+    expected = [dna[p:p + 10] for dna, p in zip(dna_list, positions.tolist())]
+    assert greedy_motif_search(dna_list, 10) == expected
+    assert greedy_motif_search(dna_list, 10, workers=2) == expected
+
+
+def test_gibbs_sampler_finds_a_planted_motif():
+    dna_list, positions = SequenceGenerator(32).motif_dataset(8, 120, 'ACGTTGCATG')
+    expected = [dna[p:p + 10] for dna, p in zip(dna_list, positions.tolist())]
+    assert gibbs_sampler(dna_list, 10, it=10, n=500, seed=1) == expected
+
+
+def test_gibbs_chains_depend_only_on_their_seed():
+    dna_list, _ = SequenceGenerator(33).motif_dataset(5, 60, 'ACGTTGCA', rate=0.2)
+    codes = encode_dna_list(dna_list)
+    seeds = np.random.SeedSequence(4).spawn(3)
+    positions, scores = gibbs_chains(codes, 8, seeds, n=300)
+    for i, seed in enumerate(seeds):
+        alone, score = gibbs_chains(codes, 8, [seed], n=300)
+        assert alone[0].tolist() == positions[i].tolist()
+        assert score[0] == scores[i]
+    # Each chain reports the score of the motifs it returns
+    for p, score in zip(positions, scores.tolist()):
+        motifs = [dna[q:q + 8] for dna, q in zip(dna_list, p.tolist())]
+        assert math.isclose(entropy_score(motifs), score, abs_tol=1e-9)
@@ -0,0 +1,43 @@
+import numpy as np
+
+from bio_info.util import PackedDNA, as_codes, encode_symbols, decode_symbols
+
+
+def test_round_trip_and_codes():
+    dna = "ACGTNACGTTGCAXacgu"
+    packed = PackedDNA(dna)
+    assert len(packed) == len(dna)
+    assert packed.to_str() == "ACGTNACGTTGCANACGT"
+    assert packed.symbol_codes().tolist() == encode_symbols(dna).tolist()
+    assert packed.mask().tolist() == [c not in "ACGTUacgtu" for c in dna]
+    assert decode_symbols(as_codes(packed)) == packed.to_str()
+
+
+def test_slices_match_string_slices():
+    rng = np.random.default_rng(0)
+    dna = ''.join(rng.choice(list("ACGTN"), 101, p=[0.24, 0.24, 0.24, 0.24, 0.04]))
+    packed = PackedDNA(dna)
+    for _ in range(200):
+        start, stop = sorted(rng.integers(-5, 110, 2).tolist())
+        assert packed[start:stop].to_str() == dna[start:stop]
+        assert packed[start:stop][1:-1].to_str() == dna[start:stop][1:-1]
+    assert packed[::3].to_str() == dna[::3]
+    assert packed[-1] == dna[-1]
+    # Unit-step slices share the packed buffer
+    assert packed[10:90].nbytes == packed.nbytes
+
+
+def test_equality():
+    assert PackedDNA("ACGT") == PackedDNA("ACGT")
+    assert PackedDNA("ACGT") != PackedDNA("ACGA")
+    assert hash(PackedDNA("ACGT")) == hash(PackedDNA("TACGT")[1:])
+    # Case and U are normalised when packing, so packed forms compare equal
+    assert PackedDNA("acgu") == PackedDNA("ACGT") == "ACGT"
+    assert PackedDNA("ACGT") != "acgt"
+    assert PackedDNA("ACGU") != "ACGU"
+    for dna in ("ACGT", "acgu", "ACXT"):
+        packed = PackedDNA(dna)
+        equal = [other for other in (dna, dna.upper(), packed.to_str(), PackedDNA(dna.lower()))
+                 if packed == other]
+        assert all(hash(other) == hash(packed) for other in equal)
+        assert len({packed, *equal}) == 1
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from bio_info.oric.count import count_kmers_with_mismatches
+from bio_info.oric.pipeline import scan_origins, main, TSV_COLUMNS, _skew_windows_, _stream_records_
+from bio_info.oric.skew import gc_skew
+from bio_info.util import write_fasta
+
+
+def _reference_(dna, k, d, window, max_windows, n):
+    # The same scan with the whole record in memory
+    skew = gc_skew(dna)
+    positions = np.flatnonzero(skew == skew.min())
+    windows = list()
+    for start, end in _skew_windows_(positions, len(dna), window)[:max_windows]:
+        counts = count_kmers_with_mismatches(dna[start:end], k, d, canonical=True)
+        windows.append((start, end, counts.top(n)))
+    return int(skew.min()), positions.tolist(), windows
+
+
+@pytest.mark.parametrize("chunk_size", [7, 50, 333, 1 << 20])
+def test_scan_matches_in_memory_reference(tmp_path, chunk_size):
+    rng = np.random.default_rng(chunk_size)
+    records = list()
+    for i in range(4):
+        # Biased halves give a skew minimum somewhere inside the record
+        split = int(rng.integers(200, 1800))
+        first = ''.join(rng.choice(list("ACGT"), split, p=[0.25, 0.3, 0.2, 0.25]))
+        second = ''.join(rng.choice(list("ACGT"), 2000 - split, p=[0.25, 0.2, 0.3, 0.25]))
+        records.append(("r{}".format(i), first + second))
+    records.append(("flat", "AT" * 300))
+    file_name = str(tmp_path / "genomes.fa")
+    write_fasta(records, file_name, width=70)
+
+    results = scan_origins(file_name, k=5, d=1, window=60, max_windows=3, n=4, chunk_size=chunk_size)
+    assert [result["record"] for result in results] == [name for name, _ in records]
+    for result, (name, dna) in zip(results, records):
+        minimum, positions, windows = _reference_(dna, 5, 1, 60, 3, 4)
+        assert result["length"] == len(dna)
+        assert result["minimum_skew"] == minimum
+        assert result["minimum_positions"] == positions
+        assert [(w["start"], w["end"], [(c["pattern"], c["count"]) for c in w["candidates"]])
+                for w in result["windows"]] == windows
+
+
+def test_stream_keeps_only_chunks_near_the_minimum(tmp_path):
+    rng = np.random.default_rng(5)
+    dna = (''.join(rng.choice(list("ACGT"), 5000, p=[0.25, 0.3, 0.2, 0.25])) +
+           ''.join(rng.choice(list("ACGT"), 5000, p=[0.25, 0.2, 0.3, 0.25])))
+    file_name = str(tmp_path / "genome.fa")
+    write_fasta([("g", dna)], file_name)
+    (_, tracker, kept, _), = _stream_records_(file_name, 100, 60)
+    assert tracker.length == len(dna)
+    assert sum(len(piece) for piece in kept.values()) < len(dna) // 10
+
+
+def test_window_shorter_than_k(tmp_path, capsys):
+    file_name = str(tmp_path / "genome.fa")
+    write_fasta([("g", "GGGCCCATATCCCGGGAAAT" * 20)], file_name)
+    (_, tracker, kept, _), = _stream_records_(file_name, 7, 0)
+    assert tracker.length == 400
+    with pytest.raises(ValueError):
+        scan_origins(file_name, k=4, window=3)
+    with pytest.raises(SystemExit):
+        main([file_name, "-k", "4", "-w", "0"])
+    assert "--window" in capsys.readouterr().err
+
+
+def test_main_writes_one_row_per_candidate(tmp_path, capsys):
+    file_name = str(tmp_path / "genome.fa")
+    write_fasta([("g", "GGGCCCATATCCCGGGAAAT" * 20)], file_name)
+    output = str(tmp_path / "out.tsv")
+    assert main([file_name, "-k", "4", "-n", "2", "-w", "40", "-o", output]) == 0
+    with open(output) as f:
+        rows = [line.rstrip('\n').split('\t') for line in f]
+    assert rows[0] == list(TSV_COLUMNS)
+    result, = scan_origins(file_name, k=4, n=2, window=40)
+    assert len(rows) - 1 == sum(len(w["candidates"]) for w in result["windows"])
+    assert "read_and_skew" in capsys.readouterr().err
@@ -0,0 +1,53 @@
+from collections import Counter
+
+import numpy as np
+
+from bio_info.oric.sketch import CountMinSketch, HyperLogLog, KmerSketch
+from bio_info.util import encode_kmers, reverse_complement
+
+
+def _random_dna_(rng, length):
+    return ''.join(rng.choice(list("ACGT"), length))
+
+
+def test_count_min_never_underestimates():
+    rng = np.random.default_rng(3)
+    kmers = rng.integers(0, 5000, 20000).astype(np.uint64)
+    sketch = CountMinSketch(512, depth=4, seed=7)
+    sketch.add(kmers[:10000])
+    sketch.add(kmers[10000:])
+    unique, counts = np.unique(kmers, return_counts=True)
+    estimates = sketch.estimate(unique)
+    assert (estimates >= counts).all()
+    assert sketch.total == len(kmers)
+    # With probability 1 - delta each estimate is within the bound
+    assert np.mean(estimates - counts <= sketch.error_bound()) > 1 - sketch.delta
+
+
+def test_merge_adds_counts():
+    first, second = CountMinSketch(4096, seed=1), CountMinSketch(4096, seed=1)
+    first.add(np.array([5, 5, 9], dtype=np.uint64))
+    second.add(np.array([5, 11], dtype=np.uint64))
+    first.merge(second)
+    assert first.estimate(np.array([5, 9, 11], dtype=np.uint64)).tolist() == [3, 1, 1]
+
+
+def test_hyperloglog_within_error():
+    hll = HyperLogLog(p=12, seed=2)
+    hll.add(np.arange(100000, dtype=np.uint64))
+    hll.add(np.arange(50000, dtype=np.uint64))
+    assert abs(hll.estimate() - 100000) < 4 * hll.relative_error * 100000
+
+
+def test_kmer_sketch_matches_exact_counts():
+    rng = np.random.default_rng(4)
+    planted = "ACGTTGCAA"
+    dna = planted.join(_random_dna_(rng, 40) for _ in range(50))
+    sketch = KmerSketch(9, canonical=True, memory=1 << 20, capacity=50).update(dna)
+    exact = Counter(min(dna[i:i + 9], reverse_complement(dna[i:i + 9]))
+                    for i in range(len(dna) - 8))
+    canonical_planted = min(planted, reverse_complement(planted))
+    assert sketch.top(1)[0][0] == canonical_planted
+    assert sketch.estimate(planted) >= exact[canonical_planted]
+    assert sketch.estimate(encode_kmers(planted, 9, True)[0]) == sketch.estimate(planted)
+    assert abs(sketch.distinct_count() - len(exact)) < 0.05 * len(exact)
@@ -0,0 +1,65 @@
+import numpy as np
+
+from bio_info.util import (PackedDNA, SequenceGenerator, reverse_complement, reverse_complement_all,
+                           reverse_complement_inplace, hamming_distance, generate, as_codes,
+                           train_markov)
+
+
+_PAIRS_ = dict(zip("ACGTNRYSWKMBDHVacgtn", "TGCANYRSWMKVHDBtgcan"))
+
+
+def _brute_reverse_complement_(dna):
+    return ''.join(_PAIRS_[base] for base in reversed(dna))
+
+
+def test_reverse_complement_variants():
+    rng = np.random.default_rng(0)
+    dna = ''.join(rng.choice(list(_PAIRS_), 500))
+    expected = _brute_reverse_complement_(dna)
+    assert reverse_complement(dna) == expected
+    assert reverse_complement(dna.encode('ascii')) == expected.encode('ascii')
+    assert reverse_complement("ACGU", rna=True) == "ACGU"
+    assert reverse_complement(PackedDNA("AACGN")).to_str() == "NCGTT"
+    assert reverse_complement_all([dna, "", "ACG"]) == [expected, "", "CGT"]
+    codes = as_codes(["ACGT", "AACN"][1])[None, :]
+    assert reverse_complement_all(codes).tolist() == [as_codes("NGTT").tolist()]
+    for block_size in (1, 7, 1 << 20):
+        buffer = bytearray(dna.encode('ascii'))
+        reverse_complement_inplace(buffer, block_size=block_size)
+        assert buffer.decode('ascii') == expected
+
+
+def test_hamming_distance():
+    assert hamming_distance("GGGCCGTTGGT", "GGACCGTTGAC") == 3
+    assert hamming_distance(PackedDNA("ACGT"), "ACGA") == 1
+
+
+def test_generator_is_reproducible():
+    assert generate(50, 3, seed=4) == generate(50, 3, seed=4)
+    assert len(generate(20, type="peptide", seed=1)) == 20
+    generator = SequenceGenerator(9)
+    dna, positions = generator.plant(generator.sequence(200), "ACGTACGTAA", count=3)
+    assert all(dna[p:p + 10] == "ACGTACGTAA" for p in positions.tolist())
+    assert np.diff(positions).min() >= 10
+    dna_list, planted = SequenceGenerator(2).motif_dataset(5, 60, "TTTTGGGG")
+    assert [dna[p:p + 8] for dna, p in zip(dna_list, planted.tolist())] == ["TTTTGGGG"] * 5
+
+
+def test_markov_background_follows_training():
+    transitions = train_markov("AC" * 2000, 1)
+    assert transitions[0].argmax() == 1 and transitions[1].argmax() == 0
+    # After A always comes C, and after any other base comes A
+    cycle = np.array([[0, 1, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0]], dtype=float)
+    dna = SequenceGenerator(3).sequence(400, markov=cycle)
+    assert set(dna[i:i + 2] for i in range(len(dna) - 1)) <= {"AC", "CA"}
+
+
+def test_reads_come_from_the_reference():
+    generator = SequenceGenerator(5)
+    reference = generator.sequence(1000)
+    reads = list(generator.reads(reference, 50, 30))
+    assert len(reads) == 50
+    assert all(seq in reference and len(quality) == 30 for _, seq, quality in reads)
+    pairs = list(generator.reads(reference, 10, 30, paired=True, insert_size=100, insert_sd=5))
+    for (_, first, _), (_, second, _) in pairs:
+        assert first in reference and reverse_complement(second) in reference